@@ -1,8 +1,98 @@
 import asyncio
+import contextlib
+import logging
+import socket
 
 from twisted.internet import asyncioreactor
 
-loop = asyncio.new_event_loop()
-asyncio.set_event_loop(loop)
+# Event loops Discord, Minecraft & voice can all run on, "auto" uses uvloop
+# if it is installed & works with the reactor, the stdlib loop otherwise
+EVENT_LOOPS = ("auto", "uvloop", "asyncio")
 
-asyncioreactor.install(loop)
+# How long the reactor compatibility check may take, in seconds
+_CHECK_TIMEOUT = 1.0
+
+logger = logging.getLogger(__name__)
+
+
+def _supports_reactor(loop: asyncio.AbstractEventLoop) -> bool:
+    """
+    The asyncio reactor watches its sockets with add_reader & add_writer,
+    check that the loop implements them & actually calls back
+    """
+    a, b = socket.socketpair()
+    readable = loop.create_future()
+
+    def on_writable():
+        loop.remove_writer(b.fileno())
+        b.send(b"x")
+
+    try:
+        loop.add_reader(a.fileno(), lambda: readable.done() or readable.set_result(True))
+        loop.add_writer(b.fileno(), on_writable)
+        loop.run_until_complete(asyncio.wait_for(readable, _CHECK_TIMEOUT))
+        return True
+    except (NotImplementedError, asyncio.TimeoutError):
+        return False
+    finally:
+        with contextlib.suppress(NotImplementedError):
+            loop.remove_reader(a.fileno())
+            loop.remove_writer(b.fileno())
+        a.close()
+        b.close()
+
+
+def _create_event_loop(name: str) -> tuple[asyncio.AbstractEventLoop, str]:
+    if name not in EVENT_LOOPS:
+        raise ValueError(f"unknown event loop '{name}', expected one of {', '.join(EVENT_LOOPS)}")
+
+    if name != "asyncio":
+        try:
+            import uvloop
+        except ImportError:
+            if name == "uvloop":
+                raise
+        else:
+            loop = uvloop.new_event_loop()
+            if _supports_reactor(loop):
+                return loop, "uvloop"
+
+            loop.close()
+            if name == "uvloop":
+                raise RuntimeError("uvloop does not work with the Twisted asyncio reactor")
+            logger.warning("uvloop does not work with the Twisted asyncio reactor, using the asyncio event loop")
+
+    return asyncio.new_event_loop(), "asyncio"
+
+
+# Name of the event loop the reactor was installed on
+_installed: str | None = None
+
+
+def install_reactor(event_loop: str = "auto") -> str:
+    """
+    Installs the Twisted asyncio reactor on the given event loop. Has to be called before
+    anything imports twisted.internet.reactor, which includes most modules of the bridge
+    and quarry, or the default reactor gets installed instead.
+    :param event_loop: one of EVENT_LOOPS
+    :return: name of the event loop the reactor runs on
+    """
+    global _installed
+    if _installed is not None:
+        if event_loop not in ("auto", _installed):
+            raise RuntimeError(f"reactor is already installed on the {_installed} event loop")
+        return _installed
+
+    loop, name = _create_event_loop(event_loop)
+    asyncio.set_event_loop(loop)
+    asyncioreactor.install(loop)
+
+    _installed = name
+    return name
+
+
+def installed_event_loop() -> str | None:
+    """
+    Name of the event loop the reactor was installed on, None if it wasn't installed yet
+    """
+    return _installed
@@ -0,0 +1,624 @@
+import argparse
+import asyncio
+import dataclasses
+import logging
+import os
+import sys
+import time
+import uuid
+
+from minecraft_launcher_lib.exceptions import InvalidRefreshToken
+from twisted.internet import reactor, task
+
+from bridge.minecraft import auth
+from bridge.minecraft.auth import AuthDetails, AuthRefreshThread
+from bridge.minecraft.auth import refresh_auth as refresh_minecraft_auth
+from bridge.minecraft.client import MinecraftClientFactory
+from bridge.minecraft.packets import PlayerState
+from bridge.minecraft.players import IgnoreList
+from bridge.util.cpu import thread_cpu_time
+from bridge.util.handoff import ReactorOutbox, shared_outbox
+from bridge.util.profiling import Profiler, install_signal_handlers
+from bridge.util.trace import DISCORD_TO_MINECRAFT, MINECRAFT_TO_DISCORD, FrameTrace, Tracer
+
+from . import EVENT_LOOPS, audio, installed_event_loop
+from .audio.clips import Clip, ClipCache
+from .audio.dsp import DspChain
+from .audio.governor import QualityGovernor
+from .audio.opus import EncodingApplication
+from .audio.process import LOW_DELAY_PENDING_FRAMES, MAX_PENDING_FRAMES, AudioProcessThread
+from .audio.recorder import SessionRecorder
+from .audio.spatial import SoundSource, Spatializer
+from .discord_bot import DiscordEndpoint
+from .endpoint import ReceiveMode, VoiceEndpoint
+from .loopback import MAX_CAPTURED_FRAMES, LoopbackEndpoint
+from .voice.client import RATE_LIMIT
+from .voice.udp import SocketOptions, VoiceSocketThread
+
+
+STATS_LOG_INTERVAL = 60  # seconds
+
+# Clips played when a player joins or leaves voice chat, if they exist
+JOIN_CLIP = "join"
+LEAVE_CLIP = "leave"
+CLIP_CACHE_DIR = ".clip-cache"
+
+# What to record: every speaker on their own, the mixed audio sent each way, or both
+RECORD_MODES = ("speakers", "mixed", "all")
+
+
+class DiscordMinecraftBridge:
+
+    def __init__(
+            self,
+            mc_host: str,
+            mc_port: int,
+            discord_bot_token: str | None,
+            mc_uuid: str | None = None,
+            mc_name: str | None = None,
+            mc_token: str | None = None,
+            discord_receive_mode: ReceiveMode = ReceiveMode.OPUS,
+            passthrough: bool = False,
+            discord_latency_budget: float | None = audio.LATENCY_BUDGET,
+            minecraft_latency_budget: float | None = audio.LATENCY_BUDGET,
+            outbox: ReactorOutbox = shared_outbox,
+            discord_dsp: DspChain | None = None,
+            minecraft_dsp: DspChain | None = None,
+            proximity: bool = False,
+            ignore: IgnoreList | None = None,
+            decode_workers: int = 0,
+            voice_socket: SocketOptions | None = None,
+            trace_sample_rate: float = 0.0,
+            trace_file: str | None = None,
+            profiler: Profiler | None = None,
+            endpoint: VoiceEndpoint | None = None,
+            clip_dir: str | None = None,
+            clip_cache: str = CLIP_CACHE_DIR,
+            record_dir: str | None = None,
+            record: str = "all",
+            voice_rate_limit: float | None = RATE_LIMIT,
+            governor: bool = True,
+            low_delay: bool = False
+    ):
+        self.mc_host = mc_host
+        self.mc_port = mc_port
+        self.discord_bot_token = discord_bot_token
+
+        self.loop = asyncio.get_event_loop_policy().get_event_loop()
+
+        # Follows a sample of frames through the pipeline, to see where latency comes from
+        self.tracer = Tracer(trace_sample_rate) if trace_sample_rate > 0 else None
+        self.trace_file = trace_file
+
+        # Profiles the running bridge on demand
+        self.profiler = profiler
+
+        # Low-delay mode: restricted-lowdelay opus everywhere, 10ms frames to Discord.
+        # Voice chat only takes 20ms frames, its 20ms packets are spread over two ticks.
+        self.low_delay = low_delay
+        application = EncodingApplication.LOW_DELAY if low_delay else EncodingApplication.VOICE
+        discord_frame_length = audio.LOW_DELAY_FRAME_LENGTH if low_delay else audio.FRAME_LENGTH
+        max_pending_frames = LOW_DELAY_PENDING_FRAMES if low_delay else MAX_PENDING_FRAMES
+
+        # Announcements & chimes by name, encoded for Minecraft & for Discord
+        self.clips: dict[str, tuple[Clip, Clip]] = {}
+        self.clip_cache: ClipCache | None = ClipCache(clip_cache) if clip_dir is not None else None
+        if self.clip_cache is not None:
+            self._load_clips(clip_dir, self.clip_cache, discord_frame_length, application)
+
+        # Discord, unless another endpoint stands in for it
+        if endpoint is None:
+            endpoint = DiscordEndpoint(discord_bot_token, discord_receive_mode, profiler,
+                                       announce=self.announce if self.clips else None)
+        self.endpoint = endpoint
+
+        # Records the opus packets passing through, if the voice chat server allows it
+        self.recorder = SessionRecorder(record_dir) if record_dir is not None else None
+        self.record_speakers = self.recorder is not None and record in ("speakers", "all")
+        self.record_mixed = self.recorder is not None and record in ("mixed", "all")
+        # Without opus from Discord, its speakers could only be recorded by encoding them again
+        self.record_discord_speakers = self.record_speakers and endpoint.receive_mode == ReceiveMode.OPUS
+
+        self.minecraft = MinecraftClientFactory(mc_host, mc_uuid, mc_name, mc_token, self._on_minecraft_audio,
+                                                proximity=proximity, ignore=ignore, voice_socket=voice_socket,
+                                                tracer=self.tracer, on_presence=self._on_minecraft_presence,
+                                                voice_rate_limit=voice_rate_limit)
+
+        # Set up by create_bridge once the bridge exists, it reports refreshed tokens back to it
+        self.mc_auth_refresher: AuthRefreshThread | None = None
+
+        # Batches frames going from the audio threads to the reactor
+        self.outbox = outbox
+
+        if endpoint.receive_mode == ReceiveMode.OPUS:
+            # Decode raw Discord opus straight to mono, libopus downmixes for free
+            self.discord_process = AudioProcessThread(
+                self._on_processed_discord_audio,
+                audio.SAMPLE_RATE,
+                audio.FRAME_LENGTH,
+                audio.MINECRAFT_CHANNELS,
+                audio.MINECRAFT_CHANNELS,
+                decode=True,
+                passthrough=passthrough,
+                latency_budget=discord_latency_budget,
+                dsp=discord_dsp,
+                decode_workers=decode_workers,
+                # RTP sequence numbers
+                sequence_bits=16,
+                governor=self._governor("discord_to_minecraft", governor),
+                application=application,
+                max_pending_frames=max_pending_frames
+            )
+        else:
+            self.discord_process = AudioProcessThread(
+                self._on_processed_discord_audio,
+                audio.SAMPLE_RATE,
+                audio.FRAME_LENGTH,
+                audio.DISCORD_CHANNELS,
+                audio.MINECRAFT_CHANNELS,
+                latency_budget=discord_latency_budget,
+                dsp=discord_dsp,
+                governor=self._governor("discord_to_minecraft", governor),
+                application=application,
+                max_pending_frames=max_pending_frames
+            )
+
+        self.minecraft_process = AudioProcessThread(
+            self._on_processed_minecraft_audio,
+            audio.SAMPLE_RATE,
+            discord_frame_length,
+            audio.MINECRAFT_CHANNELS,
+            audio.DISCORD_CHANNELS,
+            decode=True,
+            # Packets can't be forwarded when they are split up
+            passthrough=passthrough and not low_delay,
+            latency_budget=minecraft_latency_budget,
+            dsp=minecraft_dsp,
+            # Place proximity voice around the bot in stereo
+            spatializer=Spatializer(self.minecraft.listener_pose) if proximity else None,
+            decode_workers=decode_workers,
+            governor=self._governor("minecraft_to_discord", governor, discord_frame_length),
+            input_frame_length=audio.FRAME_LENGTH,
+            application=application,
+            max_pending_frames=max_pending_frames
+        )
+
+        self.discord_dsp = discord_dsp
+        self.minecraft_dsp = minecraft_dsp
+
+        self.logger = logging.getLogger(f"{self.__class__.__name__}")
+        self.logger.setLevel(logging.INFO)
+
+        self._stats_logger = task.LoopingCall(self._log_stats)
+
+    def run(self):
+        self.start()
+
+        # Run Twisted reactor until shutdown
+        reactor.run()
+
+        # Shutdown
+        self.stop()
+
+    def start(self):
+        """
+        Connects & starts processing audio, the reactor has to be run separately
+        """
+        # Setup connection to Minecraft & start discord
+        self._connect()
+
+        # Keep Minecraft access token fresh in the background
+        if self.mc_auth_refresher is not None:
+            self.mc_auth_refresher.start()
+
+        # Start audio processing threads
+        self.minecraft_process.start()
+        self.discord_process.start()
+        if self.recorder is not None:
+            self.recorder.start()
+
+        self._stats_logger.start(STATS_LOG_INTERVAL, now=False)
+
+    @staticmethod
+    def _governor(direction: str, enabled: bool, frame_length: int = audio.FRAME_LENGTH) -> QualityGovernor | None:
+        return QualityGovernor(direction, frame_length) if enabled else None
+
+    def _on_discord_audio(self, raw_frame: bytes, user: int, sequence: int | None = None):
+        trace = self.tracer.sample(DISCORD_TO_MINECRAFT) if self.tracer is not None else None
+        if self.record_discord_speakers:
+            # Forwarded as Discord's clients encoded it, whose lookahead isn't known, so no pre-skip
+            self._record(f"discord-{user}", audio.DISCORD_CHANNELS, raw_frame)
+
+        # pycord's PCM may span multiple frames when it buffered silence, the
+        # audio process thread slices it back into frames
+        self.discord_process.enqueue(raw_frame, user, time.monotonic(), sequence=sequence, trace=trace)
+
+    def _on_minecraft_audio(self, sender: uuid.UUID, encoded_frame: bytes, source: SoundSource | None = None,
+                            sequence: int | None = None, trace: FrameTrace | None = None):
+        if self.record_speakers:
+            # Forwarded as the voice chat mod encoded it, whose lookahead isn't known, so no pre-skip
+            self._record(f"minecraft-{sender}", audio.MINECRAFT_CHANNELS, encoded_frame)
+        self.minecraft_process.enqueue(encoded_frame, sender, time.monotonic(), source, sequence, trace)
+
+    def _record(self, track: str, channels: int, encoded_frame: bytes, pre_skip: int = 0):
+        if self.minecraft.recording_allowed:
+            self.recorder.record(track, channels, encoded_frame, pre_skip)
+
+    def _load_clips(self, directory: str, cache: ClipCache, discord_frame_length: int,
+                    application: EncodingApplication):
+        for file_name in sorted(os.listdir(directory)):
+            if not file_name.endswith(".wav"):
+                continue
+            path = os.path.join(directory, file_name)
+            clip = (cache.load(path, audio.MINECRAFT_CHANNELS, audio.FRAME_LENGTH, application),
+                    cache.load(path, audio.DISCORD_CHANNELS, discord_frame_length, application))
+            self.clips[clip[0].name] = clip
+
+    def announce(self, name: str) -> bool:
+        """
+        Plays a clip to both Minecraft & Discord, mixed with whoever is speaking
+        :return: whether there is a clip with this name
+        """
+        clip = self.clips.get(name)
+        if clip is None:
+            return False
+
+        minecraft_clip, discord_clip = clip
+        self.discord_process.play_clip(minecraft_clip)
+        self.minecraft_process.play_clip(discord_clip)
+        return True
+
+    def _on_minecraft_presence(self, state: PlayerState, joined: bool):
+        # Chimes are optional, missing clips are skipped
+        self.announce(JOIN_CLIP if joined else LEAVE_CLIP)
+
+    def on_minecraft_auth_refreshed(self, details: AuthDetails):
+        # Called from the auth refresh thread
+        reactor.callFromThread(self.minecraft.update_access_token, details.access_token)
+
+    def _on_processed_discord_audio(self, encoded_frame: bytes, received_at: float, trace: FrameTrace | None = None):
+        if self.record_mixed:
+            self._record("mixed-to-minecraft", audio.MINECRAFT_CHANNELS, encoded_frame,
+                         self.discord_process.encoder_lookahead)
+
+        if self.minecraft.voice_socket is not None:
+            # The voice socket thread queues the datagram, no need to wake the reactor
+            self._send_to_minecraft(encoded_frame, received_at, trace)
+        else:
+            self.outbox.call(self._send_to_minecraft, encoded_frame, received_at, trace)
+
+    def _send_to_minecraft(self, encoded_frame: bytes, received_at: float, trace: FrameTrace | None = None):
+        if trace is not None:
+            trace.mark("handoff")
+
+        # The reactor may have been busy for a while, check the frame is still fresh
+        if self.discord_process.is_within_budget(received_at):
+            self.minecraft.send_voice_data(encoded_frame)
+            if trace is not None:
+                trace.mark("send")
+                self.tracer.finish(trace)
+
+    def _on_processed_minecraft_audio(self, encoded_frame: bytes, received_at: float,
+                                      trace: FrameTrace | None = None):
+        if self.record_mixed:
+            self._record("mixed-to-discord", audio.DISCORD_CHANNELS, encoded_frame,
+                         self.minecraft_process.encoder_lookahead)
+
+        self.outbox.call(self._send_to_discord, encoded_frame, received_at, trace)
+
+    def _send_to_discord(self, encoded_frame: bytes, received_at: float, trace: FrameTrace | None = None):
+        if trace is not None:
+            trace.mark("handoff")
+
+        # The reactor may have been busy for a while, check the frame is still fresh
+        if not self.minecraft_process.is_within_budget(received_at):
+            return
+
+        # Encoded once per tick, sent to every voice channel the bot is in
+        self.endpoint.send(encoded_frame)
+        if trace is not None:
+            trace.mark("send")
+            self.tracer.finish(trace)
+
+    def stats(self) -> dict[str, dict[str, int | float]]:
+        stats = {
+            'discord_to_minecraft': dataclasses.asdict(self.discord_process.stats),
+            'minecraft_to_discord': dataclasses.asdict(self.minecraft_process.stats),
+            'reactor_handoff': self.outbox.summary(),
+            'discord_endpoint': self.endpoint.stats(),
+            'minecraft_voice': self._minecraft_voice_stats(),
+        }
+
+        filtered = self._filtered_player_stats()
+        if filtered:
+            stats['minecraft_filtered_players'] = filtered
+
+        voice_socket = self._voice_socket_thread()
+        if voice_socket is not None:
+            stats['minecraft_voice_socket'] = voice_socket.summary()
+
+        if self.recorder is not None:
+            stats['recorder'] = dataclasses.asdict(self.recorder.stats)
+
+        # Latency of each stage of traced frames, in milliseconds
+        if self.tracer is not None:
+            stats['discord_to_minecraft_latency_ms'] = self.tracer.summary(DISCORD_TO_MINECRAFT)
+            stats['minecraft_to_discord_latency_ms'] = self.tracer.summary(MINECRAFT_TO_DISCORD)
+
+        # Cost per frame of each DSP stage, in microseconds
+        if self.discord_dsp:
+            stats['discord_to_minecraft_dsp_us'] = self.discord_dsp.costs()
+        if self.minecraft_dsp:
+            stats['minecraft_to_discord_dsp_us'] = self.minecraft_dsp.costs()
+
+        return stats
+
+    def _minecraft_voice_stats(self) -> dict[str, int]:
+        player_states = self.minecraft.player_states
+        stats = {
+            'players': len(player_states),
+            'blocked_players': len(player_states.blocked),
+        }
+
+        client = self.minecraft.client
+        if client is not None and client.voice is not None:
+            stats['filtered_packets'] = client.voice.filtered_packets
+            stats['mic_packets'] = client.voice.mic_writer.packets
+            stats['mic_allocations'] = client.voice.mic_writer.allocations
+            stats.update(dataclasses.asdict(client.voice.inbound))
+
+        return stats
+
+    def _filtered_player_stats(self) -> dict[str, int]:
+        """
+        Packets dropped per disabled or ignored player, by name if they are known
+        """
+        client = self.minecraft.client
+        if client is None or client.voice is None:
+            return {}
+
+        stats = {}
+        # The voice socket thread may add senders meanwhile
+        for sender, count in list(client.voice.filtered_senders.items()):
+            player = uuid.UUID(bytes=sender)
+            stats[self.minecraft.player_states.name(player) or str(player)] = count
+        return stats
+
+    def _voice_socket_thread(self) -> VoiceSocketThread | None:
+        client = self.minecraft.client
+        if client is not None and isinstance(client.voice_listener, VoiceSocketThread):
+            return client.voice_listener
+        return None
+
+    def cpu_time(self) -> float:
+        """
+        CPU time used by the audio process & voice socket threads of this bridge, in seconds
+        """
+        cpu = thread_cpu_time(self.discord_process) + thread_cpu_time(self.minecraft_process)
+
+        voice_socket = self._voice_socket_thread()
+        if voice_socket is not None:
+            cpu += thread_cpu_time(voice_socket)
+        return cpu
+
+    def _log_stats(self):
+        for direction, stats in self.stats().items():
+            self.logger.info(f"{direction}: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+        self._export_trace()
+
+    def _export_trace(self):
+        if self.tracer is None or self.trace_file is None:
+            return
+        try:
+            self.tracer.export(self.trace_file)
+        except OSError:
+            self.logger.exception(f"Writing trace to {self.trace_file} failed")
+
+    def _connect(self):
+        self.minecraft.connect(self.mc_host, self.mc_port)
+
+        self.endpoint.start(self._on_discord_audio)
+
+    def stop(self):
+        if self._stats_logger.running:
+            self._stats_logger.stop()
+
+        if self.mc_auth_refresher is not None:
+            self.mc_auth_refresher.stop()
+
+        self.minecraft.close_voice()
+        if self.profiler is not None:
+            self.profiler.stop()
+        self._export_trace()
+
+        self.logger.info('Shutting down audio process threads')
+
+        # Shutdown audio process threads
+        self.discord_process.stop()
+        self.minecraft_process.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+        # Only once nothing plays clips anymore
+        if self.clip_cache is not None:
+            self.clip_cache.close()
+
+        self.logger.info('Stopping discord endpoint')
+
+        self.loop.run_until_complete(self.endpoint.close())
+
+
+def _latency_budget(milliseconds: float | None, low_delay: bool) -> float | None:
+    if milliseconds is None:
+        return audio.LOW_DELAY_LATENCY_BUDGET if low_delay else audio.LATENCY_BUDGET
+    return milliseconds / 1000 or None
+
+
+def parse_args(argv) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bridge")
+    parser.add_argument("host")
+    parser.add_argument("-p", "--port", default=25565, type=int)
+    parser.add_argument("--event-loop", default="auto", choices=EVENT_LOOPS,
+                        help="event loop Discord, Minecraft & voice run on, auto uses uvloop if it is installed "
+                             "& works with the Twisted reactor")
+    parser.add_argument("--discord-receive", default=ReceiveMode.OPUS.value,
+                        choices=[mode.value for mode in ReceiveMode],
+                        help="receive raw opus from Discord and decode it in the bridge, or let pycord decode to PCM")
+    parser.add_argument("--passthrough", action="store_true",
+                        help="forward opus unchanged instead of transcoding it while only one speaker is active")
+    parser.add_argument("--no-governor", action="store_true",
+                        help="keep full audio quality even if processing falls behind real time")
+    parser.add_argument("--low-delay", action="store_true",
+                        help="lowest latency over bitrate & CPU time: restricted-lowdelay opus, 10ms frames to "
+                             "Discord, smaller buffers & latency budgets")
+    parser.add_argument("--discord-latency-budget", default=None, type=float,
+                        help="max. age in ms of Discord audio before it is dropped instead of sent, 0 to disable, "
+                             f"defaults to {audio.LATENCY_BUDGET * 1000:.0f} "
+                             f"or {audio.LOW_DELAY_LATENCY_BUDGET * 1000:.0f} with --low-delay")
+    parser.add_argument("--minecraft-latency-budget", default=None, type=float,
+                        help="max. age in ms of Minecraft audio before it is dropped instead of sent, 0 to disable, "
+                             "defaults as --discord-latency-budget")
+    parser.add_argument("--discord-dsp", default="", type=DspChain.parse,
+                        help="DSP stages for Discord audio, e.g. 'gain:db=6,agc:target=-18,gate:threshold=-50,limiter'")
+    parser.add_argument("--minecraft-dsp", default="", type=DspChain.parse,
+                        help="DSP stages for Minecraft audio, same format as --discord-dsp")
+    parser.add_argument("--proximity", action="store_true",
+                        help="use proximity voice chat around the bot instead of a group, positioned in stereo")
+    parser.add_argument("--ignore-player", action="append", default=[], metavar="NAME_OR_UUID",
+                        help="don't bridge audio of this Minecraft player, can be given multiple times")
+    parser.add_argument("--ignore-group", action="append", default=[], metavar="NAME_OR_UUID",
+                        help="don't bridge audio of players in this voice chat group, can be given multiple times")
+    parser.add_argument("--decode-workers", default=0, type=int,
+                        help="extra threads decoding the frames of simultaneous speakers in parallel, 0 to decode serially")
+    parser.add_argument("--voice-thread", action="store_true",
+                        help="run the Minecraft voice socket on its own thread, receiving & sending in batches")
+    parser.add_argument("--voice-rcvbuf", default=SocketOptions.rcvbuf // 1024, type=int,
+                        help="receive buffer size in KiB of the voice socket, with --voice-thread")
+    parser.add_argument("--voice-sndbuf", default=SocketOptions.sndbuf // 1024, type=int,
+                        help="send buffer size in KiB of the voice socket, with --voice-thread")
+    parser.add_argument("--voice-rate-limit", default=RATE_LIMIT, type=float,
+                        help="packets per second accepted from the voice chat server before dropping, 0 to disable")
+    parser.add_argument("--trace-sample-rate", default=0.0, type=float,
+                        help="fraction of frames to trace through every pipeline stage, e.g. 0.01, 0 to disable")
+    parser.add_argument("--trace-file", default=None,
+                        help="where to write traced frames as a Chrome trace, viewable in ui.perfetto.dev")
+    parser.add_argument("--profile-dir", default=None,
+                        help="enable on-demand profiling through /profile, SIGUSR1 (CPU) & SIGUSR2 (memory), "
+                             "writing the results to this directory. Memory snapshots trace every allocation "
+                             "of the process from the first snapshot on, which adds overhead to all of them")
+    parser.add_argument("--loopback-input", action="append", default=[], metavar="FILE",
+                        help="replace Discord with a local endpoint playing this file as a user, "
+                             "WAV (48kHz 16-bit), raw 48kHz stereo PCM or .frames of opus, can be given multiple times")
+    parser.add_argument("--loopback-output", default=None, metavar="DIR",
+                        help="replace Discord with a local endpoint writing the audio it receives to this directory")
+    parser.add_argument("--loopback-repeat", default=1, type=int, help="times to play the loopback inputs")
+    parser.add_argument("--loopback-delay", default=5.0, type=float,
+                        help="seconds to wait before playing the loopback inputs, for Minecraft to connect")
+    parser.add_argument("--loopback-max-frames", default=MAX_CAPTURED_FRAMES, type=int,
+                        help="most recent received frames the loopback endpoint keeps for its output")
+    parser.add_argument("--clip-dir", default=None,
+                        help="directory of 48kHz 16-bit WAV clips to play with /announce, "
+                             f"{JOIN_CLIP}.wav & {LEAVE_CLIP}.wav are played when players join & leave voice chat")
+    parser.add_argument("--clip-cache", default=CLIP_CACHE_DIR,
+                        help="directory encoded clips are cached in")
+    parser.add_argument("--record-dir", default=None,
+                        help="record bridged audio as Ogg/Opus to this directory, if the voice chat server allows it")
+    parser.add_argument("--record", default="all", choices=RECORD_MODES,
+                        help="record every speaker to their own file, the mixed audio sent each way, or both, "
+                             "speakers in Discord only with --discord-receive opus")
+    parser.add_argument("--auth-file", default=auth.FILE_NAME,
+                        help="file the Minecraft account tokens are cached in")
+    return parser.parse_args(argv)
+
+
+def uses_loopback(args: argparse.Namespace) -> bool:
+    return bool(args.loopback_input) or args.loopback_output is not None
+
+
+class InvalidConfigurationError(Exception):
+    """
+    A bridge can't be set up with its configuration, trying again won't help
+    """
+    pass
+
+
+def create_bridge(args: argparse.Namespace, discord_token: str | None) -> DiscordMinecraftBridge:
+    """
+    Logs into Minecraft if configured & sets up a bridge from parsed command line arguments
+    :raises InvalidConfigurationError: without a Discord bot token or valid Minecraft refresh token
+    """
+    logger = logging.getLogger("main")
+    logger.setLevel(logging.INFO)
+
+    if discord_token is None and not uses_loopback(args):
+        raise InvalidConfigurationError("no discord bot token provided")
+
+    client_id = os.getenv("MSA_CLIENT_ID")
+
+    kwargs = {
+        'discord_receive_mode': ReceiveMode(args.discord_receive),
+        'passthrough': args.passthrough,
+        'discord_latency_budget': _latency_budget(args.discord_latency_budget, args.low_delay),
+        'minecraft_latency_budget': _latency_budget(args.minecraft_latency_budget, args.low_delay),
+        'discord_dsp': args.discord_dsp,
+        'minecraft_dsp': args.minecraft_dsp,
+        'proximity': args.proximity,
+        'ignore': IgnoreList(set(args.ignore_player), set(args.ignore_group)),
+        'decode_workers': args.decode_workers,
+        'voice_socket': SocketOptions(args.voice_rcvbuf * 1024, args.voice_sndbuf * 1024) if args.voice_thread else None,
+        'trace_sample_rate': args.trace_sample_rate,
+        'trace_file': args.trace_file,
+        'profiler': Profiler(args.profile_dir) if args.profile_dir else None,
+        'clip_dir': args.clip_dir,
+        'clip_cache': args.clip_cache,
+        'record_dir': args.record_dir,
+        'record': args.record,
+        'voice_rate_limit': args.voice_rate_limit or None,
+        'governor': not args.no_governor,
+        'low_delay': args.low_delay,
+    }
+    if uses_loopback(args):
+        kwargs['endpoint'] = LoopbackEndpoint(args.loopback_input, args.loopback_output,
+                                              ReceiveMode(args.discord_receive),
+                                              args.loopback_repeat, args.loopback_delay, args.loopback_max_frames)
+    auth_details = None
+
+    if client_id is not None:
+        logger.info("Client ID set, attempting login into Minecraft account")
+        try:
+            # Reuses the cached access token if it is still valid
+            auth_details = refresh_minecraft_auth(client_id, file_name=args.auth_file)
+        except InvalidRefreshToken:
+            raise InvalidConfigurationError("refresh token invalid, please login again")
+        logger.info(f"Successfully logged in as {auth_details.name}")
+        kwargs['mc_uuid'] = auth_details.id
+        kwargs['mc_name'] = auth_details.name
+        kwargs['mc_token'] = auth_details.access_token
+
+    bridge = DiscordMinecraftBridge(args.host, args.port, discord_token, **kwargs)
+
+    if auth_details is not None:
+        bridge.mc_auth_refresher = AuthRefreshThread(client_id, auth_details, bridge.on_minecraft_auth_refreshed,
+                                                     file_name=args.auth_file)
+
+    return bridge
+
+
+def main(argv):
+    """
+    Runs a bridge, the reactor has to be installed before this module is imported, see bridge.__main__
+    """
+    args = parse_args(argv)
+
+    logging.basicConfig()
+
+    try:
+        bridge = create_bridge(args, os.getenv("BOT_TOKEN"))
+    except InvalidConfigurationError as e:
+        logging.getLogger("main").error(f"Invalid configuration: {e}")
+        sys.exit(1)
+
+    if bridge.profiler is not None:
+        install_signal_handlers(bridge.profiler)
+    logging.getLogger("main").info(f"Running on the {installed_event_loop()} event loop")
+    bridge.run()
@@ -3,3 +3,10 @@ SAMPLE_RATE = 48000  # 48kHz
 FRAME_LENGTH = 20  # 20 ms
 DISCORD_CHANNELS = 2
 MINECRAFT_CHANNELS = 1
+
+# Max. time between audio entering the bridge & being sent out
+LATENCY_BUDGET = 0.2  # 200 ms
+
+# Low-delay mode: shorter frames where the protocol allows them & tighter buffers
+LOW_DELAY_FRAME_LENGTH = 10  # 10 ms
+LOW_DELAY_LATENCY_BUDGET = 0.08  # 80 ms
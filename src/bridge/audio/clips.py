@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import wave
+from collections.abc import Iterator
+
+import numpy as np
+
+from bridge import audio
+from bridge.audio import mix, opus
+from bridge.audio.opus import EncodingApplication, OpusEncoder
+
+# File layout: magic, frame count, frame count + 1 offsets into the data, data
+_MAGIC = b"BCL1"
+_HEADER = struct.Struct(">4sI")
+
+logger = logging.getLogger(__name__)
+
+
+class Clip:
+    """
+    Opus frames of a clip, memory-mapped from the cache
+    """
+    name: str
+
+    _map: mmap.mmap
+    _offsets: tuple[int, ...]
+
+    def __init__(self, name: str, file_name: str):
+        self.name = name
+        with open(file_name, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f"{file_name} is not a clip")
+        self._offsets = struct.unpack_from(f">{count + 1}I", self._map, _HEADER.size)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._map[self._offsets[index]:self._offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[bytes]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self._map.close()
+
+
+def _write_clip(file_name: str, frames: list[bytes]):
+    data_start = _HEADER.size + 4 * (len(frames) + 1)
+    offsets = [data_start]
+    for frame in frames:
+        offsets.append(offsets[-1] + len(frame))
+
+    tmp_name = f"{file_name}.tmp"
+    with open(tmp_name, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(frames)))
+        f.write(struct.pack(f">{len(offsets)}I", *offsets))
+        for frame in frames:
+            f.write(frame)
+    os.replace(tmp_name, file_name)
+
+
+def _read_wav(file_name: str) -> tuple[np.ndarray, int]:
+    """
+    :return: interleaved samples & channel count of a 48kHz 16-bit WAV file
+    """
+    with wave.open(file_name, "rb") as f:
+        if f.getframerate() != audio.SAMPLE_RATE or f.getsampwidth() != 2 or f.getnchannels() not in (1, 2):
+            raise ValueError(f"{file_name} must be 48kHz 16-bit mono or stereo")
+        return mix.to_samples(f.readframes(f.getnframes())), f.getnchannels()
+
+
+class ClipCache:
+    """
+    Encodes clips once per channel count & keeps the opus frames on disk, keyed by
+    the content of the clip & everything that affects encoding it. Clips stay mapped
+    until the cache is closed.
+    """
+    directory: str
+
+    # Content hash of each WAV file by path, with the (mtime, size) it was hashed at
+    _digests: dict[str, tuple[tuple[int, int], str]]
+    # Mapped clips by cache file name
+    _clips: dict[str, Clip]
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._digests = {}
+        self._clips = {}
+
+    def load(self, file_name: str, channels: int, frame_length: int = audio.FRAME_LENGTH,
+             application: EncodingApplication = EncodingApplication.VOICE) -> Clip:
+        """
+        Opus frames of a WAV file as the bridge would encode them for the given channel count,
+        encoded now if they aren't cached yet
+        :param frame_length: in milliseconds
+        """
+        key = hashlib.sha256(self._digest(file_name).encode())
+        key.update(f"/{audio.SAMPLE_RATE}/{frame_length}/{channels}/"
+                   f"{application.value}/{opus.version()}".encode())
+        cache_name = os.path.join(self.directory, f"{key.hexdigest()}.clip")
+
+        clip = self._clips.get(cache_name)
+        if clip is not None:
+            return clip
+
+        name = os.path.splitext(os.path.basename(file_name))[0]
+        if not os.path.exists(cache_name):
+            os.makedirs(self.directory, exist_ok=True)
+            _write_clip(cache_name, self._encode(file_name, channels, frame_length, application))
+            logger.info(f"Encoded clip {name} with {channels} channel(s)")
+
+        clip = self._clips[cache_name] = Clip(name, cache_name)
+        return clip
+
+    def _digest(self, file_name: str) -> str:
+        """
+        Hash of the file's content, only read again once its modification time or size changed
+        """
+        stat = os.stat(file_name)
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(file_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with open(file_name, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._digests[file_name] = (version, digest)
+        return digest
+
+    def close(self):
+        """
+        Unmaps every clip loaded through the cache, none of them can be played after
+        """
+        for clip in self._clips.values():
+            clip.close()
+        self._clips.clear()
+
+    @staticmethod
+    def _encode(file_name: str, channels: int, frame_length: int, application: EncodingApplication) -> list[bytes]:
+        samples, source_channels = _read_wav(file_name)
+        samples = mix.convert_channels(samples, source_channels, channels)
+
+        samples_per_frame = audio.SAMPLE_RATE // 1000 * frame_length
+        frame_samples = samples_per_frame * channels
+        # Pad the last frame with silence
+        samples = np.concatenate((samples, np.zeros(-len(samples) % frame_samples, dtype=samples.dtype)))
+
+        encoder = OpusEncoder(audio.SAMPLE_RATE, samples_per_frame, channels, application)
+        return [encoder.encode(samples[i:i + frame_samples].tobytes())
+                for i in range(0, len(samples), frame_samples)]
@@ -0,0 +1,282 @@
+import abc
+import math
+import time
+from collections.abc import Sequence
+
+import numpy as np
+
+from bridge.audio import mix
+
+FULL_SCALE = 32768.0
+
+
+def db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+class DspStage(abc.ABC):
+    name: str
+
+    # Time spent in this stage, for reporting cost per frame
+    cost_ns: int
+    frames: int
+
+    def __init__(self):
+        self.cost_ns = 0
+        self.frames = 0
+
+    def reset(self):
+        pass
+
+
+class GainStage(DspStage, abc.ABC):
+    """
+    Stage which scales a whole frame by a single gain. Adjacent gain stages are
+    fused by the chain into a single multiplication over the frame.
+    """
+
+    @abc.abstractmethod
+    def frame_gain(self, level: float) -> float:
+        """
+        :param level: RMS level of the frame as it arrives at this stage, 1.0 being full scale
+        :return: gain to apply to the frame
+        """
+        ...
+
+
+class ShapingStage(DspStage, abc.ABC):
+    """
+    Stage which works on individual samples
+    """
+
+    @abc.abstractmethod
+    def process(self, samples: np.ndarray):
+        """
+        Processes float32 samples (full scale being 32768) in place
+        """
+        ...
+
+
+class Gain(GainStage):
+    name = "gain"
+
+    def __init__(self, db: float = 0.0):
+        super().__init__()
+        self.gain = db_to_gain(db)
+
+    def frame_gain(self, level: float) -> float:
+        return self.gain
+
+
+class AutomaticGainControl(GainStage):
+    name = "agc"
+
+    def __init__(self, target: float = -20.0, max_gain: float = 20.0, min_gain: float = -20.0,
+                 floor: float = -55.0, attack: float = 0.5, release: float = 0.05):
+        """
+        :param target: RMS level to aim for, in dBFS
+        :param max_gain: max. amplification, in dB
+        :param min_gain: max. attenuation, in dB
+        :param floor: frames quieter than this (dBFS) are considered silence and keep the current gain
+        :param attack: fraction of the way to move towards a lower gain per frame
+        :param release: fraction of the way to move towards a higher gain per frame
+        """
+        super().__init__()
+        self.target = db_to_gain(target)
+        self.max_gain = db_to_gain(max_gain)
+        self.min_gain = db_to_gain(min_gain)
+        self.floor = db_to_gain(floor)
+        self.attack = attack
+        self.release = release
+        self.gain = 1.0
+
+    def frame_gain(self, level: float) -> float:
+        if level > self.floor:
+            desired = min(max(self.target / level, self.min_gain), self.max_gain)
+            rate = self.attack if desired < self.gain else self.release
+            self.gain += (desired - self.gain) * rate
+        return self.gain
+
+    def reset(self):
+        self.gain = 1.0
+
+
+class NoiseGate(GainStage):
+    name = "gate"
+
+    def __init__(self, threshold: float = -50.0, hold: float = 10, attenuation: float = -60.0):
+        """
+        :param threshold: level in dBFS below which the gate closes
+        :param hold: frames to keep the gate open after the level dropped below the threshold
+        :param attenuation: gain in dB while closed
+        """
+        super().__init__()
+        self.threshold = db_to_gain(threshold)
+        self.hold = int(hold)
+        self.closed_gain = db_to_gain(attenuation)
+        self._frames_below = self.hold + 1
+
+    def frame_gain(self, level: float) -> float:
+        if level >= self.threshold:
+            self._frames_below = 0
+        else:
+            self._frames_below += 1
+        return 1.0 if self._frames_below <= self.hold else self.closed_gain
+
+    def reset(self):
+        self._frames_below = self.hold + 1
+
+
+class SoftLimiter(ShapingStage):
+    name = "limiter"
+
+    def __init__(self, threshold: float = -3.0):
+        """
+        :param threshold: level in dBFS above which peaks are softly compressed towards full scale
+        """
+        super().__init__()
+        self._knee = db_to_gain(threshold) * FULL_SCALE
+        self._range = FULL_SCALE - self._knee
+
+    def process(self, samples: np.ndarray):
+        magnitude = np.abs(samples)
+        over = magnitude > self._knee
+        if not over.any():
+            return
+
+        # tanh curve above the knee, approaching full scale asymptotically
+        compressed = self._knee + self._range * np.tanh((magnitude[over] - self._knee) / self._range)
+        samples[over] = np.copysign(compressed, samples[over])
+
+
+STAGES: dict[str, type[DspStage]] = {
+    stage.name: stage for stage in (Gain, AutomaticGainControl, NoiseGate, SoftLimiter)
+}
+
+
+class DspChain:
+    """
+    Runs 16-bit PCM frames through a series of stages.
+
+    Runs of gain stages only look at the frame level, so they are fused into
+    one multiplication over the frame, ramped from the previous frame's gain to
+    avoid clicks. The frame level is measured once and tracked through the gains.
+    """
+    stages: list[DspStage]
+
+    # Time spent converting & applying fused gains
+    apply_cost_ns: int
+    frames: int
+
+    def __init__(self, stages: Sequence[DspStage]):
+        self.stages = list(stages)
+        self.apply_cost_ns = 0
+        self.frames = 0
+
+        # Total gain applied by each segment of gain stages in the previous frame
+        self._previous_gains: dict[int, float] = {}
+
+    @classmethod
+    def parse(cls, spec: str) -> 'DspChain':
+        """
+        Builds a chain from a spec like ``gain:db=6,agc:target=-18,gate,limiter``
+        :raises ValueError: if a stage or one of its parameters is invalid
+        """
+        stages = []
+        for stage_spec in filter(None, spec.split(',')):
+            name, *params = stage_spec.strip().split(':')
+            if name not in STAGES:
+                raise ValueError(f"unknown DSP stage '{name}', expected one of {', '.join(STAGES)}")
+
+            kwargs = {}
+            for param in params:
+                key, _, value = param.partition('=')
+                try:
+                    kwargs[key] = float(value)
+                except ValueError:
+                    raise ValueError(f"invalid value '{value}' for parameter '{key}' of DSP stage '{name}'") from None
+
+            # Used as an argparse type, which only reports ValueErrors as invalid input
+            try:
+                stages.append(STAGES[name](**kwargs))
+            except (TypeError, ValueError, ArithmeticError) as e:
+                raise ValueError(f"invalid parameters for DSP stage '{name}': {e}") from e
+        return cls(stages)
+
+    def process(self, frame: np.ndarray, shaping: bool = True) -> np.ndarray:
+        """
+        :param frame: interleaved 16-bit PCM
+        :param shaping: whether to run stages working on individual samples, skipped to save CPU time
+        :return: processed interleaved 16-bit PCM
+        """
+        start = time.perf_counter_ns()
+
+        samples = frame.astype(np.float32)
+        level = None
+        segment_gain = 1.0
+        segment = 0
+
+        for stage in self.stages:
+            if not shaping and isinstance(stage, ShapingStage):
+                continue
+
+            if not isinstance(stage, GainStage):
+                # Samples are about to be looked at individually, apply the gain so far
+                self._apply_gain(samples, segment, segment_gain)
+                segment += 1
+                segment_gain = 1.0
+                level = None
+
+            stage_start = time.perf_counter_ns()
+
+            if isinstance(stage, GainStage):
+                if level is None:
+                    level = math.sqrt(float(np.dot(samples, samples)) / len(samples)) / FULL_SCALE
+                segment_gain *= stage.frame_gain(level * segment_gain)
+            else:
+                stage.process(samples)
+
+            stage_ns = time.perf_counter_ns() - stage_start
+            stage.cost_ns += stage_ns
+            stage.frames += 1
+
+            # Everything not spent in stages counts towards applying
+            start += stage_ns
+
+        self._apply_gain(samples, segment, segment_gain)
+
+        np.clip(samples, mix.SAMPLE_MIN, mix.SAMPLE_MAX, out=samples)
+        result = samples.astype(mix.SAMPLE_DTYPE)
+
+        self.apply_cost_ns += time.perf_counter_ns() - start
+        self.frames += 1
+
+        return result
+
+    def _apply_gain(self, samples: np.ndarray, segment: int, gain: float):
+        previous = self._previous_gains.get(segment, gain)
+        self._previous_gains[segment] = gain
+
+        if previous != gain:
+            samples *= np.linspace(previous, gain, len(samples), dtype=np.float32)
+        elif gain != 1.0:
+            samples *= gain
+
+    def reset(self):
+        self._previous_gains.clear()
+        for stage in self.stages:
+            stage.reset()
+
+    def costs(self) -> dict[str, float]:
+        """
+        Average processing time per frame of every stage, in microseconds
+        """
+        costs = {
+            f"{i}_{stage.name}": stage.cost_ns / stage.frames / 1000 if stage.frames else 0.0
+            for i, stage in enumerate(self.stages)
+        }
+        costs['apply'] = self.apply_cost_ns / self.frames / 1000 if self.frames else 0.0
+        return costs
+
+    def __bool__(self):
+        return bool(self.stages)
@@ -0,0 +1,156 @@
+import enum
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+# Seconds of ticks measured before deciding on the quality level
+WINDOW = 1.0
+
+# Share of real time spent processing above which quality is lowered
+STEP_DOWN_LOAD = 0.8
+# Share of real time spent processing below which quality is raised again
+STEP_UP_LOAD = 0.4
+# Ticks per window which may start more than a frame late
+MAX_MISSES = 2
+
+# Calm windows before quality is raised again, doubled when raising it was premature
+HOLD_WINDOWS = 5
+MAX_HOLD_WINDOWS = 120
+
+logger = logging.getLogger(__name__)
+
+
+class DspQuality(enum.Enum):
+    FULL = "full"
+    # Only stages which scale whole frames, no per-sample processing
+    GAIN = "gain"
+    OFF = "off"
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    # Opus encoder complexity, None for the libopus default
+    complexity: int | None
+    dsp: DspQuality
+    # Speakers mixed per frame, the ones with the biggest packets, None for all
+    max_speakers: int | None
+
+
+# Cheapest savings first: encoder complexity is barely audible, DSP is a nicety,
+# leaving out speakers is the last resort
+LEVELS = (
+    QualityLevel(None, DspQuality.FULL, None),
+    QualityLevel(5, DspQuality.FULL, None),
+    QualityLevel(0, DspQuality.FULL, None),
+    QualityLevel(0, DspQuality.GAIN, None),
+    QualityLevel(0, DspQuality.OFF, None),
+    QualityLevel(0, DspQuality.OFF, 8),
+    QualityLevel(0, DspQuality.OFF, 4),
+    QualityLevel(0, DspQuality.OFF, 2),
+)
+
+
+class QualityGovernor:
+    """
+    Keeps an audio process thread real-time by lowering the quality of its audio when
+    processing a frame takes too long or ticks start late, and raising it again once
+    there is headroom.
+    """
+    name: str
+    levels: Sequence[QualityLevel]
+    level: int
+
+    # Share of real time spent processing in the last window, 1.0 being all of it
+    load: float
+
+    _frame_seconds: float
+    _window_ticks: int
+
+    _ticks: int
+    _busy: float
+    _misses: int
+
+    _calm_windows: int
+    _hold_windows: int
+    # Whether the last change raised the quality, & how many windows ago
+    _raised: bool
+    _windows_since_change: int
+
+    def __init__(self, name: str, frame_length: int, levels: Sequence[QualityLevel] = LEVELS):
+        """
+        :param name: of the audio direction, for logging
+        :param frame_length: in milliseconds
+        """
+        self.name = name
+        self.levels = levels
+        self.level = 0
+        self.load = 0.0
+
+        self._frame_seconds = frame_length / 1000
+        self._window_ticks = max(1, round(WINDOW / self._frame_seconds))
+
+        self._ticks = 0
+        self._busy = 0.0
+        self._misses = 0
+
+        self._calm_windows = 0
+        self._hold_windows = HOLD_WINDOWS
+        self._raised = False
+        self._windows_since_change = 0
+
+    @property
+    def quality(self) -> QualityLevel:
+        return self.levels[self.level]
+
+    def record(self, busy: float, missed: bool) -> QualityLevel | None:
+        """
+        Measures a tick
+        :param busy: seconds spent processing the tick
+        :param missed: whether the tick started more than a frame late
+        :return: the new quality level, if it changed
+        """
+        self._ticks += 1
+        self._busy += busy
+        self._misses += missed
+        if self._ticks < self._window_ticks:
+            return None
+
+        self.load = self._busy / (self._ticks * self._frame_seconds)
+        misses = self._misses
+        self._ticks = 0
+        self._busy = 0.0
+        self._misses = 0
+        self._windows_since_change += 1
+
+        if self.load > STEP_DOWN_LOAD or misses > MAX_MISSES:
+            self._calm_windows = 0
+            if self.level == len(self.levels) - 1:
+                return None
+
+            # Raising the quality didn't last, wait longer before trying again
+            if self._raised and self._windows_since_change <= self._hold_windows:
+                self._hold_windows = min(self._hold_windows * 2, MAX_HOLD_WINDOWS)
+            return self._change(self.level + 1, misses)
+
+        if self.load < STEP_UP_LOAD and misses == 0:
+            self._calm_windows += 1
+        else:
+            self._calm_windows = 0
+
+        if self._calm_windows >= self._hold_windows and self.level > 0:
+            self._calm_windows = 0
+            return self._change(self.level - 1, misses)
+
+        # Quality held up for long after raising it, be quicker to try again next time
+        if self._windows_since_change > MAX_HOLD_WINDOWS:
+            self._hold_windows = HOLD_WINDOWS
+        return None
+
+    def _change(self, level: int, misses: int) -> QualityLevel:
+        self._raised = level < self.level
+        self._windows_since_change = 0
+        self.level = level
+
+        logger.info(f"{'Raised' if self._raised else 'Lowered'} {self.name} audio quality to level {level} "
+                    f"at {self.load:.0%} load & {misses} late ticks: {self.quality}")
+        return self.quality
@@ -0,0 +1,50 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+SAMPLE_DTYPE = np.int16
+
+SAMPLE_MIN = np.iinfo(SAMPLE_DTYPE).min
+SAMPLE_MAX = np.iinfo(SAMPLE_DTYPE).max
+
+
+def to_samples(data: bytes) -> np.ndarray:
+    """
+    Zero-copy view of interleaved 16-bit PCM
+    """
+    return np.frombuffer(data, dtype=SAMPLE_DTYPE)
+
+
+def mix(frames: Sequence[np.ndarray], frame_samples: int) -> np.ndarray:
+    """
+    Sums frames of interleaved PCM, clipping the result
+    :param frames: frames to mix, longer frames are cut and shorter ones are padded with silence
+    :param frame_samples: total number of samples (all channels) in the output frame
+    """
+    if len(frames) == 1 and len(frames[0]) == frame_samples:
+        return frames[0]
+
+    acc = np.zeros(frame_samples, dtype=np.int32)
+    for frame in frames:
+        n = min(len(frame), frame_samples)
+        acc[:n] += frame[:n]
+
+    return np.clip(acc, SAMPLE_MIN, SAMPLE_MAX).astype(SAMPLE_DTYPE)
+
+
+def convert_channels(frame: np.ndarray, source_channels: int, sink_channels: int) -> np.ndarray:
+    """
+    Up- or downmixes a frame of interleaved PCM
+    """
+    if source_channels == sink_channels:
+        return frame
+
+    if source_channels == 1:
+        # Copy mono signal into every output channel
+        return np.repeat(frame, sink_channels)
+
+    # Average input channels, then spread over output channels
+    mono = frame.reshape(-1, source_channels).mean(axis=1, dtype=np.float32).astype(SAMPLE_DTYPE)
+    if sink_channels == 1:
+        return mono
+    return np.repeat(mono, sink_channels)
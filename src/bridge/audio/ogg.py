@@ -0,0 +1,159 @@
+import struct
+import zlib
+from typing import BinaryIO
+
+from bridge import audio
+
+# RFC 3533 page header: capture pattern, version, flags, granule position, serial, sequence, CRC, segment count
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+_BEGIN_OF_STREAM = 0x02
+_END_OF_STREAM = 0x04
+
+# RFC 7845 identification header: magic, version, channels, pre-skip, input rate, output gain, mapping family
+_OPUS_HEAD = struct.Struct("<8sBBHIhB")
+VENDOR = "discord-minecraft-bridge"
+
+MAX_SEGMENTS = 255
+
+# A 20ms CELT frame of silence, decodable by mono & stereo decoders alike
+SILENCE_FRAME = b"\xf8\xff\xfe"
+
+# Frame durations in 48kHz samples by TOC config, SILK, hybrid & CELT
+_FRAME_SAMPLES = (
+    480, 960, 1920, 2880, 480, 960, 1920, 2880, 480, 960, 1920, 2880,
+    480, 960, 480, 960,
+    120, 240, 480, 960, 120, 240, 480, 960, 120, 240, 480, 960, 120, 240, 480, 960,
+)
+
+# Ogg's CRC is unreflected, zlib's is reflected: reversing the bits of every byte & of the result
+# turns one into the other, so the checksum is computed in C
+_REVERSE_BITS = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def ogg_crc(data: bytes) -> int:
+    """
+    CRC-32 of an Ogg page: polynomial 0x04c11db7, no reflection, initial value & final XOR 0
+    """
+    crc = zlib.crc32(data.translate(_REVERSE_BITS), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{crc:032b}"[::-1], 2)
+
+
+def packet_samples(packet: bytes) -> int:
+    """
+    Duration of an opus packet in 48kHz samples, from its TOC byte
+    """
+    toc = packet[0]
+    frames = toc & 0x03
+    if frames == 3:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    elif frames != 0:
+        frames = 2
+    else:
+        frames = 1
+    return _FRAME_SAMPLES[toc >> 3] * frames
+
+
+class OggOpusWriter:
+    """
+    Streams opus packets into an Ogg/Opus file as they are, without decoding.
+    Packets are buffered until a page is full or spans the page duration, so at most
+    one page per stream is held in memory.
+    """
+    file: BinaryIO
+    channels: int
+
+    # Samples of audio written, the granule position of the last complete packet
+    granule: int
+    bytes_written: int
+
+    _serial: int
+    _sequence: int
+    _page_samples: int
+    _segments: list[int]
+    _packets: list[bytes]
+    _pending_samples: int
+
+    def __init__(self, file: BinaryIO, channels: int, serial: int, page_duration: float = 1.0,
+                 comments: dict[str, str] | None = None, pre_skip: int = 0):
+        """
+        :param file: binary file to write to, closed with the writer
+        :param channels: channel count of the packets, 1 or 2
+        :param serial: stream serial number, should be unique per file
+        :param page_duration: seconds of audio per page
+        :param comments: Vorbis comments, e.g. TITLE
+        :param pre_skip: 48kHz samples players discard at the start, the lookahead of the encoder
+        """
+        self.file = file
+        self.channels = channels
+        self.granule = 0
+        self.bytes_written = 0
+
+        self._serial = serial
+        self._sequence = 0
+        self._page_samples = int(page_duration * audio.SAMPLE_RATE)
+        self._segments = []
+        self._packets = []
+        self._pending_samples = 0
+
+        # Each header gets a page of its own, audio starts on the next page
+        head = _OPUS_HEAD.pack(b"OpusHead", 1, channels, pre_skip, audio.SAMPLE_RATE, 0, 0)
+        self._write_page([head], _BEGIN_OF_STREAM, 0)
+
+        vendor = VENDOR.encode()
+        tags = [f"{key}={value}".encode() for key, value in (comments or {}).items()]
+        self._write_page([b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", len(tags)) +
+                          b"".join(struct.pack("<I", len(tag)) + tag for tag in tags)], 0, 0)
+
+    def write(self, packet: bytes):
+        lacing = self._lacing(len(packet))
+        if len(self._segments) + len(lacing) > MAX_SEGMENTS:
+            self._flush()
+
+        self._segments += lacing
+        self._packets.append(packet)
+        samples = packet_samples(packet)
+        self.granule += samples
+        self._pending_samples += samples
+
+        if self._pending_samples >= self._page_samples:
+            self._flush()
+
+    def write_silence(self, samples: int):
+        """
+        Fills a gap with silence, rounded to whole 20ms frames
+        """
+        for _ in range(round(samples / packet_samples(SILENCE_FRAME))):
+            self.write(SILENCE_FRAME)
+
+    def close(self):
+        self._flush(_END_OF_STREAM, force=True)
+        self.file.close()
+
+    def _flush(self, flags: int = 0, force: bool = False):
+        if not self._packets and not force:
+            return
+        self._write_page(self._packets, flags, self.granule, self._segments)
+        self._segments = []
+        self._packets = []
+        self._pending_samples = 0
+
+    def _write_page(self, packets: list[bytes], flags: int, granule: int, segments: list[int] | None = None):
+        if segments is None:
+            segments = [value for packet in packets for value in self._lacing(len(packet))]
+
+        header = _PAGE_HEADER.pack(b"OggS", 0, flags, granule, self._serial, self._sequence, 0, len(segments))
+        page = bytearray(header)
+        page += bytes(segments)
+        for packet in packets:
+            page += packet
+        # The CRC is computed with its own field zeroed
+        struct.pack_into("<I", page, 22, ogg_crc(page))
+
+        self.file.write(page)
+        self._sequence += 1
+        self.bytes_written += len(page)
+
+    @staticmethod
+    def _lacing(length: int) -> list[int]:
+        # A packet ends with the first segment shorter than 255 bytes, possibly empty
+        return [255] * (length // 255) + [length % 255]
@@ -1,8 +1,31 @@
+import ctypes
 import enum
 from typing import Any
 
-from opuslib import APPLICATION_VOIP, Encoder
-from opuslib.api import ctl, decoder
+from opuslib import APPLICATION_RESTRICTED_LOWDELAY, APPLICATION_VOIP, Encoder
+from opuslib.api import ctl, decoder, libopus
+
+# Only in libopus >= 1.5
+_packet_has_lbrr = getattr(libopus, 'opus_packet_has_lbrr', None)
+if _packet_has_lbrr is not None:
+    _packet_has_lbrr.argtypes = (ctypes.c_char_p, ctypes.c_int32)
+    _packet_has_lbrr.restype = ctypes.c_int
+
+libopus.opus_get_version_string.restype = ctypes.c_char_p
+
+
+def version() -> str:
+    return libopus.opus_get_version_string().decode()
+
+
+def packet_has_fec(data: bytes) -> bool:
+    """
+    Whether a packet carries forward error correction data for the frame before it.
+    Assumed so with libopus versions which can't tell.
+    """
+    if _packet_has_lbrr is None:
+        return True
+    return _packet_has_lbrr(data, len(data)) == 1
 
 
 class OpusDecoder:
@@ -28,13 +51,21 @@ class OpusDecoder:
             return self._decode(None, 0)
         return self._decode(data, len(data))
 
-    def _decode(self, opus_data: bytes | None, data_len: int) -> bytes:
+    def decode_fec(self, next_data: bytes) -> bytes:
+        """
+        Recovers a lost frame from the forward error correction data in the packet after it.
+        Falls back to packet loss concealment if the packet doesn't have any.
+        :param next_data: the packet following the lost one, which still has to be decoded normally afterwards
+        """
+        return self._decode(next_data, len(next_data), fec=True)
+
+    def _decode(self, opus_data: bytes | None, data_len: int, fec: bool = False) -> bytes:
         return decoder.decode(
             self.decoder_state,
             opus_data,
             data_len,
             self.frame_size,
-            False,
+            fec,
             channels=self.channels
         )
 
@@ -46,6 +77,8 @@ class OpusDecoder:
 
 class EncodingApplication(enum.Enum):
     VOICE = APPLICATION_VOIP
+    # CELT only, the least algorithmic delay at the cost of quality at low bitrates
+    LOW_DELAY = APPLICATION_RESTRICTED_LOWDELAY
 
 
 class OpusEncoder:
@@ -58,5 +91,21 @@ class OpusEncoder:
     def encode(self, data: bytes) -> bytes:
         return self.encoder.encode(data, self.frame_size)
 
+    @property
+    def lookahead(self) -> int:
+        """
+        Algorithmic delay of the encoder on top of the frame length, in samples
+        """
+        return self.encoder.lookahead
+
+    @property
+    def complexity(self) -> int:
+        return self.encoder.complexity
+
+    @complexity.setter
+    def complexity(self, complexity: int):
+        # 0-10, lower is cheaper
+        self.encoder.complexity = complexity
+
     def reset(self):
         self.encoder.reset_state()
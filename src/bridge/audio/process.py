@@ -1,44 +1,223 @@
+import collections
+import concurrent.futures
 import queue
 import struct
 import threading
-from collections.abc import Callable
+import time
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from dataclasses import dataclass
 from functools import cached_property
-
-from bridge.audio.opus import EncodingApplication, OpusDecoder, OpusEncoder
+from typing import NamedTuple
+
+import numpy as np
+
+from bridge.audio import mix
+from bridge.audio.dsp import DspChain
+from bridge.audio.governor import DspQuality, QualityGovernor, QualityLevel
+from bridge.audio.opus import EncodingApplication, OpusDecoder, OpusEncoder, packet_has_fec
+from bridge.audio.reframe import Reframer
+from bridge.audio.spatial import SoundSource, Spatializer
+from bridge.util.trace import FrameTrace
+
+# Frames buffered per speaker before the oldest ones get dropped
+MAX_PENDING_FRAMES = 5
+# Same, for the low-delay mode
+LOW_DELAY_PENDING_FRAMES = 2
+
+# Ticks a speaker still counts as active after their last frame, so that short
+# gaps don't make the output flip between passthrough and transcoding
+SPEAKER_HANGOVER = 10
+
+# Ticks after which the state of an idle speaker is dropped
+SPEAKER_EXPIRY = 1500
+
+# How long to block waiting for input when nobody is speaking, in seconds
+IDLE_TIMEOUT = 0.1
+
+# Max. number of lost packets in a row that are filled in, longer gaps are a pause in speech
+MAX_LOST_FRAMES = 3
+
+# Stands in for the speaker of queued clips
+_CLIP = object()
+
+
+@dataclass
+class AudioProcessStats:
+    frames_in: int = 0
+    # PCM inputs shorter than a frame, carried over into the next frame
+    partial_inputs: int = 0
+    # PCM inputs longer than a frame, split into multiple frames
+    merged_inputs: int = 0
+    # Frames dropped because a speaker sent faster than real time
+    frames_overflowed: int = 0
+    # Frames older than the latency budget, dropped before encoding
+    expired_before_encode: int = 0
+    # Output frames older than the latency budget, dropped before sending
+    expired_before_send: int = 0
+    # Output frames forwarded without decoding & re-encoding
+    passthrough_frames: int = 0
+    # Output frames that went through decode & encode
+    transcoded_frames: int = 0
+    # Transcoded output frames which contained more than one speaker
+    mixed_frames: int = 0
+    # Transcoded output frames which were mixed positionally
+    spatialized_frames: int = 0
+    # Frames of speakers out of earshot, which were not decoded
+    inaudible_frames: int = 0
+    # Lost frames rebuilt from forward error correction data in the packet after them
+    fec_recovered_frames: int = 0
+    # Lost frames filled in by packet loss concealment
+    concealed_frames: int = 0
+    # Frames of clips sent as they were encoded
+    clip_frames: int = 0
+    # Frames of clips mixed with speakers
+    mixed_clip_frames: int = 0
+    # Ticks which started more than a frame late
+    late_ticks: int = 0
+    # Frames of speakers left out of the mix by the quality governor
+    governed_frames: int = 0
+    # Current quality level, 0 being full quality
+    quality_level: int = 0
+    # Share of real time spent processing, as last measured by the quality governor
+    load: float = 0.0
+
+
+class _Lost(NamedTuple):
+    """
+    Stands in for a lost packet in the frames of a speaker
+    """
+    # Packet following the lost one, to recover it from, None to conceal it
+    next_packet: bytes | None
+
+
+class _Speaker:
+    # (received at, frame, source, trace) tuples
+    frames: collections.deque[tuple[float, bytes | memoryview | _Lost, SoundSource | None, FrameTrace | None]]
+    last_active_tick: int
+    reframer: Reframer | None
+    decoder: OpusDecoder | None
+    # Set when the decoder skipped packets because they were passed through
+    decoder_stale: bool
+    # Sequence number of the last packet received, to detect lost packets
+    last_sequence: int | None
+    # Decoded audio of packets longer than a tick, played in the following ticks
+    remainder: collections.deque[np.ndarray]
+    # When & where the last packet came from, for its remainder
+    last_received_at: float
+    last_source: SoundSource | None
+
+    def __init__(self, tick: int):
+        self.frames = collections.deque()
+        self.last_active_tick = tick
+        self.reframer = None
+        self.decoder = None
+        self.decoder_stale = False
+        self.last_sequence = None
+        self.remainder = collections.deque()
+        self.last_received_at = 0.0
+        self.last_source = None
 
 
 class AudioProcessThread(threading.Thread):
+    """
+    Mixes the audio of all speakers into one output frame per tick (frame length).
+
+    With passthrough enabled and a single active speaker, their opus packets are
+    forwarded as-is instead of being decoded & re-encoded, unless a DSP chain has
+    to run over the audio.
+
+    Opus input may be longer than a tick, e.g. 20ms packets mixed into 10ms frames,
+    the decoded audio is then spread over as many ticks.
+    """
     _sample_rate: int
     _frame_length: int
+    _input_frame_length: int
+    _max_pending_frames: int
 
     _input_queue: queue.Queue
     _should_decode_input: bool
+    _passthrough: bool
+
+    _speakers: dict[Hashable, _Speaker]
+    _tick_count: int
 
-    _decoder: OpusDecoder
     _encoder: OpusEncoder
+    _encoder_stale: bool
 
     _single_sample_size = struct.calcsize("h")
 
     _source_channels: int
 
     _sink_channels: int
-    _sink_callback: Callable[[bytes], None]
+    _sink_callback: Callable[[bytes, float, FrameTrace | None], None]
+
+    _latency_budget: float | None
+
+    _dsp: DspChain | None
+    _spatializer: Spatializer | None
+
+    # Decodes the frames of a tick in parallel, speakers never share decoder state
+    _decode_pool: concurrent.futures.ThreadPoolExecutor | None
+    _decode_workers: int
+
+    # Sequence numbers wrap around at this
+    _sequence_modulus: int
+
+    # Pre-encoded frames of clips to play, in the output format, one clip after the other
+    _clips: collections.deque[Iterator[bytes]]
+    # Decodes clip frames which have to be mixed with speakers
+    _clip_decoder: OpusDecoder | None
+    _clip_decoder_stale: bool
+
+    # Lowers the quality when processing falls behind real time
+    _governor: QualityGovernor | None
+    _quality: QualityLevel | None
+    _default_complexity: int
+
+    # Sinks count expired frames on whichever thread sends them, the other stats belong to the tick thread
+    _expired_lock: threading.Lock
 
     _end_thread: threading.Event
 
+    stats: AudioProcessStats
+
     def __init__(
         self,
-        sink_callback: Callable[[bytes], None],
+        sink_callback: Callable[[bytes, float, FrameTrace | None], None],
         sample_rate: int,
         frame_length: int, # Frame length in milliseconds
         source_channels: int,
         sink_channels: int,
-        decode=False
+        decode=False,
+        passthrough=False,
+        latency_budget: float | None = None, # Max. frame age in seconds
+        dsp: DspChain | None = None,
+        spatializer: Spatializer | None = None,
+        decode_workers: int = 0,
+        sequence_bits: int = 64,
+        governor: QualityGovernor | None = None,
+        input_frame_length: int | None = None, # Length of opus input in milliseconds, if not the frame length
+        application: EncodingApplication = EncodingApplication.VOICE,
+        max_pending_frames: int = MAX_PENDING_FRAMES
     ):
         super().__init__(name="AudioProcessThread")
 
+        if input_frame_length is None:
+            input_frame_length = frame_length
+        if input_frame_length % frame_length:
+            raise ValueError("input frame length must be a multiple of the frame length")
+
+        if passthrough and not decode:
+            raise ValueError("passthrough requires opus-encoded input")
+        if passthrough and input_frame_length != frame_length:
+            raise ValueError("passthrough requires input frames of the output frame length")
+        if spatializer is not None and (source_channels != 1 or sink_channels != 2):
+            raise ValueError("positional audio requires mono input & stereo output")
+
         self._sample_rate = sample_rate
         self._frame_length = frame_length
+        self._input_frame_length = input_frame_length
+        self._max_pending_frames = max_pending_frames
 
         self._source_channels = source_channels
 
@@ -46,53 +225,468 @@ class AudioProcessThread(threading.Thread):
         self._sink_callback = sink_callback
 
         self._should_decode_input = decode
+        self._passthrough = passthrough
+        self._latency_budget = latency_budget
+        self._dsp = dsp if dsp else None
+        self._spatializer = spatializer
 
-        self._input_queue = queue.Queue()
-        self._decoder = OpusDecoder(sample_rate, self._samples_per_frame, source_channels)
-
-        self._encoder = OpusEncoder(sample_rate, self._samples_per_frame, sink_channels, EncodingApplication.VOICE)
+        self._decode_workers = decode_workers if decode else 0
+        self._decode_pool = None
+        if self._decode_workers > 0:
+            self._decode_pool = concurrent.futures.ThreadPoolExecutor(self._decode_workers,
+                                                                      thread_name_prefix="AudioDecode")
 
-        self._end_thread = threading.Event()
+        self._sequence_modulus = 1 << sequence_bits
 
-    def enqueue(self, data: bytes):
-        self._input_queue.put(data)
+        self._clips = collections.deque()
+        self._clip_decoder = None
+        self._clip_decoder_stale = False
 
-    def run(self) -> None:
-        while not self._end_thread.is_set():
-            try:
-                to_encode = self._input_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
+        self._input_queue = queue.Queue()
+        self._speakers = {}
+        self._tick_count = 0
 
-            # Decode opus audio if we need to
-            if self._should_decode_input:
-                to_encode = self._decoder.decode(to_encode)
+        self._encoder = OpusEncoder(sample_rate, self._samples_per_frame, sink_channels, application)
+        self._encoder_stale = False
 
-            # Upmix or downmix decoded audio before encoding frame
-            if self._source_channels != self._sink_channels:
-                to_encode = self._mix(to_encode)
+        self._governor = governor
+        self._quality = governor.quality if governor is not None else None
+        self._default_complexity = self._encoder.complexity
 
-            # Encode frame
-            result = self._encoder.encode(to_encode)
+        self._expired_lock = threading.Lock()
+        self._end_thread = threading.Event()
 
-            # Send to sink
-            self._sink_callback(result)
+        self.stats = AudioProcessStats()
+
+    def enqueue(self, data: bytes, speaker: Hashable = None, received_at: float | None = None,
+                source: SoundSource | None = None, sequence: int | None = None, trace: FrameTrace | None = None):
+        """
+        Enqueues audio for processing
+        :param data: opus-encoded frame, or PCM of any length
+        :param speaker: source of the frame, every speaker gets its own decoder state
+        :param received_at: time.monotonic() timestamp of when the audio entered the bridge
+        :param source: position the audio was emitted at, if it's positional
+        :param sequence: sequence number of an opus packet, to recover lost packets
+        :param trace: trace of a sampled frame, passed on to the sink
+        """
+        if received_at is None:
+            received_at = time.monotonic()
+        if trace is not None:
+            trace.mark("enqueue")
+        self._input_queue.put((speaker, data, received_at, source, sequence, trace))
+
+    def play_clip(self, frames: Iterable[bytes]):
+        """
+        Queues a clip for playing after any clip that is still playing
+        :param frames: opus frames encoded for the sink's channel count, sent without re-encoding
+                       unless someone is speaking at the same time
+        """
+        self._input_queue.put((_CLIP, frames, 0.0, None, None, None))
+
+    def forget_speaker(self, speaker: Hashable):
+        """
+        Drops the state of a speaker, e.g. after they left
+        """
+        self._input_queue.put((speaker, None, 0.0, None, None, None))
+
+    @property
+    def encoder_lookahead(self) -> int:
+        """
+        Delay the output encoder adds, in samples
+        """
+        return self._encoder.lookahead
+
+    def is_within_budget(self, received_at: float) -> bool:
+        """
+        Checks whether a processed frame may still be sent, counting it as expired if not.
+        Used by the sink right before sending, from any thread.
+        :param received_at: timestamp passed to the sink callback
+        """
+        if self._latency_budget is None or time.monotonic() - received_at <= self._latency_budget:
+            return True
+        with self._expired_lock:
+            self.stats.expired_before_send += 1
+        return False
+
+    def decode_frames(self, frames: list[tuple[Hashable, bytes]]) -> list[np.ndarray]:
+        """
+        Decodes one opus frame of each speaker with their decoder state, spread over the
+        decode pool as in a tick. Only for when the thread isn't running, e.g. in benchmarks.
+        :param frames: (speaker, frame) pairs, with every speaker at most once
+        :return: decoded samples of every frame
+        """
+        jobs = []
+        for speaker_id, frame in frames:
+            speaker = self._speakers.get(speaker_id)
+            if speaker is None:
+                speaker = _Speaker(self._tick_count)
+                self._speakers[speaker_id] = speaker
+            jobs.append((speaker, frame))
+        return self._decode_all(jobs)
 
-    def _mix(self, data: bytes) -> bytes:
-        output = b""
+    def run(self) -> None:
+        next_tick = time.monotonic()
 
-        i = 0
-        while i < len(data):
-            for j in range(self._sink_channels):
-                output += data[i:i + self._single_sample_size]
-            i += (self._single_sample_size * self._source_channels)
+        while not self._end_thread.is_set():
+            if not self._speakers and not self._clips:
+                # Nobody is speaking, block until someone does & tick right away
+                if not self._receive(IDLE_TIMEOUT):
+                    continue
+                next_tick = time.monotonic()
+
+            # Collect input until the next tick is due
+            while self._receive(next_tick - time.monotonic()):
+                pass
+
+            started_at = time.monotonic()
+            late = started_at - next_tick > self._frame_seconds
+            if late:
+                self.stats.late_ticks += 1
+
+            self._tick()
+
+            if self._governor is not None:
+                quality = self._governor.record(time.monotonic() - started_at, late)
+                self.stats.load = self._governor.load
+                if quality is not None:
+                    self._set_quality(quality)
+
+            self._tick_count += 1
+            next_tick += self._frame_seconds
+
+            # Don't try to catch up after stalling for a long time
+            if time.monotonic() - next_tick > self._frame_seconds * self._max_pending_frames:
+                next_tick = time.monotonic()
+
+    def _set_quality(self, quality: QualityLevel):
+        self._quality = quality
+        self.stats.quality_level = self._governor.level
+        self._encoder.complexity = quality.complexity if quality.complexity is not None else self._default_complexity
+
+    def _receive(self, timeout: float) -> bool:
+        try:
+            if timeout > 0:
+                speaker_id, data, received_at, source, sequence, trace = self._input_queue.get(timeout=timeout)
+            else:
+                speaker_id, data, received_at, source, sequence, trace = self._input_queue.get_nowait()
+        except queue.Empty:
+            return False
+
+        if trace is not None:
+            trace.mark("queue")
+
+        if speaker_id is _CLIP:
+            self._clips.append(iter(data))
+            return True
+
+        if data is None:
+            self._speakers.pop(speaker_id, None)
+            return True
+
+        speaker = self._speakers.get(speaker_id)
+        if speaker is None:
+            speaker = _Speaker(self._tick_count)
+            self._speakers[speaker_id] = speaker
+
+        if self._should_decode_input:
+            if sequence is not None:
+                self._fill_gap(speaker, sequence, data, received_at, source)
+            self._add_frame(speaker, data, received_at, source, trace)
+            return True
+
+        # PCM input isn't guaranteed to be exactly one frame, slice it into frames
+        if len(data) < self._source_frame_size:
+            self.stats.partial_inputs += 1
+        elif len(data) > self._source_frame_size:
+            self.stats.merged_inputs += 1
+
+        if speaker.reframer is None:
+            speaker.reframer = Reframer(self._source_frame_size)
+
+        frames = speaker.reframer.push(data)
+
+        # A burst of frames is audio that should have been heard before the
+        # last frame, date the earlier frames back so stale ones get shed
+        for i, frame in enumerate(frames, start=1 - len(frames)):
+            self._add_frame(speaker, frame, received_at + i * self._frame_seconds, source, trace if i == 0 else None)
+        return True
+
+    def _fill_gap(self, speaker: _Speaker, sequence: int, data: bytes, received_at: float,
+                  source: SoundSource | None):
+        """
+        Queues stand-ins for packets lost right before this one. The last lost packet is
+        recovered from the FEC data of this one, any earlier ones are concealed.
+        """
+        last_sequence = speaker.last_sequence
+        speaker.last_sequence = sequence
+        if last_sequence is None:
+            return
+
+        # Reordered & duplicate packets wrap around to a huge gap & are ignored
+        lost = (sequence - last_sequence) % self._sequence_modulus - 1
+        if not 0 < lost <= MAX_LOST_FRAMES:
+            return
+
+        fec_packet = data if packet_has_fec(data) else None
+        for i in range(lost, 0, -1):
+            stand_in = _Lost(fec_packet if i == 1 else None)
+            self._add_frame(speaker, stand_in, received_at - i * self._frame_seconds, source, None)
+
+    def _add_frame(self, speaker: _Speaker, frame: bytes | memoryview | _Lost, received_at: float,
+                   source: SoundSource | None, trace: FrameTrace | None):
+        if len(speaker.frames) >= self._max_pending_frames:
+            speaker.frames.popleft()
+            self.stats.frames_overflowed += 1
+
+        speaker.frames.append((received_at, frame, source, trace))
+        if not isinstance(frame, _Lost):
+            self.stats.frames_in += 1
+
+    def _tick(self):
+        tick = self._tick_count
+
+        # Frames received before this are too old to be heard
+        deadline = float('-inf')
+        if self._latency_budget is not None:
+            deadline = time.monotonic() - self._latency_budget
+
+        # Take one frame of every speaker that has one
+        ready: list[tuple[_Speaker, bytes | memoryview | _Lost, SoundSource | None]] = []
+        oldest = float('inf')
+        active = 0
+        # Only one trace is followed per output frame
+        trace = None
+        for speaker_id, speaker in list(self._speakers.items()):
+            frames = speaker.frames
+            while frames and frames[0][0] < deadline:
+                frames.popleft()
+                self.stats.expired_before_encode += 1
+
+            if speaker.remainder:
+                # Rest of a packet longer than a tick, its audio starts a tick later
+                speaker.last_received_at += self._frame_seconds
+                ready.append((speaker, speaker.remainder.popleft(), speaker.last_source))
+                oldest = min(oldest, speaker.last_received_at)
+                speaker.last_active_tick = tick
+            elif frames:
+                received_at, data, source, frame_trace = frames.popleft()
+                speaker.last_received_at = received_at
+                speaker.last_source = source
+                ready.append((speaker, data, source))
+                if frame_trace is not None and trace is None:
+                    trace = frame_trace
+                    trace.mark("tick")
+                oldest = min(oldest, received_at)
+                speaker.last_active_tick = tick
+
+            idle_ticks = tick - speaker.last_active_tick
+            if idle_ticks <= SPEAKER_HANGOVER:
+                active += 1
+            elif idle_ticks > SPEAKER_EXPIRY:
+                del self._speakers[speaker_id]
+
+        clip_frame = self._next_clip_frame()
+
+        if not ready:
+            if clip_frame is not None:
+                self._send_clip_frame(clip_frame)
+            return
+
+        dsp = self._dsp
+        shaping = True
+        quality = self._quality
+        if quality is not None:
+            if quality.dsp == DspQuality.OFF:
+                dsp = None
+            shaping = quality.dsp == DspQuality.FULL
+
+            if quality.max_speakers is not None and len(ready) > quality.max_speakers:
+                ready = self._loudest(ready, quality.max_speakers)
+
+        if (self._passthrough and active == 1 and dsp is None and ready[0][2] is None
+                and clip_frame is None):
+            speaker, data, _ = ready[0]
+            if isinstance(data, _Lost):
+                # The receiver recovers from the gap on its own
+                return
+
+            # Both codec states miss this packet now, reset them before they're used again
+            speaker.decoder_stale = True
+            self._encoder_stale = True
+            self.stats.passthrough_frames += 1
+            self._sink_callback(data, oldest, trace)
+            return
+
+        channels = self._source_channels
+        if self._spatializer is not None and any(source is not None for _, _, source in ready):
+            gains = self._spatializer.gains([source for _, _, source in ready])
+
+            # Speakers out of earshot don't need to be decoded
+            audible = gains.any(axis=1)
+            jobs = []
+            for (speaker, data, _), is_audible in zip(ready, audible):
+                if is_audible:
+                    jobs.append((speaker, data))
+                else:
+                    speaker.decoder_stale = True
+                    self.stats.inaudible_frames += 1
+
+            if not jobs:
+                if clip_frame is not None:
+                    self._send_clip_frame(clip_frame)
+                return
+
+            frames = self._decode_all(jobs)
+            if trace is not None:
+                trace.mark("decode")
+
+            frame = self._spatializer.mix(frames, gains[audible], self._samples_per_frame)
+            channels = 2
+            self.stats.spatialized_frames += 1
+        else:
+            frames = self._decode_all([(speaker, data) for speaker, data, _ in ready])
+            if trace is not None:
+                trace.mark("decode")
+            frame = mix.mix(frames, self._source_frame_samples)
+
+        if dsp is not None:
+            frame = dsp.process(frame, shaping)
+
+        if trace is not None:
+            trace.mark("mix")
+
+        # Upmix or downmix audio before encoding frame
+        frame = mix.convert_channels(frame, channels, self._sink_channels)
+
+        if clip_frame is not None:
+            frame = mix.mix([frame, self._decode_clip_frame(clip_frame)], len(frame))
+            self.stats.mixed_clip_frames += 1
+
+        if self._encoder_stale:
+            self._encoder.reset()
+            self._encoder_stale = False
+
+        result = self._encoder.encode(frame.tobytes())
+        if trace is not None:
+            trace.mark("encode")
+
+        self.stats.transcoded_frames += 1
+        if len(ready) > 1:
+            self.stats.mixed_frames += 1
+
+        self._sink_callback(result, oldest, trace)
+
+    def _loudest(self, ready: list[tuple[_Speaker, bytes | memoryview | _Lost, SoundSource | None]],
+                 count: int) -> list[tuple[_Speaker, bytes | memoryview | _Lost, SoundSource | None]]:
+        """
+        Leaves out all but the given number of speakers, the ones with the biggest packets,
+        opus spends more bits on speech than on silence & background noise
+        """
+        ready = sorted(ready, key=lambda item: len(item[1]) if isinstance(item[1], (bytes, memoryview)) else 0,
+                       reverse=True)
+        for speaker, _, _ in ready[count:]:
+            speaker.decoder_stale = True
+        self.stats.governed_frames += len(ready) - count
+        return ready[:count]
+
+    def _next_clip_frame(self) -> bytes | None:
+        while self._clips:
+            frame = next(self._clips[0], None)
+            if frame is not None:
+                return frame
+            self._clips.popleft()
+        return None
+
+    def _send_clip_frame(self, frame: bytes):
+        # Neither codec state saw this frame
+        self._encoder_stale = True
+        self._clip_decoder_stale = True
+        self.stats.clip_frames += 1
+        self._sink_callback(frame, time.monotonic(), None)
+
+    def _decode_clip_frame(self, frame: bytes) -> np.ndarray:
+        if self._clip_decoder is None:
+            self._clip_decoder = OpusDecoder(self._sample_rate, self._samples_per_frame, self._sink_channels)
+        elif self._clip_decoder_stale:
+            self._clip_decoder.reset()
+        self._clip_decoder_stale = False
+        return mix.to_samples(self._clip_decoder.decode(frame))
+
+    def _decode_all(self, jobs: list[tuple[_Speaker, bytes | memoryview | _Lost]]) -> list[np.ndarray]:
+        """
+        Decodes one frame of each speaker, spread over the decode pool if there is one.
+        libopus releases the GIL, so decoding runs truly parallel.
+        """
+        for _, data in jobs:
+            if isinstance(data, _Lost):
+                if data.next_packet is not None:
+                    self.stats.fec_recovered_frames += 1
+                else:
+                    self.stats.concealed_frames += 1
+
+        if self._decode_pool is None or len(jobs) < 2:
+            return self._decode_batch(jobs)
+
+        # One share per worker, the tick thread decodes the first share itself
+        shares = min(self._decode_workers + 1, len(jobs))
+        futures = [self._decode_pool.submit(self._decode_batch, jobs[i::shares]) for i in range(1, shares)]
+
+        frames: list[np.ndarray | None] = [None] * len(jobs)
+        frames[0::shares] = self._decode_batch(jobs[0::shares])
+        for i, future in enumerate(futures, start=1):
+            frames[i::shares] = future.result()
+        return frames
+
+    def _decode_batch(self, jobs: list[tuple[_Speaker, bytes | memoryview | _Lost]]) -> list[np.ndarray]:
+        # Only touches the state of the given speakers, safe to run in any thread
+        return [self._decode(speaker, data) for speaker, data in jobs]
+
+    def _decode(self, speaker: _Speaker, data: bytes | memoryview | _Lost | np.ndarray) -> np.ndarray:
+        if isinstance(data, np.ndarray):
+            # Already decoded with the packet it belongs to
+            return data
+        if not self._should_decode_input:
+            return mix.to_samples(data)
+
+        if speaker.decoder is None:
+            # Decoding to the source channel count, libopus up- or downmixes packets as needed
+            speaker.decoder = OpusDecoder(self._sample_rate, self._input_samples_per_frame, self._source_channels)
+        elif speaker.decoder_stale:
+            speaker.decoder.reset()
+        speaker.decoder_stale = False
+
+        if isinstance(data, _Lost):
+            if data.next_packet is not None:
+                samples = mix.to_samples(speaker.decoder.decode_fec(data.next_packet))
+            else:
+                samples = mix.to_samples(speaker.decoder.decode(None))
+        else:
+            samples = mix.to_samples(speaker.decoder.decode(data))
+
+        # Packets longer than a tick are spread over the next ticks
+        frame_samples = self._source_frame_samples
+        if len(samples) > frame_samples:
+            speaker.remainder.extend(samples[i:i + frame_samples]
+                                     for i in range(frame_samples, len(samples), frame_samples))
+            samples = samples[:frame_samples]
+        return samples
 
-        return output
+    @cached_property
+    def _frame_seconds(self):
+        return self._frame_length / 1000
 
     @cached_property
     def _samples_per_frame(self):
         return int(self._sample_rate / 1000 * self._frame_length)
 
+    @cached_property
+    def _input_samples_per_frame(self):
+        return int(self._sample_rate / 1000 * self._input_frame_length)
+
+    @cached_property
+    def _source_frame_samples(self):
+        return self._samples_per_frame * self._source_channels
+
     @cached_property
     def _source_sample_size(self):
         return self._single_sample_size * self._source_channels
@@ -113,6 +707,7 @@ class AudioProcessThread(threading.Thread):
         print('\t========AudioProcessThread========')
         print(f'\tSample rate: {self._sample_rate}Hz\r')
         print(f'\tFrame length: {self._frame_length}ms')
+        print(f'\tInput frame length: {self._input_frame_length}ms')
         print(f'\tSamples/frame: {self._samples_per_frame} samples')
 
         print(f'\tSource channels: {self._source_channels}')
@@ -123,8 +718,18 @@ class AudioProcessThread(threading.Thread):
 
         print(f'\tSource frame size: {self._source_frame_size}')
         print(f'\tSink frame size: {self._sink_frame_size}')
+
+        print(f'\tPassthrough: {self._passthrough}')
+        print(f'\tLatency budget: {self._latency_budget}s')
+        print(f'\tDecode workers: {self._decode_workers}')
+        print(f'\tDSP stages: {", ".join(stage.name for stage in self._dsp.stages) if self._dsp else "none"}')
         print('\t==================================')
 
     def stop(self):
         self._end_thread.set()
-        super().join()
+        # May never have been started, e.g. when only decoding frames
+        if self.ident is not None:
+            super().join()
+
+        if self._decode_pool is not None:
+            self._decode_pool.shutdown()
@@ -0,0 +1,146 @@
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from bridge import audio
+from bridge.audio.ogg import OggOpusWriter
+
+# Packets waiting for the writer thread, dropped when it falls behind
+QUEUE_SIZE = 2048
+
+# How far a track may lag behind the time its packets arrive at before the gap is filled
+# with silence, so network jitter doesn't insert silence mid-sentence
+GAP_TOLERANCE = 0.1  # seconds
+
+WRITE_BUFFER_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RecorderStats:
+    tracks: int = 0
+    packets: int = 0
+    silence_frames: int = 0
+    # Packets the writer thread didn't keep up with
+    dropped_packets: int = 0
+    bytes_written: int = 0
+
+
+class _Track:
+    writer: OggOpusWriter
+    # Seconds of audio written, relative to the start of the session
+    position: float
+
+    def __init__(self, writer: OggOpusWriter):
+        self.writer = writer
+        self.position = 0.0
+
+
+class SessionRecorder(threading.Thread):
+    """
+    Records the opus packets passing through the bridge to an Ogg/Opus file per track
+    without decoding them. Tracks start at the same time, gaps are filled with silence,
+    so the files of a session line up.
+    """
+    directory: str
+    stats: RecorderStats
+
+    _queue: queue.Queue[tuple[str, int, int, float, bytes]]
+    # Packets are recorded from the audio threads & the reactor at once
+    _dropped_lock: threading.Lock
+    _tracks: dict[str, _Track]
+    _started_at: float | None
+    _end_thread: threading.Event
+
+    def __init__(self, directory: str):
+        """
+        :param directory: directory to create the session's directory in
+        """
+        super().__init__(name="SessionRecorder", daemon=True)
+        self.directory = os.path.join(directory, time.strftime("%Y%m%d-%H%M%S"))
+        self.stats = RecorderStats()
+
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._dropped_lock = threading.Lock()
+        self._tracks = {}
+        self._started_at = None
+        self._end_thread = threading.Event()
+
+    def record(self, track: str, channels: int, packet: bytes, pre_skip: int = 0):
+        """
+        Records a packet, from any thread
+        :param track: name of the file the packet is written to
+        :param channels: channel count of the track, the first packet of a track decides it
+        :param pre_skip: encoder lookahead of the track in 48kHz samples, the first packet of a track decides it
+        """
+        try:
+            self._queue.put_nowait((track, channels, pre_skip, time.monotonic(), packet))
+        except queue.Full:
+            with self._dropped_lock:
+                self.stats.dropped_packets += 1
+
+    def run(self) -> None:
+        while not self._end_thread.is_set():
+            try:
+                self._write(*self._queue.get(timeout=audio.FRAME_LENGTH / 1000))
+            except queue.Empty:
+                continue
+
+        # Write what is left before closing the files
+        while True:
+            try:
+                self._write(*self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _write(self, name: str, channels: int, pre_skip: int, received_at: float, packet: bytes):
+        if self._started_at is None:
+            self._started_at = received_at
+            os.makedirs(self.directory, exist_ok=True)
+            logger.info(f"Recording to {self.directory}")
+
+        track = self._tracks.get(name)
+        if track is None:
+            track = self._open(name, channels, pre_skip)
+
+        # Fill gaps, e.g. while the speaker was silent or packets were lost
+        gap = received_at - self._started_at - track.position
+        if gap > GAP_TOLERANCE:
+            silence = round(gap * 1000 / audio.FRAME_LENGTH)
+            track.writer.write_silence(silence * audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH)
+            self.stats.silence_frames += silence
+
+        bytes_written = track.writer.bytes_written
+        track.writer.write(packet)
+        track.position = track.writer.granule / audio.SAMPLE_RATE
+
+        self.stats.packets += 1
+        self.stats.bytes_written += track.writer.bytes_written - bytes_written
+
+    def _open(self, name: str, channels: int, pre_skip: int) -> _Track:
+        file = open(os.path.join(self.directory, f"{name}.opus"), "wb", buffering=WRITE_BUFFER_SIZE)
+        writer = OggOpusWriter(file, channels, zlib.crc32(name.encode()), comments={"TITLE": name},
+                               pre_skip=pre_skip)
+        track = self._tracks[name] = _Track(writer)
+
+        self.stats.tracks += 1
+        self.stats.bytes_written += writer.bytes_written
+        return track
+
+    def stop(self):
+        self._end_thread.set()
+        super().join()
+
+        for track in self._tracks.values():
+            bytes_written = track.writer.bytes_written
+            track.writer.close()
+            self.stats.bytes_written += track.writer.bytes_written - bytes_written
+        self._tracks.clear()
+
+        if self._started_at is not None:
+            logger.info(f"Recorded {self.stats.packets} packets to {self.directory}")
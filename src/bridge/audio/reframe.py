@@ -0,0 +1,53 @@
+class Reframer:
+    """
+    Slices PCM input of arbitrary length into frames of exactly ``frame_size`` bytes.
+
+    Whole frames are returned as views into the input, only the remainder which
+    doesn't fill a frame yet is copied into the carry-over buffer.
+    """
+    _frame_size: int
+    _carry: bytearray
+
+    def __init__(self, frame_size: int):
+        self._frame_size = frame_size
+        self._carry = bytearray()
+
+    def push(self, data: bytes) -> list[bytes | memoryview]:
+        """
+        Adds PCM to the reframer
+        :param data: PCM of any length
+        :return: all frames which are complete now
+        """
+        frame_size = self._frame_size
+        view = memoryview(data)
+        frames: list[bytes | memoryview] = []
+
+        # Complete the frame started by the previous input
+        if self._carry:
+            missing = frame_size - len(self._carry)
+            if len(view) < missing:
+                self._carry += view
+                return frames
+
+            self._carry += view[:missing]
+            frames.append(bytes(self._carry))
+            self._carry.clear()
+            view = view[missing:]
+
+        whole = len(view) - len(view) % frame_size
+        for offset in range(0, whole, frame_size):
+            frames.append(view[offset:offset + frame_size])
+
+        if whole < len(view):
+            self._carry += view[whole:]
+
+        return frames
+
+    def pending(self) -> int:
+        """
+        Number of bytes waiting in the carry-over buffer
+        """
+        return len(self._carry)
+
+    def reset(self):
+        self._carry.clear()
@@ -0,0 +1,92 @@
+import math
+from collections.abc import Callable, Sequence
+from typing import NamedTuple
+
+import numpy as np
+
+from bridge.audio import mix
+
+
+class SoundSource(NamedTuple):
+    """
+    Where a frame of audio was emitted in the world
+    """
+    x: float
+    y: float
+    z: float
+    # Distance at which the sound becomes inaudible
+    max_distance: float
+    # Distance up to which the sound plays at full volume
+    fade_distance: float
+
+
+class ListenerPose(NamedTuple):
+    x: float
+    y: float
+    z: float
+    # Minecraft yaw in degrees, 0 facing south (+Z), 90 facing west (-X)
+    yaw: float
+
+
+class Spatializer:
+    """
+    Mixes mono frames of positioned speakers into a stereo frame, attenuated by
+    distance and panned by direction relative to the listener. Gains for all speakers
+    of a tick are computed at once, the mix is a single (2 x N) @ (N x samples) product.
+    """
+    _listener: Callable[[], ListenerPose | None]
+
+    def __init__(self, listener: Callable[[], ListenerPose | None]):
+        self._listener = listener
+
+    def gains(self, sources: Sequence[SoundSource | None]) -> np.ndarray:
+        """
+        :param sources: where each speaker is, None for unpositioned speakers which are played as-is
+        :return: (N x 2) left & right gain per speaker
+        """
+        gains = np.ones((len(sources), 2), dtype=np.float32)
+
+        pose = self._listener()
+        positioned = [i for i, source in enumerate(sources) if source is not None]
+        if pose is None or not positioned:
+            return gains
+
+        located = np.array([sources[i] for i in positioned], dtype=np.float64)
+        offset = located[:, :3] - (pose.x, pose.y, pose.z)
+        max_distance = located[:, 3]
+        fade_distance = located[:, 4]
+
+        # Full volume up to the fade distance, then linearly down to zero at max. distance
+        distance = np.sqrt(np.einsum('ij,ij->i', offset, offset))
+        fade_range = np.maximum(max_distance - fade_distance, 1e-6)
+        volume = np.clip(1 - (distance - fade_distance) / fade_range, 0, 1)
+
+        # Pan by how far the sound is to the right of the listener, horizontally
+        yaw = math.radians(pose.yaw)
+        horizontal = offset[:, [0, 2]]
+        horizontal_distance = np.sqrt(np.einsum('ij,ij->i', horizontal, horizontal))
+        rightness = horizontal @ (-math.cos(yaw), -math.sin(yaw))
+        pan = np.divide(rightness, horizontal_distance,
+                        out=np.zeros_like(rightness), where=horizontal_distance > 1e-6)
+
+        gains[positioned, 0] = volume * np.minimum(1, 1 - pan)
+        gains[positioned, 1] = volume * np.minimum(1, 1 + pan)
+
+        return gains
+
+    @staticmethod
+    def mix(frames: Sequence[np.ndarray], gains: np.ndarray, samples_per_frame: int) -> np.ndarray:
+        """
+        :param frames: mono 16-bit PCM frames, one per speaker
+        :param gains: (N x 2) gains as returned by :meth:`gains`
+        :return: interleaved stereo 16-bit PCM
+        """
+        stacked = np.zeros((len(frames), samples_per_frame), dtype=np.float32)
+        for i, frame in enumerate(frames):
+            n = min(len(frame), samples_per_frame)
+            stacked[i, :n] = frame[:n]
+
+        # (2 x samples), transposed into interleaved left/right samples
+        stereo = gains.T @ stacked
+        np.clip(stereo, mix.SAMPLE_MIN, mix.SAMPLE_MAX, out=stereo)
+        return stereo.T.astype(mix.SAMPLE_DTYPE, order='C').ravel()
@@ -1,38 +1,165 @@
+import asyncio
+import dataclasses
+import logging
 from collections.abc import Callable
+from dataclasses import dataclass
 
 import discord.client
 from discord import ApplicationContext, VoiceClient, option, sinks, slash_command
+from discord.sinks import RawData
+
+from bridge.audio.ogg import packet_samples
+from bridge.endpoint import OnAudio, ReceiveMode, VoiceEndpoint
+from bridge.util.profiling import Profiler
 
 
 class VoiceBridgeAudioSink(sinks.Sink):
-    _on_voice_received: Callable[[bytes], None]
+    _on_voice_received: Callable[[bytes, int, int | None], None]
 
-    def __init__(self, on_voice_received: Callable[[bytes], None]):
+    def __init__(self, on_voice_received: Callable[[bytes, int, int | None], None]):
         super().__init__(filters=None)
         self._on_voice_received = on_voice_received
 
     def write(self, data, user):
-        self._on_voice_received(data)
+        self._on_voice_received(data, user, None)
+
+
+class RawOpusAudioSink(VoiceBridgeAudioSink):
+    """
+    Sink receiving the opus packets of every user as sent by Discord, without decoding them.
+    Only works with a :class:`BridgeVoiceClient`.
+    """
+
+    def write_opus(self, data: bytes, user: int, sequence: int):
+        self._on_voice_received(data, user, sequence)
+
+
+class BridgeVoiceClient(VoiceClient):
+    def start_recording(self, sink, callback, *args, sync_start: bool = False):
+        super().start_recording(sink, callback, *args, sync_start=sync_start)
+
+        if isinstance(sink, RawOpusAudioSink):
+            # Packets never reach pycord's decoder, so don't keep its thread polling
+            self.decoder.stop()
+
+    def send_audio_packet(self, data: bytes, *, encode: bool = True):
+        if encode:
+            return super().send_audio_packet(data, encode=encode)
+
+        # pycord advances the RTP timestamp by 20ms whatever the length of the packet,
+        # advance it by the actual length so shorter frames play at the right time
+        timestamp = self.timestamp
+        super().send_audio_packet(data, encode=False)
+        self.timestamp = (timestamp + packet_samples(data)) & 0xFFFFFFFF
+
+    def unpack_audio(self, data):
+        if not isinstance(self.sink, RawOpusAudioSink):
+            return super().unpack_audio(data)
+
+        # RTCP
+        if 200 <= data[1] <= 204:
+            return
+        if self.paused:
+            return
+
+        data = RawData(data, self)
+
+        # Frame of silence
+        if data.decrypted_data == b"\xf8\xff\xfe":
+            return
+
+        # Drop packets until the speaking event mapped the SSRC to a user,
+        # pycord would block the receive thread waiting for it
+        ssrc_info = self.ws.ssrc_map.get(data.ssrc)
+        if ssrc_info is None:
+            return
+
+        self.sink.write_opus(bytes(data.decrypted_data), ssrc_info["user_id"], data.sequence)
+
+
+@dataclass
+class FanoutStats:
+    frames: int = 0
+    # Packets sent, one per connected voice client per frame
+    sends: int = 0
+    send_failures: int = 0
+    max_subscribers: int = 0
+
+
+class VoiceFanout:
+    """
+    Sends every encoded frame to all voice channels the bot is connected to.
+    A failing voice client is skipped for that frame without holding up the others.
+    """
+    bot: discord.Bot
+
+    stats: FanoutStats
+
+    # Channels whose last send failed, to log a failure once and not for every frame
+    _failing: set[int]
+
+    def __init__(self, bot: discord.Bot):
+        self.bot = bot
+        self.stats = FanoutStats()
+        self._failing = set()
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def send(self, encoded_frame: bytes):
+        stats = self.stats
+        stats.frames += 1
+
+        subscribers = 0
+        for voice_client in self.bot.voice_clients:
+            if not isinstance(voice_client, VoiceClient) or not voice_client.is_connected():
+                continue
+            subscribers += 1
+
+            channel_id = voice_client.channel.id
+            try:
+                voice_client.send_audio_packet(encoded_frame, encode=False)
+            except Exception:
+                stats.send_failures += 1
+                if channel_id not in self._failing:
+                    self._failing.add(channel_id)
+                    self.logger.exception(f"Sending audio to channel {channel_id} failed")
+                continue
+
+            stats.sends += 1
+            if self._failing:
+                self._failing.discard(channel_id)
+
+        if subscribers > stats.max_subscribers:
+            stats.max_subscribers = subscribers
 
 
 class VoiceBridgeCog(discord.Cog):
-    sink: VoiceBridgeAudioSink
+    _on_voice_received: Callable[[bytes, int, int | None], None]
+    _receive_mode: ReceiveMode
 
-    def __init__(self, on_voice_received: Callable):
-        self.sink = VoiceBridgeAudioSink(on_voice_received)
+    def __init__(self, on_voice_received: Callable[[bytes, int, int | None], None], receive_mode: ReceiveMode):
+        self._on_voice_received = on_voice_received
+        self._receive_mode = receive_mode
+
+    def _create_sink(self) -> VoiceBridgeAudioSink:
+        # Every voice client gets its own sink, they all feed the same stream.
+        # User IDs are unique across channels, so speakers of all channels are mixed.
+        if self._receive_mode == ReceiveMode.OPUS:
+            return RawOpusAudioSink(self._on_voice_received)
+        return VoiceBridgeAudioSink(self._on_voice_received)
 
     @slash_command(name="join", description="Makes the bot join the given voice chat", guild_ids=['272461623241736193'])
     @option("channel", description="Select a channel")
     async def on_join_command(self, ctx: ApplicationContext,
                               channel: discord.VoiceChannel):
         await ctx.respond("Joining voice!")
-        await channel.connect()
+        await channel.connect(cls=BridgeVoiceClient)
         voice: VoiceClient | None = ctx.voice_client
 
         if not voice:
             raise Exception("No voice client after connecting")
 
-        voice.start_recording(self.sink, self._on_voice_recording_stop)
+        voice.start_recording(self._create_sink(), self._on_voice_recording_stop)
 
     async def _on_voice_recording_stop(self, _: VoiceBridgeAudioSink):
         print("Stopped recording")
@@ -46,5 +173,83 @@ class VoiceBridgeCog(discord.Cog):
             await ctx.respond("Not connected to voice")
 
 
-def setup_commands(bot: discord.Bot, on_voice_received: Callable[[bytes], None]):
-    bot.add_cog(VoiceBridgeCog(on_voice_received))
+class ProfilingCog(discord.Cog):
+    _profiler: Profiler
+
+    def __init__(self, profiler: Profiler):
+        self._profiler = profiler
+
+    @slash_command(name="profile", description="Profiles the running bridge", guild_ids=['272461623241736193'],
+                   default_member_permissions=discord.Permissions(administrator=True))
+    @option("kind", description="Start or stop a CPU profile, or take a memory snapshot", choices=["cpu", "memory"])
+    async def on_profile_command(self, ctx: ApplicationContext, kind: str):
+        # Hidden from others by default, but server settings can override that
+        if not ctx.author.guild_permissions.administrator:
+            await ctx.respond("Only administrators can profile the bridge", ephemeral=True)
+            return
+
+        if kind == "cpu":
+            message = self._profiler.toggle_cpu()
+        else:
+            message = self._profiler.snapshot_memory()
+        await ctx.respond(message, ephemeral=True)
+
+
+class AnnouncementCog(discord.Cog):
+    _announce: Callable[[str], bool]
+
+    def __init__(self, announce: Callable[[str], bool]):
+        self._announce = announce
+
+    @slash_command(name="announce", description="Plays a clip in Minecraft & Discord", guild_ids=['272461623241736193'],
+                   default_member_permissions=discord.Permissions(manage_channels=True))
+    @option("clip", description="Name of the clip")
+    async def on_announce_command(self, ctx: ApplicationContext, clip: str):
+        if self._announce(clip):
+            await ctx.respond(f"Playing {clip}", ephemeral=True)
+        else:
+            await ctx.respond(f"No clip named {clip}", ephemeral=True)
+
+
+def setup_commands(bot: discord.Bot, on_voice_received: Callable[[bytes, int, int | None], None],
+                   receive_mode: ReceiveMode = ReceiveMode.OPUS, profiler: Profiler | None = None,
+                   announce: Callable[[str], bool] | None = None):
+    bot.add_cog(VoiceBridgeCog(on_voice_received, receive_mode))
+    if profiler is not None:
+        bot.add_cog(ProfilingCog(profiler))
+    if announce is not None:
+        bot.add_cog(AnnouncementCog(announce))
+
+
+class DiscordEndpoint(VoiceEndpoint):
+    """
+    Bridges the voice channels a Discord bot is asked to join
+    """
+    bot: discord.Bot
+    fanout: VoiceFanout
+
+    _token: str
+    _profiler: Profiler | None
+    _announce: Callable[[str], bool] | None
+
+    def __init__(self, token: str, receive_mode: ReceiveMode = ReceiveMode.OPUS, profiler: Profiler | None = None,
+                 announce: Callable[[str], bool] | None = None):
+        self.bot = discord.Bot()
+        self.fanout = VoiceFanout(self.bot)
+        self.receive_mode = receive_mode
+        self._token = token
+        self._profiler = profiler
+        self._announce = announce
+
+    def start(self, on_audio: OnAudio):
+        setup_commands(self.bot, on_audio, self.receive_mode, self._profiler, self._announce)
+        asyncio.get_event_loop().create_task(self.bot.start(self._token))
+
+    def send(self, encoded_frame: bytes):
+        self.fanout.send(encoded_frame)
+
+    async def close(self):
+        await self.bot.close()
+
+    def stats(self) -> dict[str, int | float]:
+        return dataclasses.asdict(self.fanout.stats)
@@ -0,0 +1,44 @@
+import abc
+import enum
+from collections.abc import Callable
+
+# Audio of a user: opus packet or PCM, user ID & the sequence number of opus packets
+OnAudio = Callable[[bytes, int, int | None], None]
+
+
+class ReceiveMode(enum.Enum):
+    # Let pycord decode to 48kHz stereo PCM
+    PCM = "pcm"
+    # Receive the raw opus packets and let the bridge decode them
+    OPUS = "opus"
+
+
+class VoiceEndpoint(abc.ABC):
+    """
+    The side of the bridge opposite of Minecraft, where the audio of users comes from
+    and the mixed Minecraft audio goes to
+    """
+    # Whether received audio is opus or 48kHz stereo PCM
+    receive_mode: ReceiveMode
+
+    @abc.abstractmethod
+    def start(self, on_audio: OnAudio):
+        """
+        Starts receiving audio, called on the reactor thread
+        :param on_audio: called with the audio of every user, from any thread
+        """
+        ...
+
+    @abc.abstractmethod
+    def send(self, encoded_frame: bytes):
+        """
+        Plays a stereo opus frame, called on the reactor thread
+        """
+        ...
+
+    @abc.abstractmethod
+    async def close(self):
+        ...
+
+    def stats(self) -> dict[str, int | float]:
+        return {}
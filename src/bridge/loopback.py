@@ -0,0 +1,268 @@
+import collections
+import logging
+import os
+import struct
+import threading
+import time
+import wave
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from bridge import audio
+from bridge.audio.opus import EncodingApplication, OpusDecoder, OpusEncoder
+from bridge.endpoint import OnAudio, ReceiveMode, VoiceEndpoint
+
+# Opus frames in a .frames file are prefixed with their length
+FRAME_HEADER = struct.Struct(">H")
+# Received frames are prefixed with the seconds since playback started & their length
+CAPTURE_HEADER = struct.Struct(">dH")
+
+# Received frames kept for the output, the oldest are dropped beyond it. An hour of 20ms frames.
+MAX_CAPTURED_FRAMES = 180_000
+
+# User IDs of the simulated speakers, one per input file
+FIRST_USER_ID = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def read_frames(file_name: str) -> list[bytes]:
+    with open(file_name, "rb") as f:
+        data = f.read()
+
+    frames = []
+    pos = 0
+    while pos < len(data):
+        (length,) = FRAME_HEADER.unpack_from(data, pos)
+        pos += FRAME_HEADER.size
+        frames.append(data[pos:pos + length])
+        pos += length
+    return frames
+
+
+def write_frames(file_name: str, frames: list[bytes]):
+    with open(file_name, "wb") as f:
+        for frame in frames:
+            f.write(FRAME_HEADER.pack(len(frame)))
+            f.write(frame)
+
+
+def _read_pcm(file_name: str) -> bytes:
+    """
+    48kHz 16-bit stereo PCM of a WAV or raw PCM file
+    """
+    if not file_name.endswith(".wav"):
+        with open(file_name, "rb") as f:
+            return f.read()
+
+    with wave.open(file_name, "rb") as f:
+        if f.getframerate() != audio.SAMPLE_RATE or f.getsampwidth() != 2 or f.getnchannels() not in (1, 2):
+            raise ValueError(f"{file_name} must be 48kHz 16-bit mono or stereo")
+        pcm = f.readframes(f.getnframes())
+        if f.getnchannels() == 1:
+            pcm = np.repeat(np.frombuffer(pcm, dtype=np.int16), 2).tobytes()
+        return pcm
+
+
+def load_clip(file_name: str, receive_mode: ReceiveMode) -> list[bytes]:
+    """
+    Frames of a WAV, raw PCM or .frames file, as the Discord voice client would receive them
+    """
+    samples_per_frame = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+    frame_size = samples_per_frame * audio.DISCORD_CHANNELS * 2
+
+    if file_name.endswith(".frames"):
+        frames = read_frames(file_name)
+        if receive_mode == ReceiveMode.OPUS:
+            return frames
+        decoder = OpusDecoder(audio.SAMPLE_RATE, samples_per_frame, audio.DISCORD_CHANNELS)
+        return [decoder.decode(frame) for frame in frames]
+
+    pcm = _read_pcm(file_name)
+    # Pad the last frame with silence
+    pcm += bytes(-len(pcm) % frame_size)
+    frames = [pcm[i:i + frame_size] for i in range(0, len(pcm), frame_size)]
+    if receive_mode == ReceiveMode.PCM:
+        return frames
+
+    encoder = OpusEncoder(audio.SAMPLE_RATE, samples_per_frame, audio.DISCORD_CHANNELS, EncodingApplication.VOICE)
+    return [encoder.encode(frame) for frame in frames]
+
+
+@dataclass
+class LoopbackStats:
+    frames_played: int = 0
+    frames_received: int = 0
+    # Received frames dropped from the capture to stay within its limit
+    frames_dropped: int = 0
+    # Ticks the playback thread woke up late for by more than a frame
+    late_ticks: int = 0
+
+
+class _Playback(threading.Thread):
+    """
+    Plays one clip per simulated user in real time, all users speaking at once
+    """
+    _clips: list[list[bytes]]
+    _on_audio: OnAudio
+    _repeat: int
+    _delay: float
+    _stats: LoopbackStats
+    _end_thread: threading.Event
+
+    started_at: float | None
+
+    def __init__(self, clips: list[list[bytes]], on_audio: OnAudio, repeat: int, delay: float, stats: LoopbackStats):
+        super().__init__(name="LoopbackPlayback", daemon=True)
+        self._clips = clips
+        self._on_audio = on_audio
+        self._repeat = repeat
+        self._delay = delay
+        self._stats = stats
+        self._end_thread = threading.Event()
+        self.started_at = None
+
+    def run(self) -> None:
+        if self._end_thread.wait(self._delay):
+            return
+
+        frame_seconds = audio.FRAME_LENGTH / 1000
+        # Shorter clips stay silent until the longest one is done
+        length = max(len(clip) for clip in self._clips)
+        self.started_at = next_tick = time.monotonic()
+        logger.info(f"Playing {len(self._clips)} clips, {length * self._repeat * frame_seconds:.1f}s")
+
+        for tick in range(length * self._repeat):
+            index = tick % length
+            for i, clip in enumerate(self._clips):
+                if index >= len(clip):
+                    continue
+                # Sequence numbers of RTP
+                self._on_audio(clip[index], FIRST_USER_ID + i, tick & 0xFFFF)
+                self._stats.frames_played += 1
+
+            next_tick += frame_seconds
+            delay = next_tick - time.monotonic()
+            if delay < -frame_seconds:
+                self._stats.late_ticks += 1
+            if delay > 0 and self._end_thread.wait(delay):
+                return
+
+        logger.info("Finished playing clips")
+
+    def stop(self):
+        self._end_thread.set()
+        super().join()
+
+
+class LoopbackEndpoint(VoiceEndpoint):
+    """
+    Stands in for Discord without any network: plays audio files as if users were speaking
+    in a voice channel and records what the bridge sends with timestamps, so the whole
+    pipeline can be run & measured offline
+    """
+    inputs: list[str]
+    output: str | None
+
+    _repeat: int
+    _delay: float
+    _playback: _Playback | None
+
+    # Only kept when there is an output to write it to
+    _capture: collections.deque[tuple[float, bytes]]
+    _lock: threading.Lock
+
+    _stats: LoopbackStats
+
+    def __init__(self, inputs: list[str], output: str | None = None, receive_mode: ReceiveMode = ReceiveMode.OPUS,
+                 repeat: int = 1, delay: float = 0.0, max_frames: int = MAX_CAPTURED_FRAMES):
+        """
+        :param inputs: WAV (48kHz 16-bit), raw 48kHz stereo PCM or .frames files of opus frames, one per user
+        :param output: directory to write the received audio to on close
+        :param repeat: number of times to play the inputs
+        :param delay: seconds to wait before playing, e.g. for the Minecraft connection to come up
+        :param max_frames: most recent received frames to keep for the output
+        """
+        self.inputs = inputs
+        self.output = output
+        self.receive_mode = receive_mode
+
+        self._repeat = repeat
+        self._delay = delay
+        self._playback = None
+
+        self._capture = collections.deque(maxlen=max_frames)
+        self._lock = threading.Lock()
+
+        self._stats = LoopbackStats()
+
+    def start(self, on_audio: OnAudio):
+        clips = [load_clip(file_name, self.receive_mode) for file_name in self.inputs]
+        if not clips:
+            return
+        self._playback = _Playback(clips, on_audio, self._repeat, self._delay, self._stats)
+        self._playback.start()
+
+    def send(self, encoded_frame: bytes):
+        self._stats.frames_received += 1
+        if self.output is None:
+            return
+
+        with self._lock:
+            if len(self._capture) == self._capture.maxlen:
+                self._stats.frames_dropped += 1
+            self._capture.append((time.monotonic(), encoded_frame))
+
+    async def close(self):
+        if self._playback is not None:
+            self._playback.stop()
+
+        if self.output is not None:
+            self._write_output()
+
+    def stats(self) -> dict[str, int | float]:
+        return asdict(self._stats)
+
+    def _write_output(self):
+        """
+        Writes the received frames with their timestamps and decoded to a WAV, with silence in gaps
+        """
+        os.makedirs(self.output, exist_ok=True)
+        with self._lock:
+            capture = list(self._capture)
+            self._capture.clear()
+
+        started_at = self._playback.started_at if self._playback is not None else None
+        if started_at is None:
+            started_at = capture[0][0] if capture else 0.0
+
+        with open(os.path.join(self.output, "received.capture"), "wb") as f:
+            for at, frame in capture:
+                f.write(CAPTURE_HEADER.pack(at - started_at, len(frame)))
+                f.write(frame)
+
+        # Frames may be shorter than the default in low-delay mode, the decoder takes any length up to it
+        samples_per_frame = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+        sample_size = audio.DISCORD_CHANNELS * 2
+        decoder = OpusDecoder(audio.SAMPLE_RATE, samples_per_frame, audio.DISCORD_CHANNELS)
+
+        with wave.open(os.path.join(self.output, "received.wav"), "wb") as f:
+            f.setnchannels(audio.DISCORD_CHANNELS)
+            f.setsampwidth(2)
+            f.setframerate(audio.SAMPLE_RATE)
+
+            # Samples written so far
+            written = 0
+            for at, frame in capture:
+                # Line the audio up with when it was received, in whole frames to not split up jitter
+                gap = round((at - started_at) * audio.SAMPLE_RATE) - written
+                if gap >= samples_per_frame:
+                    gap -= gap % samples_per_frame
+                    f.writeframes(bytes(gap * sample_size))
+                    written += gap
+                pcm = decoder.decode(frame)
+                f.writeframes(pcm)
+                written += len(pcm) // sample_size
+
+        logger.info(f"Wrote {len(capture)} received frames to {self.output}")
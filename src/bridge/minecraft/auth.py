@@ -1,48 +1,261 @@
 import json
+import logging
+import os
+import tempfile
+import threading
+import time
 from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Protocol
 
+import requests
 from minecraft_launcher_lib import microsoft_account
+from minecraft_launcher_lib.exceptions import InvalidRefreshToken
 
 FILE_NAME = ".auth.json"
 
+SCOPE = "XboxLive.signin offline_access"
+
+# Minecraft access tokens are valid for 24 hours, refresh them well before that
+REFRESH_MARGIN = 30 * 60  # 30 minutes
+RETRY_INTERVAL = 60  # 1 minute
+
+# How long shutdown waits for a refresh in progress, the thread is a daemon & may be abandoned
+STOP_TIMEOUT = 1.0  # seconds
+
+
+@dataclass(frozen=True)
+class AuthEndpoints:
+    login_token: str = "https://login.microsoftonline.com/consumers/oauth2/v2.0/token"
+    refresh_token: str = "https://login.live.com/oauth20_token.srf"
+    xbl: str = "https://user.auth.xboxlive.com/user/authenticate"
+    xsts: str = "https://xsts.auth.xboxlive.com/xsts/authorize"
+    minecraft: str = "https://api.minecraftservices.com/authentication/login_with_xbox"
+    profile: str = "https://api.minecraftservices.com/minecraft/profile"
+
+
+class AuthHttpError(Exception):
+    """
+    Non-2xx response from one of the auth endpoints
+    """
+    status: int
+    # JSON body of the response, if it had one, e.g. an OAuth error
+    body: dict[str, Any] | None
+
+    def __init__(self, url: str, status: int, body: dict[str, Any] | None = None):
+        message = f"{url} responded with HTTP {status}"
+        if body is not None and 'error' in body:
+            message += f": {body['error']}"
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class HttpClient(Protocol):
+    def post_form(self, url: str, data: dict[str, str]) -> dict[str, Any]:
+        ...
+
+    def post_json(self, url: str, data: dict[str, Any]) -> dict[str, Any]:
+        ...
+
+    def get_json(self, url: str, bearer_token: str) -> dict[str, Any]:
+        ...
+
+
+class RequestsHttpClient:
+    timeout: float
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers['Accept'] = 'application/json'
+
+    def post_form(self, url: str, data: dict[str, str]) -> dict[str, Any]:
+        return self._json(self._session.post(url, data=data, timeout=self.timeout))
+
+    def post_json(self, url: str, data: dict[str, Any]) -> dict[str, Any]:
+        return self._json(self._session.post(url, json=data, timeout=self.timeout))
+
+    def get_json(self, url: str, bearer_token: str) -> dict[str, Any]:
+        headers = {'Authorization': f'Bearer {bearer_token}'}
+        return self._json(self._session.get(url, headers=headers, timeout=self.timeout))
+
+    @staticmethod
+    def _json(response: requests.Response) -> dict[str, Any]:
+        if response.ok:
+            return response.json()
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        raise AuthHttpError(response.url, response.status_code, body if isinstance(body, dict) else None)
+
+
 class AuthDetails:
     id: str
     name: str
     refresh_token: str
+    access_token: str | None
+    expires_at: float | None  # Unix timestamp
 
-    def __init__(self, data: dict[str, str]):
+    def __init__(self, data: dict[str, Any]):
         self.id = data['id']
         self.name = data['name']
         self.refresh_token = data['refresh_token']
+        self.access_token = data.get('access_token')
+        self.expires_at = data.get('expires_at')
 
-    def to_dict(self) -> dict[str, str]:
+    def is_access_token_valid(self, margin: float = REFRESH_MARGIN) -> bool:
+        if self.access_token is None or self.expires_at is None:
+            return False
+        return time.time() + margin < self.expires_at
+
+    def to_dict(self) -> dict[str, Any]:
         return {
             'id': self.id,
             'name': self.name,
             'refresh_token': self.refresh_token,
+            'access_token': self.access_token,
+            'expires_at': self.expires_at,
         }
 
-def _save_auth_details(auth_details: AuthDetails):
-    with open(FILE_NAME, "w", encoding="utf-8") as f:
-        json.dump(auth_details.to_dict(), f, ensure_ascii=False, indent=4)
 
-def _load_auth_details() -> AuthDetails:
-    with open(FILE_NAME, encoding="utf-8") as f:
+class MicrosoftAuthChain:
+    """
+    Microsoft -> Xbox Live -> XSTS -> Minecraft token chain, talking to the given endpoints
+    through the given HTTP client so that both can be replaced by a local stand-in.
+    """
+    http: HttpClient
+    endpoints: AuthEndpoints
+
+    def __init__(self, http: HttpClient | None = None, endpoints: AuthEndpoints | None = None):
+        self.http = http if http is not None else RequestsHttpClient()
+        self.endpoints = endpoints if endpoints is not None else AuthEndpoints()
+
+    def login(self, client_id: str, redirect_url: str, auth_code: str, code_verifier: str) -> AuthDetails:
+        try:
+            token_response = self.http.post_form(self.endpoints.login_token, {
+                'client_id': client_id,
+                'scope': SCOPE,
+                'code': auth_code,
+                'redirect_uri': redirect_url,
+                'grant_type': 'authorization_code',
+                'code_verifier': code_verifier,
+            })
+        except AuthHttpError as e:
+            if not _is_oauth_error(e):
+                raise
+            token_response = e.body
+
+        if 'error' in token_response:
+            raise Exception(f"login failed: {token_response['error']}")
+
+        return self._complete(token_response)
+
+    def refresh(self, client_id: str, refresh_token: str) -> AuthDetails:
+        try:
+            token_response = self.http.post_form(self.endpoints.refresh_token, {
+                'client_id': client_id,
+                'scope': SCOPE,
+                'refresh_token': refresh_token,
+                'grant_type': 'refresh_token',
+            })
+        except AuthHttpError as e:
+            if not _is_oauth_error(e):
+                raise
+            token_response = e.body
+
+        if 'error' in token_response:
+            raise InvalidRefreshToken()
+
+        return self._complete(token_response)
+
+    def _complete(self, token_response: dict[str, Any]) -> AuthDetails:
+        xbl_response = self.http.post_json(self.endpoints.xbl, {
+            'Properties': {
+                'AuthMethod': 'RPS',
+                'SiteName': 'user.auth.xboxlive.com',
+                'RpsTicket': f"d={token_response['access_token']}",
+            },
+            'RelyingParty': 'http://auth.xboxlive.com',
+            'TokenType': 'JWT',
+        })
+        userhash = xbl_response['DisplayClaims']['xui'][0]['uhs']
+
+        xsts_response = self.http.post_json(self.endpoints.xsts, {
+            'Properties': {
+                'SandboxId': 'RETAIL',
+                'UserTokens': [xbl_response['Token']],
+            },
+            'RelyingParty': 'rp://api.minecraftservices.com/',
+            'TokenType': 'JWT',
+        })
+
+        requested_at = time.time()
+        minecraft_response = self.http.post_json(self.endpoints.minecraft, {
+            'identityToken': f"XBL3.0 x={userhash};{xsts_response['Token']}",
+        })
+        access_token = minecraft_response['access_token']
+
+        profile = self.http.get_json(self.endpoints.profile, access_token)
+
+        return AuthDetails({
+            'id': profile['id'],
+            'name': profile['name'],
+            'refresh_token': token_response['refresh_token'],
+            'access_token': access_token,
+            'expires_at': requested_at + minecraft_response['expires_in'],
+        })
+
+
+def _is_oauth_error(error: AuthHttpError) -> bool:
+    # OAuth rejects bad codes & tokens with a 400 & an error in the body, other failures may be temporary
+    return error.status in (400, 401) and error.body is not None and 'error' in error.body
+
+
+def _save_auth_details(auth_details: AuthDetails, file_name: str = FILE_NAME):
+    # Write to a temporary file next to the target & swap it in, so a crash
+    # halfway through never leaves a truncated auth file behind.
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_path = tempfile.mkstemp(prefix=".auth-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(auth_details.to_dict(), f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_name)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _load_auth_details(file_name: str = FILE_NAME) -> AuthDetails:
+    with open(file_name, encoding="utf-8") as f:
         json_data = json.load(f)
         return AuthDetails(json_data)
 
-def refresh_auth(client_id: str) -> (str, str, str):
-    auth_details = _load_auth_details()
 
-    response = microsoft_account.complete_refresh(client_id, None, None, auth_details.refresh_token)
+def refresh_auth(client_id: str, chain: MicrosoftAuthChain | None = None, force: bool = False,
+                 file_name: str = FILE_NAME) -> AuthDetails:
+    auth_details = _load_auth_details(file_name)
 
-    details = AuthDetails(response)
+    # Reuse the cached access token if it is still valid for a while
+    if not force and auth_details.is_access_token_valid():
+        return auth_details
 
-    _save_auth_details(details)
+    if chain is None:
+        chain = MicrosoftAuthChain()
 
-    return (details.id, details.name, response['access_token'])
+    details = chain.refresh(client_id, auth_details.refresh_token)
 
-def do_auth_flow(client_id: str, redirect_url: str, get_url: Callable[[str], str]) -> str:
+    _save_auth_details(details, file_name)
+
+    return details
+
+
+def do_auth_flow(client_id: str, redirect_url: str, get_url: Callable[[str], str],
+                 chain: MicrosoftAuthChain | None = None) -> str:
     login_url, state, code_verifier = microsoft_account.get_secure_login_data(client_id, redirect_url)
 
     code_url = get_url(login_url)
@@ -54,10 +267,68 @@ def do_auth_flow(client_id: str, redirect_url: str, get_url: Callable[[str], str
     except KeyError:
         raise Exception("url not valid")
 
-    login_data = microsoft_account.complete_login(client_id, None, redirect_url, auth_code, code_verifier)
+    if chain is None:
+        chain = MicrosoftAuthChain()
 
-    details = AuthDetails(login_data)
+    details = chain.login(client_id, redirect_url, auth_code, code_verifier)
 
     _save_auth_details(details)
 
-    return login_data['access_token']
+    return details.access_token
+
+
+class AuthRefreshThread(threading.Thread):
+    """
+    Keeps the cached access token fresh by refreshing it shortly before it expires,
+    so that the token chain never runs on the reactor thread.
+    """
+    _client_id: str
+    _chain: MicrosoftAuthChain
+    _details: AuthDetails
+    _on_refreshed: Callable[[AuthDetails], None]
+    _file_name: str
+
+    _end_thread: threading.Event
+
+    def __init__(self, client_id: str, details: AuthDetails, on_refreshed: Callable[[AuthDetails], None],
+                 chain: MicrosoftAuthChain | None = None, file_name: str = FILE_NAME):
+        super().__init__(name="AuthRefreshThread", daemon=True)
+        self._client_id = client_id
+        self._details = details
+        self._on_refreshed = on_refreshed
+        self._chain = chain if chain is not None else MicrosoftAuthChain()
+        self._file_name = file_name
+        self._end_thread = threading.Event()
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def run(self) -> None:
+        while not self._end_thread.is_set():
+            delay = (self._details.expires_at or 0) - REFRESH_MARGIN - time.time()
+
+            if self._end_thread.wait(max(delay, 0)):
+                break
+
+            try:
+                self._details = refresh_auth(self._client_id, self._chain, force=True, file_name=self._file_name)
+            except InvalidRefreshToken:
+                self.logger.error("Refresh token invalid, please login again")
+                break
+            except AuthHttpError as e:
+                self.logger.error(f"Refreshing access token failed: {e}, retrying in {RETRY_INTERVAL}s")
+                self._end_thread.wait(RETRY_INTERVAL)
+                continue
+            except Exception:
+                self.logger.exception(f"Refreshing access token failed, retrying in {RETRY_INTERVAL}s")
+                self._end_thread.wait(RETRY_INTERVAL)
+                continue
+
+            if self._end_thread.is_set():
+                break
+            self.logger.info("Refreshed Minecraft access token")
+            self._on_refreshed(self._details)
+
+    def stop(self):
+        self._end_thread.set()
+        # A refresh may be stuck in an HTTP timeout, don't hold up shutdown for it
+        super().join(STOP_TIMEOUT)
@@ -10,17 +10,25 @@ from twisted.internet.interfaces import IAddress, IListeningPort
 from twisted.internet.tcp import Connector
 
 from bridge import voice
+from bridge.audio.spatial import ListenerPose, SoundSource
 from bridge.minecraft.packets import (
     BrandPacket,
     CreateGroupPacket,
     EncodablePacket,
+    PlayerState,
+    PlayerStatePacket,
+    PlayerStatesPacket,
     RegisterPacket,
     RequestSecretPacket,
     SecretPacket,
     UpdateStatePacket,
 )
+from bridge.minecraft.players import IgnoreList, PlayerStateIndex, PlayerTracker
 from bridge.util.encodable import Buffer
-from bridge.voice.client import VoiceConnection
+from bridge.util.trace import FrameTrace, Tracer
+from bridge.voice.client import RATE_LIMIT, VoiceConnection
+from bridge.voice.packets import LocationSoundPacket, PlayerSoundPacket, SoundPacket
+from bridge.voice.udp import SocketOptions, VoiceSocketThread
 
 used_plugin_channels = {'voicechat:player_state', 'voicechat:secret', 'voicechat:leave_group',
                         'voicechat:create_group', 'voicechat:request_secret', 'voicechat:set_group',
@@ -31,13 +39,18 @@ used_plugin_channels = {'voicechat:player_state', 'voicechat:secret', 'voicechat
 class MinecraftClient(SpawningClientProtocol):
     server_host: str
     voice: VoiceConnection | None
-    voice_listener: IListeningPort | None
+    voice_listener: IListeningPort | VoiceSocketThread | None
+    voice_settings: SecretPacket | None
+
+    players: PlayerTracker
 
     def __init__(self, factory: 'MinecraftClientFactory', addr: IAddress, host: str):
         super().__init__(factory, addr)
         self.server_host = host
         self.voice = None
         self.voice_listener = None
+        self.voice_settings = None
+        self.players = PlayerTracker()
 
     def send_voice_data(self, data: bytes):
         if self.voice is not None:
@@ -47,10 +60,38 @@ class MinecraftClient(SpawningClientProtocol):
         super().connection_made()
         factory: MinecraftClientFactory = self.factory
         factory.client = self
+        # The server sends all player states again after joining
+        factory.player_states.clear()
 
     def player_joined(self):
         super().player_joined()
 
+    def listener_pose(self) -> ListenerPose | None:
+        if not self.spawned:
+            return None
+        x, y, z, yaw, _ = self.pos_look
+        return ListenerPose(x, y, z, yaw)
+
+    def packet_respawn(self, buf: Buffer):
+        # Entities of the previous world are gone
+        self.players.clear()
+        buf.discard()
+
+    def packet_spawn_player(self, buf: Buffer):
+        self.players.on_spawn_player(buf)
+
+    def packet_entity_relative_move(self, buf: Buffer):
+        self.players.on_relative_move(buf)
+
+    def packet_entity_look_and_relative_move(self, buf: Buffer):
+        self.players.on_relative_move(buf)
+
+    def packet_entity_teleport(self, buf: Buffer):
+        self.players.on_teleport(buf)
+
+    def packet_destroy_entities(self, buf: Buffer):
+        self.players.on_destroy_entities(buf)
+
     def packet_update_health(self, buf: Buffer):
         health = buf.unpack("f")
 
@@ -73,20 +114,73 @@ class MinecraftClient(SpawningClientProtocol):
             self._vc_request_secret()
         elif channel == SecretPacket.CHANNEL:
             pkt = SecretPacket.from_buf(buf)
+            self.voice_settings = pkt
             self._create_new_voice_connection(pkt.port, pkt.player, pkt.secret)
+        elif channel == PlayerStatesPacket.CHANNEL:
+            pkt = PlayerStatesPacket.from_buf(buf)
+            factory: MinecraftClientFactory = self.factory
+            factory.player_states.replace_all(pkt.states)
+            self.logger.info(f"Received voice chat states of {len(pkt.states)} players")
+        elif channel == PlayerStatePacket.CHANNEL:
+            pkt = PlayerStatePacket.from_buf(buf)
+            self._on_player_state(pkt.state)
 
         # Discard buffer contents if packet was not consumed already
         buf.discard()
 
+    def _on_player_state(self, state: PlayerState):
+        factory: MinecraftClientFactory = self.factory
+        player_states = factory.player_states
+
+        was_blocked = player_states.is_blocked(state.uuid)
+        previous = player_states.update(state)
+
+        if previous is None or previous.disconnected != state.disconnected:
+            self.logger.info(f"{state.name} {'left' if state.disconnected else 'joined'} voice chat")
+            if (factory.on_presence is not None and state.uuid != factory.profile.uuid
+                    and not player_states.is_blocked(state.uuid)):
+                factory.on_presence(state, not state.disconnected)
+        if player_states.is_blocked(state.uuid) != was_blocked:
+            self.logger.info(f"{'Bridging' if was_blocked else 'Dropping'} audio of {state.name}")
+
     def on_voice_connected(self):
         self.logger.info("Connected to voice chat")
         self._vc_set_connected(True)
+
+        factory: MinecraftClientFactory = self.factory
+        if factory.proximity:
+            # Stay out of groups, so that the bot talks & listens to the players around it
+            return
+
         self._vc_create_group("Discord Bridge")
         self.logger.info("Created voice chat group")
 
-    def on_voice_data(self, data: bytes):
+    def on_voice_data(self, pkt: SoundPacket, trace: FrameTrace | None = None):
         factory: MinecraftClientFactory = self.factory
-        factory.on_mc_voice_data(data)
+        factory.on_mc_voice_data(pkt.sender, pkt.data, self._sound_source(pkt), pkt.sequence, trace)
+
+    def _sound_source(self, pkt: SoundPacket) -> SoundSource | None:
+        settings = self.voice_settings
+        if settings is None:
+            return None
+
+        if isinstance(pkt, LocationSoundPacket):
+            location = pkt.location
+            max_distance = settings.dist
+        elif isinstance(pkt, PlayerSoundPacket):
+            location = self.players.position(pkt.sender)
+            max_distance = settings.whisper_dist if pkt.whispering else settings.dist
+        else:
+            # Group audio is not positional
+            return None
+
+        if location is None:
+            # Player we haven't seen yet, the server only sends audio of players in range anyway
+            return None
+
+        # Scale the fade distance along with the max. distance when whispering
+        fade_distance = settings.fade_dist * max_distance / settings.dist if settings.dist > 0 else 0.0
+        return SoundSource(*location, max_distance, fade_distance)
 
     def _reconnect_voice(self, port: int, player: uuid.UUID, secret: uuid.UUID):
         # Disconnect old listener if there was one
@@ -99,10 +193,33 @@ class MinecraftClient(SpawningClientProtocol):
 
     def _create_new_voice_connection(self, port: int, player: uuid.UUID, secret: uuid.UUID):
         # Create new voice connection & start listening
+        factory: MinecraftClientFactory = self.factory
+
+        on_connected = self.on_voice_connected
+        if factory.voice_socket is not None:
+            # Received on the socket thread, only the group setup has to go through the reactor
+            def on_connected():
+                reactor.callFromThread(self.on_voice_connected)
+
         self.voice = VoiceConnection(self.server_host, port, player, secret,
-                                     self.on_voice_connected,
-                                     self.on_voice_data)
-        self.voice_listener = reactor.listenUDP(0, self.voice)
+                                     on_connected,
+                                     self.on_voice_data,
+                                     proximity=factory.proximity,
+                                     mtu=self.voice_settings.mtu,
+                                     blocked_senders=factory.player_states.blocked,
+                                     tracer=factory.tracer,
+                                     rate_limit=factory.voice_rate_limit)
+
+        if factory.voice_socket is not None:
+            self.voice_listener = VoiceSocketThread(self.voice, factory.voice_socket)
+            self.voice_listener.listen()
+        else:
+            self.voice_listener = reactor.listenUDP(0, self.voice)
+
+    def close_voice(self):
+        if self.voice_listener is not None:
+            self.voice_listener.stopListening()
+            self.voice_listener = None
 
     def _vc_create_group(self, name: str):
         cg = CreateGroupPacket(name, None)
@@ -127,11 +244,35 @@ class MinecraftClientFactory(ClientFactory):
     protocol = MinecraftClient
     server_host: str
 
-    on_mc_voice_data: Callable[[bytes], None] | None
+    on_mc_voice_data: Callable[[uuid.UUID, bytes, SoundSource | None, int, FrameTrace | None], None] | None
+
+    # Called when another player joins (True) or leaves (False) voice chat
+    on_presence: Callable[[PlayerState, bool], None] | None
+
+    # Whether to use proximity voice chat instead of a group
+    proximity: bool
+
+    player_states: PlayerStateIndex
+
+    # Runs the voice socket on its own thread with these options, instead of on the reactor
+    voice_socket: SocketOptions | None
+
+    # Samples voice packets for latency tracing
+    tracer: Tracer | None
+
+    # Packets per second accepted from the voice server, None for no limit
+    voice_rate_limit: float | None
 
     client: MinecraftClient | None
 
-    def __init__(self, host, _uuid: str | None, name: str, token: str | None, on_audio: Callable[[bytes], None] | None):
+    def __init__(self, host, _uuid: str | None, name: str, token: str | None,
+                 on_audio: Callable[[uuid.UUID, bytes, SoundSource | None, int, FrameTrace | None], None] | None,
+                 proximity: bool = False,
+                 ignore: IgnoreList | None = None,
+                 voice_socket: SocketOptions | None = None,
+                 tracer: Tracer | None = None,
+                 on_presence: Callable[[PlayerState, bool], None] | None = None,
+                 voice_rate_limit: float | None = RATE_LIMIT):
         if _uuid is None or token is None:
             profile = auth.OfflineProfile("VoiceChatBridge")
         else:
@@ -142,6 +283,12 @@ class MinecraftClientFactory(ClientFactory):
         self.server_host = host
 
         self.on_mc_voice_data = on_audio
+        self.proximity = proximity
+        self.player_states = PlayerStateIndex(ignore)
+        self.voice_socket = voice_socket
+        self.tracer = tracer
+        self.on_presence = on_presence
+        self.voice_rate_limit = voice_rate_limit
 
         self.logger = logging.getLogger("%s{%s}" % (
             self.__class__.__name__,
@@ -169,3 +316,25 @@ class MinecraftClientFactory(ClientFactory):
     def send_voice_data(self, data):
         if self.client is not None:
             self.client.send_voice_data(data)
+
+    def listener_pose(self) -> ListenerPose | None:
+        if self.client is None:
+            return None
+        return self.client.listener_pose()
+
+    def close_voice(self):
+        if self.client is not None:
+            self.client.close_voice()
+
+    @property
+    def recording_allowed(self) -> bool:
+        """
+        Whether the voice chat server allows recording its audio
+        """
+        client = self.client
+        return client is not None and client.voice_settings is not None and client.voice_settings.allow_recording
+
+    def update_access_token(self, token: str):
+        # Used on the next (re)connect, the current session stays valid
+        if isinstance(self.profile, auth.Profile):
+            self.profile.access_token = token
@@ -0,0 +1,147 @@
+import uuid
+from dataclasses import dataclass, field
+
+from bridge.minecraft.packets import PlayerState
+from bridge.util.encodable import Buffer
+
+Position = tuple[float, float, float]
+
+
+class PlayerTracker:
+    """
+    Tracks the positions of the players around the bot from entity packets, so that
+    proximity voice can be placed at its sender.
+    """
+    _entity_players: dict[int, uuid.UUID]
+    _positions: dict[uuid.UUID, Position]
+
+    def __init__(self):
+        self._entity_players = {}
+        self._positions = {}
+
+    def position(self, player: uuid.UUID) -> Position | None:
+        return self._positions.get(player)
+
+    def clear(self):
+        self._entity_players.clear()
+        self._positions.clear()
+
+    def on_spawn_player(self, buf: Buffer):
+        entity_id = buf.unpack_varint()
+        player = buf.unpack_uuid()
+        x, y, z = buf.unpack("ddd")
+        buf.discard()
+
+        self._entity_players[entity_id] = player
+        self._positions[player] = (x, y, z)
+
+    def on_relative_move(self, buf: Buffer):
+        entity_id = buf.unpack_varint()
+        dx, dy, dz = buf.unpack("hhh")
+        buf.discard()
+
+        player = self._entity_players.get(entity_id)
+        if player is None:
+            return
+
+        # Deltas are in 1/4096ths of a block
+        x, y, z = self._positions[player]
+        self._positions[player] = (x + dx / 4096, y + dy / 4096, z + dz / 4096)
+
+    def on_teleport(self, buf: Buffer):
+        entity_id = buf.unpack_varint()
+        x, y, z = buf.unpack("ddd")
+        buf.discard()
+
+        player = self._entity_players.get(entity_id)
+        if player is not None:
+            self._positions[player] = (x, y, z)
+
+    def on_destroy_entities(self, buf: Buffer):
+        count = buf.unpack_varint()
+        for _ in range(count):
+            player = self._entity_players.pop(buf.unpack_varint(), None)
+            if player is not None:
+                self._positions.pop(player, None)
+
+
+@dataclass
+class IgnoreList:
+    """
+    Players & groups whose audio is not bridged, each given by name or UUID
+    """
+    players: set[str] = field(default_factory=set)
+    groups: set[str] = field(default_factory=set)
+
+    def __post_init__(self):
+        self.players = {player.lower() for player in self.players}
+        self.groups = {group.lower() for group in self.groups}
+
+    def matches(self, state: PlayerState) -> bool:
+        if state.name.lower() in self.players or str(state.uuid) in self.players:
+            return True
+
+        group = state.group
+        return group is not None and (group.name.lower() in self.groups or str(group.id) in self.groups)
+
+
+class PlayerStateIndex:
+    """
+    Voice chat state of every player on the server, kept up to date from the full
+    & single player state packets. Also maintains the set of senders whose audio
+    should be dropped, which is checked against the raw sender UUID of sound
+    packets before they are even parsed.
+    """
+    ignore: IgnoreList
+
+    # Raw UUIDs of disabled & ignored players, only ever modified in place
+    blocked: set[bytes]
+
+    _states: dict[uuid.UUID, PlayerState]
+
+    def __init__(self, ignore: IgnoreList | None = None):
+        self.ignore = ignore if ignore is not None else IgnoreList()
+        self.blocked = set()
+        self._states = {}
+
+    def get(self, player: uuid.UUID) -> PlayerState | None:
+        return self._states.get(player)
+
+    def name(self, player: uuid.UUID) -> str | None:
+        state = self._states.get(player)
+        return state.name if state is not None else None
+
+    def replace_all(self, states: dict[uuid.UUID, PlayerState]):
+        self._states = dict(states)
+        # The voice socket thread reads the set meanwhile, never empty it on the way to its new contents
+        blocked = {state.uuid.bytes for state in states.values() if self._should_block(state)}
+        self.blocked.intersection_update(blocked)
+        self.blocked.update(blocked)
+
+    def update(self, state: PlayerState) -> PlayerState | None:
+        """
+        :return: the previous state of the player
+        """
+        previous = self._states.get(state.uuid)
+        self._states[state.uuid] = state
+        self._update_blocked(state)
+        return previous
+
+    def clear(self):
+        self._states.clear()
+        self.blocked.clear()
+
+    def is_blocked(self, player: uuid.UUID) -> bool:
+        return player.bytes in self.blocked
+
+    def _should_block(self, state: PlayerState) -> bool:
+        return state.disabled or self.ignore.matches(state)
+
+    def _update_blocked(self, state: PlayerState):
+        if self._should_block(state):
+            self.blocked.add(state.uuid.bytes)
+        else:
+            self.blocked.discard(state.uuid.bytes)
+
+    def __len__(self):
+        return len(self._states)
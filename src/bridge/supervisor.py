@@ -0,0 +1,446 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+
+from bridge import EVENT_LOOPS, install_reactor
+
+REPORT_INTERVAL = 10  # seconds
+
+# Worker that hasn't reported for this long is considered hung & restarted
+HEARTBEAT_TIMEOUT = 60  # seconds
+
+RESTART_BACKOFF_MIN = 1  # seconds
+RESTART_BACKOFF_MAX = 60  # seconds
+# Uptime after which a restarted worker is considered stable again, resetting its backoff
+STABLE_UPTIME = 300  # seconds
+
+# Weight of a new measurement in the smoothed load of a bridge
+LOAD_SMOOTHING = 0.2
+
+# Delay before a worker tries again to set up a bridge that failed for a transient reason
+SETUP_RETRY_MIN = 5  # seconds
+SETUP_RETRY_MAX = 300  # seconds
+
+
+@dataclass
+class BridgeDefinition:
+    name: str
+    # Command line arguments as for `python -m bridge`
+    args: list[str]
+    # Environment variable holding the Discord bot token of this bridge
+    bot_token_env: str = "BOT_TOKEN"
+    # Expected load relative to other bridges, used until the load of the bridge was measured
+    weight: float = 1.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BridgeDefinition':
+        return cls(
+            name=data['name'],
+            args=list(data['args']),
+            bot_token_env=data.get('bot_token_env', "BOT_TOKEN"),
+            weight=float(data.get('weight', 1.0))
+        )
+
+
+def load_definitions(file_name: str) -> list[BridgeDefinition]:
+    with open(file_name, encoding="utf-8") as f:
+        definitions = [BridgeDefinition.from_dict(data) for data in json.load(f)]
+
+    names = [definition.name for definition in definitions]
+    if len(set(names)) != len(names):
+        raise ValueError("bridge names must be unique")
+
+    return definitions
+
+
+def pack(definitions: list[BridgeDefinition], loads: dict[str, float], workers: int) -> list[list[BridgeDefinition]]:
+    """
+    Distributes bridges over workers, heaviest first, each onto the least loaded worker so far
+    :param loads: measured load of bridges in CPU cores, bridges without a measurement are
+                  assumed to be as heavy as the average measured bridge times their weight
+    """
+    measured = [load for load in loads.values() if load > 0]
+    average = sum(measured) / len(measured) if measured else 1.0
+
+    def load_of(definition: BridgeDefinition) -> float:
+        return loads.get(definition.name) or definition.weight * average
+
+    bins: list[list[BridgeDefinition]] = [[] for _ in range(min(workers, len(definitions)))]
+    totals = [0.0] * len(bins)
+
+    for definition in sorted(definitions, key=load_of, reverse=True):
+        lightest = totals.index(min(totals))
+        bins[lightest].append(definition)
+        totals[lightest] += load_of(definition)
+
+    return bins
+
+
+def _run_worker(definitions: list[BridgeDefinition], conn: Connection, core: int | None, event_loop: str):
+    """
+    Entry point of worker processes, runs its bridges on one reactor until terminated
+    :param event_loop: event loop to install the reactor on, shared by all bridges of the worker
+    """
+    if core is not None:
+        os.sched_setaffinity(0, {core})
+
+    logging.basicConfig()
+    logger = logging.getLogger(f"worker{{{', '.join(d.name for d in definitions)}}}")
+    logger.setLevel(logging.INFO)
+
+    # Only workers run a reactor, it has to be installed before the bridge modules import it
+    logger.info(f"Running on the {install_reactor(event_loop)} event loop")
+
+    from twisted.internet import reactor, task
+
+    from bridge.app import InvalidConfigurationError, create_bridge, parse_args
+
+    bridges = {}
+    # Bridges which can't run with their configuration, with the reason, reported to the supervisor
+    invalid = {}
+
+    def set_up(definition: BridgeDefinition, retry_in: float = SETUP_RETRY_MIN):
+        # One bridge failing to set up must not take down the others in this worker
+        try:
+            try:
+                args = parse_args(definition.args)
+            except SystemExit:
+                raise InvalidConfigurationError(f"invalid arguments {definition.args}")
+            bridge = create_bridge(args, os.getenv(definition.bot_token_env))
+        except InvalidConfigurationError as e:
+            logger.error(f"Bridge {definition.name} can't run: {e}")
+            invalid[definition.name] = str(e)
+            return
+        except Exception:
+            logger.exception(f"Setting up bridge {definition.name} failed, trying again in {retry_in:.0f}s")
+            reactor.callLater(retry_in, set_up, definition, min(retry_in * 2, SETUP_RETRY_MAX))
+            return
+
+        bridges[definition.name] = bridge
+        bridge.start()
+
+    for definition in definitions:
+        set_up(definition)
+
+    def report():
+        conn.send({
+            'time': time.monotonic(),
+            'process_cpu': time.process_time(),
+            # Reported from the reactor thread, which all bridges of the worker share
+            'reactor_cpu': time.thread_time(),
+            'bridges': {
+                name: {'cpu': bridge.cpu_time(), 'stats': bridge.stats()}
+                for name, bridge in bridges.items()
+            },
+            'invalid': dict(invalid),
+        })
+
+    reporter = task.LoopingCall(report)
+    reporter.start(REPORT_INTERVAL)
+
+    # SIGTERM by the supervisor stops the reactor
+    reactor.run()
+
+    reporter.stop()
+    for bridge in bridges.values():
+        bridge.stop()
+
+
+@dataclass
+class _Worker:
+    index: int
+    definitions: list[BridgeDefinition]
+    core: int | None
+
+    process: multiprocessing.Process | None = None
+    conn: Connection | None = None
+    started_at: float = 0.0
+    last_report_at: float = 0.0
+    last_report: dict | None = None
+
+    restarts: int = 0
+    # Set when none of the bridges of the worker can run, so there is nothing to restart
+    retired: bool = False
+    backoff: float = RESTART_BACKOFF_MIN
+    restart_at: float | None = None
+
+    # CPU time of each bridge & of the reactor in the previous report, to measure load from
+    previous_cpu: dict[str, tuple[float, float]] = field(default_factory=dict)
+    previous_reactor_cpu: tuple[float, float] | None = None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class Supervisor:
+    """
+    Runs bridges in worker processes, restarting workers that crash or hang and
+    collecting the stats & measured load of every bridge
+    """
+    definitions: list[BridgeDefinition]
+    workers: list[_Worker]
+
+    # Smoothed load of each bridge in CPU cores, saved to pack by on the next start
+    loads: dict[str, float]
+
+    # Bridges with a permanently invalid configuration, by name, with the reason
+    invalid: dict[str, str]
+
+    _context: multiprocessing.context.BaseContext
+    _loads_file: str | None
+    _metrics_file: str | None
+    _event_loop: str
+    _running: bool
+
+    def __init__(self, definitions: list[BridgeDefinition], workers: int, pin: bool = False,
+                 loads_file: str | None = None, metrics_file: str | None = None, event_loop: str = "auto"):
+        self.definitions = definitions
+        self._loads_file = loads_file
+        self._metrics_file = metrics_file
+        self._event_loop = event_loop
+        self._running = False
+        self.invalid = {}
+
+        # Workers must not inherit the reactor of this process
+        self._context = multiprocessing.get_context("spawn")
+
+        self.loads = self._load_loads()
+
+        cores = sorted(os.sched_getaffinity(0)) if pin else []
+        self.workers = [
+            _Worker(i, definitions, cores[i % len(cores)] if cores else None)
+            for i, definitions in enumerate(pack(definitions, self.loads, workers))
+        ]
+
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.setLevel(logging.INFO)
+
+    def run(self):
+        self._running = True
+
+        for worker in self.workers:
+            self._start(worker)
+            self.logger.info(f"Worker {worker.index}: {', '.join(d.name for d in worker.definitions)}"
+                             + (f" on core {worker.core}" if worker.core is not None else ""))
+
+        next_summary = time.monotonic() + REPORT_INTERVAL
+        try:
+            while self._running:
+                self._poll(timeout=1.0)
+                self._check_workers()
+
+                if time.monotonic() >= next_summary:
+                    next_summary += REPORT_INTERVAL
+                    self._write_metrics()
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._running = False
+
+    def _start(self, worker: _Worker):
+        parent_conn, child_conn = self._context.Pipe(duplex=False)
+        worker.process = self._context.Process(
+            target=_run_worker,
+            args=(worker.definitions, child_conn, worker.core, self._event_loop),
+            name=f"bridge-worker-{worker.index}",
+        )
+        worker.process.start()
+        child_conn.close()
+
+        worker.conn = parent_conn
+        worker.started_at = worker.last_report_at = time.monotonic()
+        worker.previous_cpu = {}
+        worker.previous_reactor_cpu = None
+        worker.restart_at = None
+
+    def _poll(self, timeout: float):
+        conns = {worker.conn: worker for worker in self.workers if worker.conn is not None}
+        if not conns:
+            time.sleep(timeout)
+            return
+
+        for conn in wait(list(conns), timeout=timeout):
+            worker = conns[conn]
+            try:
+                self._on_report(worker, conn.recv())
+            except (EOFError, OSError):
+                # Worker exited, noticed by _check_workers
+                conn.close()
+                worker.conn = None
+
+    def _on_report(self, worker: _Worker, report: dict):
+        worker.last_report_at = time.monotonic()
+        worker.last_report = report
+
+        for name, reason in report.get('invalid', {}).items():
+            if name in self.invalid:
+                continue
+            self.invalid[name] = reason
+            self.logger.error(f"Bridge {name} has an invalid configuration, not restarting it: {reason}")
+            # Restarts of the worker leave it out
+            worker.definitions = [definition for definition in worker.definitions if definition.name != name]
+
+        if not worker.definitions and not worker.retired:
+            self.logger.error(f"Worker {worker.index} has no bridges left to run, stopping it")
+            worker.retired = True
+            worker.process.terminate()
+
+        own_loads = {}
+        for name, bridge in report['bridges'].items():
+            previous = worker.previous_cpu.get(name)
+            worker.previous_cpu[name] = (report['time'], bridge['cpu'])
+            if previous is None or report['time'] <= previous[0]:
+                continue
+            own_loads[name] = (bridge['cpu'] - previous[1]) / (report['time'] - previous[0])
+
+        reactor_load = 0.0
+        previous = worker.previous_reactor_cpu
+        if 'reactor_cpu' in report:
+            worker.previous_reactor_cpu = (report['time'], report['reactor_cpu'])
+            if previous is not None and report['time'] > previous[0]:
+                reactor_load = (report['reactor_cpu'] - previous[1]) / (report['time'] - previous[0])
+
+        # The reactor's work can't be told apart by bridge, split it by what the bridges use on their own
+        total = sum(own_loads.values())
+        for name, own_load in own_loads.items():
+            share = own_load / total if total > 0 else 1 / len(own_loads)
+            load = own_load + reactor_load * share
+            old = self.loads.get(name)
+            self.loads[name] = load if old is None else old + (load - old) * LOAD_SMOOTHING
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.retired:
+                continue
+
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    self.logger.info(f"Restarting worker {worker.index}")
+                    self._start(worker)
+                continue
+
+            if worker.is_alive() and now - worker.last_report_at > HEARTBEAT_TIMEOUT:
+                self.logger.warning(f"Worker {worker.index} hasn't reported for {HEARTBEAT_TIMEOUT}s, killing it")
+                worker.process.kill()
+                worker.process.join()
+
+            if worker.is_alive():
+                if now - worker.started_at > STABLE_UPTIME:
+                    worker.backoff = RESTART_BACKOFF_MIN
+                continue
+
+            self.logger.error(f"Worker {worker.index} exited with code {worker.process.exitcode}, "
+                              f"restarting in {worker.backoff:.0f}s")
+            if worker.conn is not None:
+                worker.conn.close()
+                worker.conn = None
+            worker.restarts += 1
+            worker.restart_at = now + worker.backoff
+            worker.backoff = min(worker.backoff * 2, RESTART_BACKOFF_MAX)
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        workers = []
+        for worker in self.workers:
+            healthy = worker.is_alive() and now - worker.last_report_at <= REPORT_INTERVAL * 2
+            workers.append({
+                'index': worker.index,
+                'pid': worker.process.pid if worker.process is not None else None,
+                'core': worker.core,
+                'healthy': healthy,
+                'restarts': worker.restarts,
+                'retired': worker.retired,
+                'bridges': {
+                    definition.name: {
+                        'load': self.loads.get(definition.name),
+                        'stats': (worker.last_report or {}).get('bridges', {}).get(definition.name, {}).get('stats'),
+                    }
+                    for definition in worker.definitions
+                },
+            })
+
+        return {
+            'healthy_workers': sum(worker['healthy'] for worker in workers),
+            'total_load': sum(self.loads.values()),
+            'workers': workers,
+            'invalid_bridges': self.invalid,
+        }
+
+    def _write_metrics(self):
+        metrics = self.metrics()
+        self.logger.info(f"{metrics['healthy_workers']}/{len(self.workers)} workers healthy, "
+                         f"total load {metrics['total_load']:.2f} cores")
+
+        if self._metrics_file is not None:
+            self._write_json(self._metrics_file, metrics)
+        if self._loads_file is not None:
+            self._write_json(self._loads_file, self.loads)
+
+    def _load_loads(self) -> dict[str, float]:
+        if self._loads_file is None or not os.path.exists(self._loads_file):
+            return {}
+        with open(self._loads_file, encoding="utf-8") as f:
+            return {name: float(load) for name, load in json.load(f).items()}
+
+    @staticmethod
+    def _write_json(file_name: str, data):
+        tmp_name = f"{file_name}.tmp"
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_name, file_name)
+
+    def _shutdown(self):
+        self.logger.info("Stopping workers")
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(timeout=10)
+                if worker.process.is_alive():
+                    worker.process.kill()
+
+        if self._loads_file is not None:
+            self._write_json(self._loads_file, self.loads)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Runs a fleet of bridges over multiple worker processes")
+    parser.add_argument("bridges",
+                        help="JSON file with a list of bridges: "
+                             "{\"name\", \"args\": [...], \"bot_token_env\": \"BOT_TOKEN\", \"weight\": 1.0}")
+    parser.add_argument("-w", "--workers", default=os.cpu_count() or 1, type=int,
+                        help="max. number of worker processes, defaults to the number of cores")
+    parser.add_argument("--pin", action="store_true", help="pin each worker to its own core")
+    parser.add_argument("--loads-file", default=".bridge-loads.json",
+                        help="where measured loads of bridges are kept, to pack workers by on the next start")
+    parser.add_argument("--metrics-file", default=None, help="file to write aggregated health & metrics to")
+    parser.add_argument("--event-loop", default="auto", choices=EVENT_LOOPS,
+                        help="event loop of the workers, shared by their bridges whatever their own arguments say")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig()
+
+    supervisor = Supervisor(load_definitions(args.bridges), args.workers, args.pin,
+                            args.loads_file, args.metrics_file, args.event_loop)
+
+    def on_signal(signum, frame):
+        supervisor.stop()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+import argparse
+import sys
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the bridge's hot paths")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    packets_parser = subparsers.add_parser("packets", help="voice packet encoding & decoding")
+    packets_parser.add_argument("-n", "--number", default=100_000, type=int, help="calls per measurement")
+
+    sendpath_parser = subparsers.add_parser("sendpath", help="building & encrypting outgoing mic packets")
+    sendpath_parser.add_argument("-n", "--number", default=20_000, type=int, help="packets per measurement")
+
+    decode_parser = subparsers.add_parser("decode", help="speakers decoded per tick by number of decode workers")
+    decode_parser.add_argument("-s", "--speakers", default=[1, 4, 16, 64], type=int, nargs="+",
+                               help="simultaneous speaker counts to measure")
+    decode_parser.add_argument("-w", "--workers", default=[0, 1, 2, 4], type=int, nargs="+",
+                               help="decode worker counts to measure")
+    decode_parser.add_argument("-t", "--ticks", default=100, type=int, help="ticks per measurement")
+
+    eventloop_parser = subparsers.add_parser("eventloop", help="UDP throughput & timer jitter of each event loop")
+    eventloop_parser.add_argument("-l", "--loops", default=["asyncio", "uvloop"], nargs="+",
+                                  help="event loops to measure, as for --event-loop of the bridge")
+    eventloop_parser.add_argument("-t", "--ticks", default=250, type=int, help="20 ms ticks per measurement")
+
+    lowdelay_parser = subparsers.add_parser("lowdelay", help="latency, CPU time & packet rate of the low-delay mode")
+    lowdelay_parser.add_argument("-s", "--speakers", default=4, type=int, help="simultaneous speakers")
+    lowdelay_parser.add_argument("-d", "--duration", default=10.0, type=float, help="seconds per mode")
+
+    args = parser.parse_args(argv)
+
+    # Imported on demand, benchmarks of pure Python code run without libopus & the like
+    if args.benchmark == "packets":
+        from bridge.tools.bench import packets
+        packets.run(args.number)
+    elif args.benchmark == "sendpath":
+        from bridge.tools.bench import sendpath
+        sendpath.run(args.number)
+    elif args.benchmark == "decode":
+        from bridge.tools.bench import decode
+        decode.run(sorted(args.speakers), args.workers, args.ticks)
+    elif args.benchmark == "eventloop":
+        from bridge.tools.bench import eventloop
+        eventloop.run(args.loops, args.ticks)
+    elif args.benchmark == "lowdelay":
+        from bridge.tools.bench import lowdelay
+        lowdelay.run(args.speakers, args.duration)
+
+    return 0
+
+
+if __name__ == '__main__':
+    ret = main(sys.argv[1:])
+    sys.exit(ret)
@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+
+from bridge import audio
+from bridge.audio.opus import EncodingApplication, OpusEncoder
+from bridge.audio.process import AudioProcessThread
+
+# Distinct frames encoded per speaker, cycled through during the benchmark
+FRAMES = 50
+
+
+def _encode_speech_like(samples_per_frame: int, seed: int) -> list[bytes]:
+    """
+    Opus frames of a modulated tone with noise, which exercises the decoder like speech does
+    """
+    rng = np.random.default_rng(seed)
+    encoder = OpusEncoder(audio.SAMPLE_RATE, samples_per_frame, audio.MINECRAFT_CHANNELS,
+                          EncodingApplication.VOICE)
+
+    t = np.arange(samples_per_frame * FRAMES) / audio.SAMPLE_RATE
+    signal = np.sin(2 * np.pi * (150 + 50 * seed % 200) * t) * (0.5 + 0.5 * np.sin(2 * np.pi * 3 * t))
+    signal = (signal * 8000 + rng.normal(0, 500, len(t))).astype(np.int16)
+
+    return [encoder.encode(frame.tobytes()) for frame in signal.reshape(FRAMES, samples_per_frame)]
+
+
+def run(speakers: list[int], workers: list[int], ticks: int):
+    samples_per_frame = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+    frame_ms = audio.FRAME_LENGTH
+
+    encoded = [_encode_speech_like(samples_per_frame, seed) for seed in range(max(speakers))]
+
+    print(f"decode time per tick in ms, capacity in speakers decoded within a {frame_ms} ms frame")
+    print(f"{'workers':>8} " + " ".join(f"{f'{n} spk':>9}" for n in speakers) + f" {'capacity':>9}")
+
+    for worker_count in workers:
+        process = AudioProcessThread(lambda frame, received_at, trace: None, audio.SAMPLE_RATE, audio.FRAME_LENGTH,
+                                     audio.MINECRAFT_CHANNELS, audio.DISCORD_CHANNELS, decode=True,
+                                     decode_workers=worker_count)
+
+        results = []
+        for n in speakers:
+            # Fresh decoders for every speaker count
+            ids = [(n, i) for i in range(n)]
+
+            # Warm up decoders & pool threads
+            process.decode_frames([(ids[i], encoded[i][0]) for i in range(n)])
+
+            start = time.perf_counter()
+            for tick in range(ticks):
+                process.decode_frames([(ids[i], encoded[i][tick % FRAMES]) for i in range(n)])
+            results.append((time.perf_counter() - start) / ticks * 1000)
+
+        # Throughput at the largest speaker count, scaled to the frame length
+        capacity = speakers[-1] * frame_ms / results[-1]
+        print(f"{worker_count:>8} " + " ".join(f"{ms:>9.2f}" for ms in results) + f" {capacity:>9.0f}")
+
+        # The thread itself never ran, this only shuts down the pool
+        process.stop()
@@ -0,0 +1,91 @@
+import json
+import subprocess
+import sys
+import time
+
+# Datagrams kept in flight between the echo client & server
+WINDOW = 32
+# Size of a typical encrypted voice packet
+DATAGRAM_SIZE = 120
+# Tick interval of the audio mixer, in seconds
+TICK = 0.02
+
+
+def measure(loop: str, ticks: int) -> dict:
+    """
+    Echoes datagrams over localhost through the reactor while timing a 20 ms LoopingCall,
+    the two things the bridge's event loop spends its time on
+    """
+    import bridge
+    loop_name = bridge.install_reactor(loop)
+
+    from twisted.internet import reactor, task
+    from twisted.internet.protocol import DatagramProtocol
+
+    class Echo(DatagramProtocol):
+        def datagramReceived(self, datagram, addr):
+            self.transport.write(datagram, addr)
+
+    class Client(DatagramProtocol):
+        round_trips = 0
+
+        def startProtocol(self):
+            self.transport.connect("127.0.0.1", server.getHost().port)
+            for _ in range(WINDOW):
+                self.transport.write(b"\x00" * DATAGRAM_SIZE)
+
+        def datagramReceived(self, datagram, addr):
+            self.round_trips += 1
+            self.transport.write(datagram)
+
+    server = reactor.listenUDP(0, Echo(), interface="127.0.0.1")
+    client = Client()
+
+    lateness = []
+    start = 0.0
+
+    def tick():
+        lateness.append(time.perf_counter() - start - len(lateness) * TICK)
+        if len(lateness) > ticks:
+            reactor.stop()
+
+    def begin():
+        nonlocal start
+        reactor.listenUDP(0, client, interface="127.0.0.1")
+        start = time.perf_counter()
+        task.LoopingCall(tick).start(TICK)
+
+    reactor.callWhenRunning(begin)
+    reactor.run()
+    elapsed = time.perf_counter() - start
+
+    lateness_ms = sorted(max(0.0, late) * 1000 for late in lateness[1:])
+    return {
+        'loop': loop_name,
+        'round_trips_per_s': client.round_trips / elapsed,
+        'late_p50_ms': lateness_ms[len(lateness_ms) // 2],
+        'late_p99_ms': lateness_ms[int(len(lateness_ms) * 0.99)],
+        'late_max_ms': lateness_ms[-1],
+    }
+
+
+def run(loops: list[str], ticks: int):
+    # The reactor is installed once per process, so every loop is measured in its own
+    print(f"{ticks} ticks of {TICK * 1000:.0f} ms under localhost UDP echo load, {WINDOW} datagrams in flight")
+    print(f"{'loop':>8} {'trips/s':>10} {'late p50':>9} {'late p99':>9} {'late max':>9}")
+
+    for loop in loops:
+        result = subprocess.run([sys.executable, "-m", "bridge.tools.bench.eventloop", loop, str(ticks)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+            print(f"{loop:>8} {error}")
+            continue
+
+        stats = json.loads(result.stdout)
+        print(f"{stats['loop']:>8} {stats['round_trips_per_s']:>10.0f} {stats['late_p50_ms']:>9.2f} "
+              f"{stats['late_p99_ms']:>9.2f} {stats['late_max_ms']:>9.2f}")
+
+
+if __name__ == '__main__':
+    print(json.dumps(measure(sys.argv[1], int(sys.argv[2]))))
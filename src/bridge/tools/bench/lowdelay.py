@@ -0,0 +1,86 @@
+import random
+import time
+
+import numpy as np
+
+from bridge import audio
+from bridge.audio.opus import EncodingApplication
+from bridge.audio.process import LOW_DELAY_PENDING_FRAMES, MAX_PENDING_FRAMES, AudioProcessThread
+from bridge.tools.bench.decode import FRAMES, _encode_speech_like
+from bridge.util.cpu import thread_cpu_time
+
+# (name, frame length, application, max. pending frames) of each mode
+MODES = (
+    ("default", audio.FRAME_LENGTH, EncodingApplication.VOICE, MAX_PENDING_FRAMES),
+    ("low-delay", audio.LOW_DELAY_FRAME_LENGTH, EncodingApplication.LOW_DELAY, LOW_DELAY_PENDING_FRAMES),
+)
+
+
+def measure(encoded: list[list[bytes]], seconds: float, frame_length: int, application: EncodingApplication,
+            max_pending_frames: int) -> dict[str, float]:
+    """
+    Plays 20ms voice chat packets of every speaker into the Minecraft to Discord direction
+    in real time, each speaker at its own phase, and times every output frame
+    """
+    delays = []
+
+    def sink(frame: bytes, received_at: float, trace):
+        delays.append(time.monotonic() - received_at)
+
+    process = AudioProcessThread(sink, audio.SAMPLE_RATE, frame_length, audio.MINECRAFT_CHANNELS,
+                                 audio.DISCORD_CHANNELS, decode=True, input_frame_length=audio.FRAME_LENGTH,
+                                 application=application, max_pending_frames=max_pending_frames)
+    process.start()
+
+    # Speakers aren't in sync with the ticks or each other
+    rng = random.Random(0)
+    phases = [rng.random() * audio.FRAME_LENGTH / 1000 for _ in encoded]
+    packet_seconds = audio.FRAME_LENGTH / 1000
+
+    cpu_start = thread_cpu_time(process)
+    started_at = time.monotonic()
+    packets = int(seconds / packet_seconds)
+    events = sorted((i * packet_seconds + phase, speaker, i)
+                    for speaker, phase in enumerate(phases) for i in range(packets))
+    for at, speaker, i in events:
+        delay = started_at + at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        process.enqueue(encoded[speaker][i % FRAMES], speaker, time.monotonic(), sequence=i)
+
+    elapsed = time.monotonic() - started_at
+    cpu = thread_cpu_time(process) - cpu_start
+    process.stop()
+
+    # The first frames include the decoders & encoder warming up
+    delays_ms = np.array(delays[len(delays) // 10:]) * 1000
+    return {
+        'p50': float(np.percentile(delays_ms, 50)),
+        'p95': float(np.percentile(delays_ms, 95)),
+        'lookahead': process._encoder.lookahead / (audio.SAMPLE_RATE / 1000),
+        'cpu': cpu / elapsed,
+        'packet_rate': len(delays) / elapsed,
+    }
+
+
+def run(speakers: int, seconds: float):
+    samples_per_frame = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+    encoded = [_encode_speech_like(samples_per_frame, seed) for seed in range(speakers)]
+
+    print(f"{speakers} speakers of 20 ms voice chat packets to Discord, {seconds:.0f}s per mode")
+    print("bridge delay: from a packet arriving to its audio being sent, lookahead: of the opus encoder")
+    print(f"{'mode':<10} {'frame ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'lookahead':>9} {'total p50':>9} "
+          f"{'CPU %':>6} {'pkt/s':>6}")
+
+    results = {}
+    for name, frame_length, application, max_pending_frames in MODES:
+        result = results[name] = measure(encoded, seconds, frame_length, application, max_pending_frames)
+        print(f"{name:<10} {frame_length:>8} {result['p50']:>7.1f} {result['p95']:>7.1f} "
+              f"{result['lookahead']:>9.1f} {result['p50'] + result['lookahead']:>9.1f} "
+              f"{result['cpu'] * 100:>6.1f} {result['packet_rate']:>6.0f}")
+
+    default, low_delay = results["default"], results["low-delay"]
+    saved = default['p50'] + default['lookahead'] - low_delay['p50'] - low_delay['lookahead']
+    print(f"low-delay saves {saved:.1f} ms at the median, "
+          f"for {low_delay['cpu'] / default['cpu']:.1f}x the CPU time & "
+          f"{low_delay['packet_rate'] / default['packet_rate']:.1f}x the packets")
@@ -0,0 +1,135 @@
+import sys
+import timeit
+import uuid
+from dataclasses import dataclass
+
+from quarry.types.uuid import UUID
+
+from bridge.util.encodable import Buffer
+from bridge.voice.packets import (
+    AuthenticatePacket,
+    GroupSoundPacket,
+    LocationSoundPacket,
+    MicPacket,
+    PingPacket,
+    PlayerSoundPacket,
+)
+
+# Typical size of a 20 ms opus voice frame
+OPUS_FRAME_SIZE = 120
+
+
+# Reference codecs as they were before the precompiled structs, parsing through Buffer field by field
+
+@dataclass
+class _LegacySoundPacket:
+    sender: uuid.UUID
+    data: bytes
+    sequence: int
+
+
+def _legacy_mic_to_buf(pkt: MicPacket) -> bytes:
+    return Buffer.pack_varint(len(pkt.data)) + pkt.data + Buffer.pack("q?", pkt.sequence, pkt.whispering)
+
+
+def _legacy_mic_from_buf(buf: Buffer) -> _LegacySoundPacket:
+    data = buf.read(buf.unpack_varint())
+    (sequence, whispering) = buf.unpack("q?")
+    return _LegacySoundPacket(None, data, sequence)
+
+
+def _legacy_player_sound_from_buf(buf: Buffer) -> _LegacySoundPacket:
+    sender = buf.unpack_uuid()
+    data = buf.read(buf.unpack_varint())
+    (sequence, whispering) = buf.unpack("q?")
+    return _LegacySoundPacket(sender, data, sequence)
+
+
+def _legacy_group_sound_from_buf(buf: Buffer) -> _LegacySoundPacket:
+    sender = buf.unpack_uuid()
+    data = buf.read(buf.unpack_varint())
+    sequence = buf.unpack("q")
+    return _LegacySoundPacket(sender, data, sequence)
+
+
+def _legacy_location_sound_from_buf(buf: Buffer) -> _LegacySoundPacket:
+    sender = buf.unpack_uuid()
+    location = buf.unpack("ddd")
+    data = buf.read(buf.unpack_varint())
+    sequence = buf.unpack("q")
+    return _LegacySoundPacket(sender, data, sequence)
+
+
+def _legacy_ping_to_buf(pkt: PingPacket) -> bytes:
+    return Buffer.pack_uuid(pkt.id) + Buffer.pack("q", pkt.timestamp)
+
+
+def _legacy_ping_from_buf(buf: Buffer) -> tuple:
+    return buf.unpack_uuid(), buf.unpack("q")
+
+
+def _legacy_authenticate_to_buf(pkt: AuthenticatePacket) -> bytes:
+    return Buffer.pack_uuid(pkt.player_uuid) + Buffer.pack_uuid(pkt.secret)
+
+
+def _time(f, number: int) -> float:
+    """
+    Best of 5 runs, in nanoseconds per call
+    """
+    return min(timeit.repeat(f, number=number, repeat=5)) / number * 1e9
+
+
+def _object_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(number: int):
+    sender = UUID.random()
+    data = bytes(OPUS_FRAME_SIZE)
+
+    mic = MicPacket(data, False, 1234)
+    ping = PingPacket(sender, 1234)
+    auth = AuthenticatePacket(sender, UUID.random())
+
+    mic_payload = mic.to_buf()
+    player_payload = sender.to_bytes() + mic_payload
+    group_payload = sender.to_bytes() + Buffer.pack_varint(len(data)) + data + Buffer.pack("q", 1234)
+    location_payload = sender.to_bytes() + Buffer.pack("ddd", 1.0, 2.0, 3.0) + group_payload[16:]
+    ping_payload = ping.to_buf()
+
+    cases = [
+        ("MicPacket.to_buf", lambda: _legacy_mic_to_buf(mic), mic.to_buf),
+        ("MicPacket.from_buf",
+         lambda: _legacy_mic_from_buf(Buffer(mic_payload)),
+         lambda: MicPacket.from_buf(Buffer(mic_payload))),
+        ("PlayerSoundPacket.from_buf",
+         lambda: _legacy_player_sound_from_buf(Buffer(player_payload)),
+         lambda: PlayerSoundPacket.from_buf(Buffer(player_payload))),
+        ("GroupSoundPacket.from_buf",
+         lambda: _legacy_group_sound_from_buf(Buffer(group_payload)),
+         lambda: GroupSoundPacket.from_buf(Buffer(group_payload))),
+        ("LocationSoundPacket.from_buf",
+         lambda: _legacy_location_sound_from_buf(Buffer(location_payload)),
+         lambda: LocationSoundPacket.from_buf(Buffer(location_payload))),
+        ("PingPacket.to_buf", lambda: _legacy_ping_to_buf(ping), ping.to_buf),
+        ("PingPacket.from_buf",
+         lambda: _legacy_ping_from_buf(Buffer(ping_payload)),
+         lambda: PingPacket.from_buf(Buffer(ping_payload))),
+        ("AuthenticatePacket.to_buf", lambda: _legacy_authenticate_to_buf(auth), auth.to_buf),
+    ]
+
+    print(f"{'case':<30} {'before ns':>10} {'after ns':>10} {'speedup':>8}")
+    for name, before, after in cases:
+        assert before() is not None and after() is not None
+        before_ns = _time(before, number)
+        after_ns = _time(after, number)
+        print(f"{name:<30} {before_ns:>10.0f} {after_ns:>10.0f} {before_ns / after_ns:>7.2f}x")
+
+    print()
+    print(f"{'object size':<30} {'before B':>10} {'after B':>10}")
+    sound = GroupSoundPacket.from_buf(Buffer(group_payload))
+    legacy_sound = _legacy_group_sound_from_buf(Buffer(group_payload))
+    print(f"{'SoundPacket':<30} {_object_size(legacy_sound):>10} {_object_size(sound):>10}")
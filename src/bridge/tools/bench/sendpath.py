@@ -0,0 +1,45 @@
+import timeit
+import tracemalloc
+
+from quarry.types.uuid import UUID
+
+from bridge.tools.bench.packets import OPUS_FRAME_SIZE
+from bridge.voice import encode_client_sent_voice_packet
+from bridge.voice.encoding import MicPacketWriter
+from bridge.voice.packets import MicPacket
+
+
+def _peak_allocation(f) -> int:
+    """
+    Peak memory allocated while running f once, in bytes
+    """
+    f()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        f()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - baseline
+
+
+def run(number: int):
+    sender = UUID.random()
+    secret = UUID.random()
+    data = bytes(OPUS_FRAME_SIZE)
+
+    writer = MicPacketWriter(sender, secret)
+
+    def before():
+        pkt = MicPacket(data, False, 1234)
+        return encode_client_sent_voice_packet(pkt.ID, sender, pkt.to_buf(), secret)
+
+    def after():
+        return writer.write(data, 1234)
+
+    print(f"{'send path':<20} {'ns/packet':>10} {'peak alloc B':>13}")
+    for name, f in (("MicPacket + encode", before), ("MicPacketWriter", after)):
+        ns = min(timeit.repeat(f, number=number, repeat=5)) / number * 1e9
+        print(f"{name:<20} {ns:>10.0f} {_peak_allocation(f):>13}")
@@ -25,7 +25,7 @@ def main() -> int:
 
     do_minecraft_auth_flow(client_id, redirect_url, prompt_for_url_input)
 
-    print("Refresh token saved to file")
+    print("Tokens saved to file")
 
     return 0
 
@@ -0,0 +1,15 @@
+import threading
+import time
+
+
+def thread_cpu_time(thread: threading.Thread) -> float:
+    """
+    CPU time a running thread has used so far, in seconds. 0.0 if the platform can't tell.
+    """
+    if thread.ident is None or not thread.is_alive():
+        return 0.0
+
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread.ident))
+    except (AttributeError, OSError):
+        return 0.0
@@ -5,6 +5,8 @@ import quarry.types.buffer
 Buffer = quarry.types.buffer.Buffer1_14
 
 class Decodable(abc.ABC):
+    __slots__ = ()
+
     @classmethod
     @abc.abstractmethod
     def from_buf(cls, buf: Buffer) -> 'Decodable':
@@ -12,6 +14,8 @@ class Decodable(abc.ABC):
 
 
 class Encodable(abc.ABC):
+    __slots__ = ()
+
     @abc.abstractmethod
     def to_buf(self) -> bytes:
         ...
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from twisted.internet import reactor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HandoffStats:
+    calls: int = 0
+    # Times the reactor was woken up to run a batch of calls
+    wakeups: int = 0
+    # Time between a call being handed off & it running on the reactor, in seconds
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+
+
+class ReactorOutbox:
+    """
+    Hands calls from worker threads over to the reactor thread in batches.
+
+    Unlike calling ``reactor.callFromThread`` for every call, the reactor is only woken
+    up when the outbox goes from empty to non-empty, and then runs everything that
+    piled up in the meantime.
+    """
+    _lock: threading.Lock
+    _pending: list[tuple[float, Callable, tuple]]
+    _scheduled: bool
+    _call_from_thread: Callable
+
+    _started_at: float
+
+    stats: HandoffStats
+
+    def __init__(self, call_from_thread: Callable | None = None):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._scheduled = False
+        self._call_from_thread = call_from_thread if call_from_thread is not None else reactor.callFromThread
+
+        self._started_at = time.monotonic()
+
+        self.stats = HandoffStats()
+
+    def call(self, f: Callable, *args: Any):
+        """
+        Runs ``f(*args)`` on the reactor thread, can be called from any thread
+        """
+        with self._lock:
+            self._pending.append((time.monotonic(), f, args))
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        self._call_from_thread(self._drain)
+
+    def _drain(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            self._scheduled = False
+
+        stats = self.stats
+        stats.wakeups += 1
+        stats.calls += len(pending)
+
+        now = time.monotonic()
+        for queued_at, f, args in pending:
+            latency = now - queued_at
+            stats.latency_total += latency
+            if latency > stats.latency_max:
+                stats.latency_max = latency
+
+            try:
+                f(*args)
+            except Exception:
+                # Don't lose the rest of the batch
+                logger.exception("Handed off call failed")
+
+    def summary(self) -> dict[str, float]:
+        stats = self.stats
+        uptime = time.monotonic() - self._started_at
+        return {
+            'calls': stats.calls,
+            'wakeups': stats.wakeups,
+            'wakeups_per_second': stats.wakeups / uptime if uptime > 0 else 0.0,
+            'calls_per_wakeup': stats.calls / stats.wakeups if stats.wakeups else 0.0,
+            'avg_latency_ms': stats.latency_total / stats.calls * 1000 if stats.calls else 0.0,
+            'max_latency_ms': stats.latency_max * 1000,
+        }
+
+
+# Outbox shared by all bridges in this process, so they share reactor wakeups too
+shared_outbox = ReactorOutbox()
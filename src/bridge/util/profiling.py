@@ -0,0 +1,236 @@
+import collections
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable
+
+# Interval between stack samples of the CPU profiler, in seconds
+SAMPLE_INTERVAL = 0.01
+
+# Frames kept per allocation traceback, more make snapshots slower & bigger
+TRACEMALLOC_FRAMES = 10
+
+# Lines per comparison in a memory report
+REPORT_LINES = 40
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Samples the stacks of all other threads at a fixed interval, cheap enough to run
+    in production. Counts every distinct stack, in the collapsed format flame graph
+    tools (flamegraph.pl, speedscope) read.
+    """
+    stacks: collections.Counter[str]
+    samples: int
+    started_at: float
+
+    _interval: float
+    # Called on this thread once sampling ended, so whoever stops it doesn't wait for the results
+    _on_stopped: Callable[["SamplingProfiler"], None] | None
+    _end_thread: threading.Event
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL,
+                 on_stopped: Callable[["SamplingProfiler"], None] | None = None):
+        super().__init__(name="SamplingProfiler", daemon=True)
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = time.monotonic()
+        self._interval = interval
+        self._on_stopped = on_stopped
+        self._end_thread = threading.Event()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._end_thread.wait(self._interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+        if self._on_stopped is not None:
+            self._on_stopped(self)
+
+    def self_time(self) -> collections.Counter[str]:
+        """
+        Samples per function it was on top of the stack in
+        """
+        top = collections.Counter()
+        for stack, count in self.stacks.items():
+            top[stack.rsplit(";", 1)[-1]] += count
+        return top
+
+    def stop(self, wait: bool = True):
+        """
+        :param wait: whether to wait for the thread, & its on_stopped callback, to finish
+        """
+        self._end_thread.set()
+        if wait:
+            super().join()
+
+
+class Profiler:
+    """
+    CPU & memory profiling of the running process on demand, writing results to a directory.
+    The work happens on background threads, the reactor & audio threads keep running.
+
+    Memory snapshots use tracemalloc, which hooks every allocation of the whole process
+    once started: expect allocations to get noticeably slower & memory use to grow until
+    the profiler is stopped.
+    """
+    directory: str
+
+    # Reentrant, the signal handlers may interrupt the main thread while it holds the lock
+    _lock: threading.RLock
+    _cpu: SamplingProfiler | None
+    _snapshotting: bool
+    _baseline: tracemalloc.Snapshot | None
+    _previous: tracemalloc.Snapshot | None
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._cpu = None
+        self._snapshotting = False
+        self._baseline = None
+        self._previous = None
+
+    @property
+    def cpu_running(self) -> bool:
+        return self._cpu is not None
+
+    def start_cpu(self) -> str:
+        with self._lock:
+            if self._cpu is not None:
+                return "CPU profile already running"
+            self._cpu = SamplingProfiler(on_stopped=self._write_cpu)
+            self._cpu.start()
+
+        logger.info("Started CPU profile")
+        return "Started CPU profile"
+
+    def stop_cpu(self, wait: bool = False) -> str:
+        """
+        Stops the CPU profile, the sampler thread writes it once it ended
+        :param wait: whether to wait for the profile to be written
+        """
+        with self._lock:
+            profiler = self._cpu
+            self._cpu = None
+        if profiler is None:
+            return "No CPU profile running"
+
+        profiler.stop(wait)
+        return f"Stopped CPU profile of {time.monotonic() - profiler.started_at:.0f}s, writing it to {self.directory}"
+
+    def _write_cpu(self, profiler: SamplingProfiler):
+        try:
+            duration = time.monotonic() - profiler.started_at
+
+            file_name = self._file_name("cpu", "folded")
+            with open(file_name, "w", encoding="utf-8") as f:
+                for stack, count in profiler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+            total = sum(profiler.stacks.values()) or 1
+            top = ", ".join(f"{function} {count / total:.0%}"
+                            for function, count in profiler.self_time().most_common(5))
+            logger.info(f"CPU profile of {duration:.0f}s written to {file_name}, "
+                        f"{profiler.samples} samples, top: {top}")
+        except Exception:
+            logger.exception("Writing CPU profile failed")
+
+    def toggle_cpu(self) -> str:
+        return self.stop_cpu() if self.cpu_running else self.start_cpu()
+
+    def snapshot_memory(self) -> str:
+        """
+        Takes a tracemalloc snapshot in the background & compares it to the previous one
+        & the first one. The first call starts tracing, so it only takes the baseline.
+        Tracing slows down every allocation in the process until the profiler is stopped.
+        """
+        with self._lock:
+            if self._snapshotting:
+                return "Memory snapshot already in progress"
+            self._snapshotting = True
+
+        first = not tracemalloc.is_tracing()
+        threading.Thread(target=self._snapshot_memory, name="MemorySnapshot", daemon=True).start()
+        if first:
+            return ("Started tracing allocations, which slows down every allocation until the bridge stops, "
+                    "take another snapshot later to compare")
+        return "Taking memory snapshot"
+
+    def _snapshot_memory(self):
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+
+            if self._baseline is None:
+                self._baseline = self._previous = snapshot
+                logger.info("Took baseline memory snapshot")
+                return
+
+            file_name = self._file_name("memory", "txt")
+            with open(file_name, "w", encoding="utf-8") as f:
+                current, peak = tracemalloc.get_traced_memory()
+                f.write(f"Traced memory: {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB\n")
+                self._write_comparison(f, "Since previous snapshot", snapshot, self._previous)
+                self._write_comparison(f, "Since first snapshot", snapshot, self._baseline)
+            self._previous = snapshot
+
+            logger.info(f"Memory snapshot compared & written to {file_name}")
+        except Exception:
+            logger.exception("Taking memory snapshot failed")
+        finally:
+            with self._lock:
+                self._snapshotting = False
+
+    @staticmethod
+    def _write_comparison(f, title: str, snapshot: tracemalloc.Snapshot, old: tracemalloc.Snapshot):
+        differences = snapshot.compare_to(old, "lineno")
+        growth = sum(stat.size_diff for stat in differences)
+        f.write(f"\n{title}: {growth / 2 ** 10:+.1f} KiB\n")
+        for stat in differences[:REPORT_LINES]:
+            f.write(f"{stat}\n")
+
+    def stop(self):
+        if self.cpu_running:
+            self.stop_cpu(wait=True)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _file_name(self, kind: str, extension: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+
+def install_signal_handlers(profiler: Profiler):
+    """
+    SIGUSR1 starts & stops the CPU profile, SIGUSR2 takes a memory snapshot
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        logger.warning("No SIGUSR1 & SIGUSR2 on this platform, profiling only through the slash command")
+        return
+
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.toggle_cpu())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.snapshot_memory())
@@ -0,0 +1,95 @@
+import collections
+import time
+from collections.abc import Hashable
+
+# Sources tracked at once, the least recently seen are forgotten beyond it
+MAX_SOURCES = 1024
+
+
+class TokenBucket:
+    """
+    Allows a sustained rate of events with bursts up to a limit, e.g. of packets from one source
+    """
+    rate: float
+    burst: float
+
+    _tokens: float
+    _updated_at: float
+
+    def __init__(self, rate: float, burst: float):
+        """
+        :param rate: events per second
+        :param burst: events allowed at once after being idle
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+
+    def allow(self) -> bool:
+        """
+        Takes a token if there is one
+        """
+        now = time.monotonic()
+        tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        if tokens < 1:
+            self._tokens = tokens
+            return False
+        self._tokens = tokens - 1
+        return True
+
+    def is_full_at(self, now: float) -> bool:
+        """
+        Whether the bucket refilled to its burst by then, making it no different from a new one
+        """
+        return self._tokens + (now - self._updated_at) * self.rate >= self.burst
+
+
+class SourceRateLimiter:
+    """
+    A token bucket per source, e.g. per address datagrams come from. Buckets of sources idle
+    long enough to have refilled are dropped, as are the least recently seen ones once there
+    are too many, so sources that come & go don't add up.
+    """
+    rate: float
+    burst: float
+    max_sources: int
+
+    # Least recently seen first
+    _buckets: collections.OrderedDict[Hashable, TokenBucket]
+
+    def __init__(self, rate: float, burst: float, max_sources: int = MAX_SOURCES):
+        """
+        :param rate: events per second of each source
+        :param burst: events allowed at once from a source after being idle
+        :param max_sources: sources tracked at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_sources = max_sources
+        self._buckets = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def allow(self, source: Hashable) -> bool:
+        """
+        Takes a token from the source's bucket if there is one
+        """
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            self._evict()
+            bucket = self._buckets[source] = TokenBucket(self.rate, self.burst)
+        else:
+            self._buckets.move_to_end(source)
+        return bucket.allow()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._buckets:
+            source, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) < self.max_sources and not bucket.is_full_at(now):
+                break
+            del self._buckets[source]
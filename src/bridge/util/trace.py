@@ -0,0 +1,166 @@
+import bisect
+import collections
+import json
+import os
+import threading
+import time
+
+MINECRAFT_TO_DISCORD = "minecraft_to_discord"
+DISCORD_TO_MINECRAFT = "discord_to_minecraft"
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40, 60, 100, 200, 500, 1000)
+
+# Completed traces kept for exporting
+MAX_KEPT_TRACES = 5000
+
+# Chrome trace thread ids, one track per direction
+_EXPORT_TIDS = {MINECRAFT_TO_DISCORD: 1, DISCORD_TO_MINECRAFT: 2}
+
+
+class FrameTrace:
+    """
+    Timestamps of one frame at every stage boundary it passed, the time spent in a
+    stage is the time between its mark & the previous one
+    """
+    __slots__ = ('direction', 'marks')
+
+    direction: str
+    marks: list[tuple[str, float]]
+
+    def __init__(self, direction: str, stage: str):
+        self.direction = direction
+        self.marks = [(stage, time.monotonic())]
+
+    def mark(self, stage: str):
+        self.marks.append((stage, time.monotonic()))
+
+
+class LatencyHistogram:
+    counts: list[int]
+    count: int
+    total: float
+    max: float
+
+    def __init__(self):
+        # Last bucket holds everything above the largest bound
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the bucket the percentile falls into, in milliseconds
+        :param q: percentile between 0 & 1
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Tracer:
+    """
+    Samples frames entering the bridge & collects the latency of each stage they pass through.
+    Unsampled frames only cost a counter decrement.
+    """
+    _interval: int
+    _countdown: int
+
+    _lock: threading.Lock
+    # Per direction & stage, "total" being end-to-end
+    _histograms: dict[str, dict[str, LatencyHistogram]]
+    _recent: collections.deque[FrameTrace]
+
+    def __init__(self, sample_rate: float, keep: int = MAX_KEPT_TRACES):
+        """
+        :param sample_rate: fraction of frames to trace, e.g. 0.01 for every 100th frame
+        :param keep: number of completed traces kept for exporting
+        """
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample rate must be between 0 & 1")
+
+        self._interval = round(1 / sample_rate)
+        self._countdown = self._interval
+
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._recent = collections.deque(maxlen=keep)
+
+    def sample(self, direction: str, stage: str = "receive") -> FrameTrace | None:
+        """
+        Starts a trace for every n-th frame, called where frames enter the bridge
+        """
+        # Races between threads only make the sampling slightly uneven
+        self._countdown -= 1
+        if self._countdown > 0:
+            return None
+        self._countdown = self._interval
+        return FrameTrace(direction, stage)
+
+    def finish(self, trace: FrameTrace):
+        """
+        Records a trace that made it all the way through, can be called from any thread
+        """
+        marks = trace.marks
+        with self._lock:
+            histograms = self._histograms.setdefault(trace.direction, {})
+            for (_, previous), (stage, at) in zip(marks, marks[1:]):
+                histograms.setdefault(stage, LatencyHistogram()).add((at - previous) * 1000)
+            histograms.setdefault("total", LatencyHistogram()).add((marks[-1][1] - marks[0][1]) * 1000)
+            self._recent.append(trace)
+
+    def summary(self, direction: str) -> dict[str, float]:
+        """
+        p50 & p99 latency of every stage of a direction, in milliseconds
+        """
+        with self._lock:
+            histograms = self._histograms.get(direction, {})
+            summary: dict[str, float] = {'traces': histograms["total"].count if "total" in histograms else 0}
+            for stage, histogram in histograms.items():
+                summary[f'{stage}_p50'] = histogram.percentile(0.5)
+                summary[f'{stage}_p99'] = histogram.percentile(0.99)
+            return summary
+
+    def export(self, file_name: str):
+        """
+        Writes the kept traces in the Chrome trace event format, viewable in
+        chrome://tracing or ui.perfetto.dev, every frame on its own track
+        """
+        with self._lock:
+            traces = list(self._recent)
+
+        pid = os.getpid()
+        tids = dict(_EXPORT_TIDS)
+        for trace in traces:
+            tids.setdefault(trace.direction, len(tids) + 1)
+
+        # Viewers expect numeric thread ids, name the tracks after their direction
+        events = [{'name': "thread_name", 'ph': "M", 'pid': pid, 'tid': tid, 'args': {'name': direction}}
+                  for direction, tid in tids.items()]
+        for i, trace in enumerate(traces):
+            marks = trace.marks
+            common = {'cat': trace.direction, 'id': i, 'pid': pid, 'tid': tids[trace.direction]}
+            events.append({'name': "frame", 'ph': "b", 'ts': marks[0][1] * 1e6, **common})
+            for (_, previous), (stage, at) in zip(marks, marks[1:]):
+                events.append({'name': stage, 'ph': "b", 'ts': previous * 1e6, **common})
+                events.append({'name': stage, 'ph': "e", 'ts': at * 1e6, **common})
+            events.append({'name': "frame", 'ph': "e", 'ts': marks[-1][1] * 1e6, **common})
+
+        tmp_name = f"{file_name}.tmp"
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': "ms"}, f)
+        os.replace(tmp_name, file_name)
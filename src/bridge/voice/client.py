@@ -1,21 +1,49 @@
+import collections
 import uuid
 from collections.abc import Callable
+from dataclasses import dataclass
 
+from quarry.types.buffer import BufferUnderrun
 from twisted.internet import reactor
 from twisted.internet.protocol import DatagramProtocol
 
 from bridge.util.encodable import Buffer
+from bridge.util.ratelimit import SourceRateLimiter
+from bridge.util.trace import MINECRAFT_TO_DISCORD, FrameTrace, Tracer
 from bridge.voice import decode_voice_packet, encode_client_sent_voice_packet
+from bridge.voice.encoding import DEFAULT_MTU, MAX_DATAGRAM_SIZE, InvalidSecretException, MicPacketWriter, iv_size
 from bridge.voice.packets import (
     AuthenticateAckPacket,
     AuthenticatePacket,
     EncodableVoicePacket,
     GroupSoundPacket,
     KeepAlivePacket,
-    MicPacket,
+    LocationSoundPacket,
     PingPacket,
+    PlayerSoundPacket,
+    SoundPacket,
 )
 
+_SOUND_PACKETS = {pkt.ID: pkt for pkt in (PlayerSoundPacket, GroupSoundPacket, LocationSoundPacket)}
+
+_BLOCK_SIZE = 16
+# IV & at least one block of ciphertext holding the secret & packet ID, padded
+MIN_DATAGRAM_SIZE = iv_size + 2 * _BLOCK_SIZE
+# Packets per second accepted from each source, 50 per speaker of the voice server
+RATE_LIMIT = 5000
+# Packets accepted at once, e.g. after the reactor stalled
+RATE_LIMIT_BURST = 1000
+
+
+@dataclass
+class InboundStats:
+    # Rejected before decrypting: sent by anyone but the voice server, of impossible length or too many
+    foreign_packets: int = 0
+    malformed_packets: int = 0
+    rate_limited_packets: int = 0
+    # Rejected after decrypting: bad padding, secret or contents
+    invalid_packets: int = 0
+
 
 class VoiceConnection(DatagramProtocol):
     host: str
@@ -25,21 +53,57 @@ class VoiceConnection(DatagramProtocol):
     secret: uuid.UUID
 
     on_connected: Callable
-    on_voice_data: Callable[[bytes], None]
+    on_voice_data: Callable[[SoundPacket, FrameTrace | None], None]
+
+    # Whether to receive proximity voice & positional sounds
+    proximity: bool
+
+    # Raw UUIDs of senders whose audio is dropped right after decryption
+    blocked_senders: set[bytes]
+    filtered_packets: int
+    # Packets dropped per raw sender UUID
+    filtered_senders: collections.Counter[bytes]
 
     mic_sequence: int
+    mic_writer: MicPacketWriter
+
+    tracer: Tracer | None
+
+    # Address of the voice server once resolved, datagrams from anywhere else are dropped
+    server: tuple[str, int] | None
+    inbound: InboundStats
+    _rate_limit: SourceRateLimiter | None
 
     def __init__(self, host: str, port: int, player_id: uuid.UUID, secret: uuid.UUID,
                  on_connected: Callable,
-                 on_voice_data: Callable[[bytes], None]):
+                 on_voice_data: Callable[[SoundPacket, FrameTrace | None], None],
+                 proximity: bool = False,
+                 mtu: int = DEFAULT_MTU,
+                 blocked_senders: set[bytes] | None = None,
+                 tracer: Tracer | None = None,
+                 rate_limit: float | None = RATE_LIMIT):
+        """
+        :param rate_limit: packets per second accepted from each source address, None for no limit
+        """
         self.host = host
         self.port = port
         self.player = player_id
         self.secret = secret
         self.on_connected = on_connected
         self.on_voice_data = on_voice_data
+        self.proximity = proximity
+        self.blocked_senders = blocked_senders if blocked_senders is not None else set()
+        self.filtered_packets = 0
+        self.filtered_senders = collections.Counter()
 
         self.mic_sequence = 0
+        self.mic_writer = MicPacketWriter(player_id, secret, mtu)
+
+        self.tracer = tracer
+
+        self.server = None
+        self.inbound = InboundStats()
+        self._rate_limit = SourceRateLimiter(rate_limit, RATE_LIMIT_BURST) if rate_limit else None
 
     def startProtocol(self):
         reactor.resolve(self.host).addCallback(self._on_host_resolved)
@@ -50,35 +114,73 @@ class VoiceConnection(DatagramProtocol):
         :param data: opus-encoded audio data
         :return:
         """
-        pkt = MicPacket(data, False, self.mic_sequence)
+        datagram = self.mic_writer.write(data, self.mic_sequence)
         self.mic_sequence += 1
 
-        self._send_packet(pkt)
+        # Sent or copied by the transport right away, so the writer's buffer can be reused after
+        self.transport.write(datagram)
 
     def datagramReceived(self, datagram: bytes, addr: tuple):
-        buf = Buffer(datagram)
-
-        # Decode & decrypt packet
-        payload = decode_voice_packet(buf, self.secret)
-
-        # Get type of packet
-        packet_type = int.from_bytes(payload.unpack("c"), "big")
+        # Cheap checks first, anyone can send to the socket & decrypting isn't cheap
+        if addr != self.server:
+            self.inbound.foreign_packets += 1
+            return
+        length = len(datagram)
+        if length < MIN_DATAGRAM_SIZE or length > MAX_DATAGRAM_SIZE or (length - iv_size) % _BLOCK_SIZE:
+            self.inbound.malformed_packets += 1
+            return
+        if self._rate_limit is not None and not self._rate_limit.allow(addr):
+            self.inbound.rate_limited_packets += 1
+            return
+
+        trace = self.tracer.sample(MINECRAFT_TO_DISCORD) if self.tracer is not None else None
+
+        try:
+            # Decode & decrypt packet
+            payload = decode_voice_packet(Buffer(datagram), self.secret)
+            if trace is not None:
+                trace.mark("decrypt")
+
+            # Get type of packet
+            packet_type = int.from_bytes(payload.unpack("c"), "big")
+        except (ValueError, InvalidSecretException, BufferUnderrun):
+            self.inbound.invalid_packets += 1
+            return
 
         if packet_type == AuthenticateAckPacket.ID:
             # Give connected callback
             self.on_connected()
-        if packet_type == GroupSoundPacket.ID:
-            pkt = GroupSoundPacket.from_buf(payload)
-            self.on_voice_data(pkt.data)
-        if packet_type == KeepAlivePacket.ID:
+        if packet_type in _SOUND_PACKETS:
+            if packet_type != GroupSoundPacket.ID and not self.proximity:
+                return
+
+            # All sound packets start with the sender, check it before parsing anything
+            sender = payload.buff[payload.pos:payload.pos + 16]
+            if sender in self.blocked_senders:
+                self.filtered_packets += 1
+                self.filtered_senders[sender] += 1
+                return
+
+            try:
+                packet = _SOUND_PACKETS[packet_type].from_buf(payload)
+            except (ValueError, BufferUnderrun):
+                self.inbound.invalid_packets += 1
+                return
+            self.on_voice_data(packet, trace)
+        elif packet_type == KeepAlivePacket.ID:
             # Respond with keepalive
             self._send_packet(KeepAlivePacket())
         elif packet_type == PingPacket.ID:
             # Respond with pong
-            pkt = PingPacket.from_buf(payload)
+            try:
+                pkt = PingPacket.from_buf(payload)
+            except (ValueError, BufferUnderrun):
+                self.inbound.invalid_packets += 1
+                return
             self._send_packet(PingPacket(pkt.id, pkt.timestamp))
 
     def _on_host_resolved(self, ip: str):
+        self.server = (ip, self.port)
         self.transport.connect(ip, self.port)
 
         # Authenticate
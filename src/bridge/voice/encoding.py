@@ -2,9 +2,11 @@ import os
 import uuid
 
 from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers import Cipher, CipherContext, algorithms, modes
 
 from bridge.util.encodable import Buffer
+from bridge.voice.packets import MicPacket
+from bridge.voice.packets.codec import SEQUENCE_WHISPERING
 
 
 class InvalidSecretException(Exception):
@@ -97,3 +99,138 @@ def _encrypt_payload(data: bytes, secret: uuid.UUID) -> bytes:
     encrypted_payload = encryptor.update(padded_data) + encryptor.finalize()
 
     return iv + encrypted_payload
+
+
+# Max. size of a voice chat datagram if the server doesn't tell us
+DEFAULT_MTU = 1024
+
+# Largest datagram received, whatever the MTU. Opus frames of voice chat are at most
+# 1275 bytes, sound packets add less than 100 bytes.
+MAX_DATAGRAM_SIZE = 2048
+
+# Random bytes fetched at once for IVs
+_IV_POOL_SIZE = iv_size * 256
+
+_block_size = algorithms.AES.block_size // 8
+
+# PKCS7 padding by padding length
+_PADDING = [bytes((n,)) * n for n in range(_block_size + 1)]
+
+
+class MicPacketWriter:
+    """
+    Builds client-sent MicPackets of one voice session into reusable buffers.
+
+    The sender, secret & packet ID never change during a session, so they are written
+    once. Each packet is then assembled in place: the plaintext is padded in its buffer
+    and encrypted straight into the datagram buffer, without intermediate bytes objects.
+
+    A single CBC encryptor, and with it the AES key schedule, is kept for the whole session.
+    It chains every packet onto the last ciphertext block of the one before, so the first
+    plaintext block is XORed with that block & the packet's IV beforehand to cancel it out,
+    which gives the same ciphertext as a fresh encryptor with that IV.
+    """
+    sender: uuid.UUID
+    secret: uuid.UUID
+
+    # Datagrams written & buffers or cipher contexts allocated for them, for reporting
+    packets: int
+    allocations: int
+
+    _encryptor: CipherContext
+    # Last ciphertext block the encryptor chains the next packet onto
+    _chain: int
+    # First plaintext block, the secret
+    _secret_block: int
+    _plain: bytearray
+    _datagram: bytearray
+    _ivs: bytes
+    _iv_pos: int
+
+    def __init__(self, sender: uuid.UUID, secret: uuid.UUID, mtu: int = DEFAULT_MTU):
+        self.sender = sender
+        self.secret = secret
+        self.packets = 0
+        # The encryptor & both buffers
+        self.allocations = 3
+
+        self._encryptor = Cipher(algorithms.AES(secret.bytes), modes.CBC(bytes(iv_size))).encryptor()
+        self._chain = 0
+        self._secret_block = int.from_bytes(secret.bytes, "little")
+
+        self._plain = bytearray(mtu)
+        self._plain[16] = MicPacket.ID
+
+        self._datagram = bytearray(mtu)
+        self._datagram[0:16] = sender.bytes
+
+        self._ivs = b""
+        self._iv_pos = 0
+
+    def write(self, data: bytes, sequence: int, whispering: bool = False) -> memoryview:
+        """
+        :param data: opus-encoded audio data
+        :return: the datagram, only valid until the next call
+        """
+        # Plaintext: secret, ID, length-prefixed data, sequence & whispering
+        length = len(data)
+        header_size = 17 + (1 if length < 0x80 else 2)
+        plain_size = header_size + length + SEQUENCE_WHISPERING.size
+        padded_size = (plain_size // _block_size + 1) * _block_size
+
+        # Encrypted payload: IV followed by the ciphertext
+        payload_size = iv_size + padded_size
+        prefix_size = 16 + (1 if payload_size < 0x80 else 2)
+        # The cipher wants room for an extra block in its output
+        datagram_size = prefix_size + payload_size + _block_size
+        self._ensure_capacity(max(padded_size, length + header_size), datagram_size)
+
+        plain = self._plain
+        if length < 0x80:
+            plain[17] = length
+        else:
+            plain[17] = length & 0x7F | 0x80
+            plain[18] = length >> 7
+        plain[header_size:header_size + length] = data
+        SEQUENCE_WHISPERING.pack_into(plain, header_size + length, sequence, whispering)
+
+        # PKCS7
+        padding_length = padded_size - plain_size
+        plain[plain_size:padded_size] = _PADDING[padding_length]
+
+        datagram = self._datagram
+        if payload_size < 0x80:
+            datagram[16] = payload_size
+        else:
+            datagram[16] = payload_size & 0x7F | 0x80
+            datagram[17] = payload_size >> 7
+
+        iv = self._next_iv()
+        datagram[prefix_size:prefix_size + iv_size] = iv
+        plain[0:16] = (self._secret_block ^ int.from_bytes(iv, "little") ^ self._chain).to_bytes(16, "little")
+
+        out = memoryview(datagram)
+        end = prefix_size + payload_size
+        self._encryptor.update_into(memoryview(plain)[:padded_size], out[prefix_size + iv_size:])
+        self._chain = int.from_bytes(out[end - _block_size:end], "little")
+
+        self.packets += 1
+        return out[:end]
+
+    def _next_iv(self) -> memoryview:
+        if self._iv_pos + iv_size > len(self._ivs):
+            self._ivs = os.getrandom(_IV_POOL_SIZE)
+            self._iv_pos = 0
+
+        iv = memoryview(self._ivs)[self._iv_pos:self._iv_pos + iv_size]
+        self._iv_pos += iv_size
+        return iv
+
+    def _ensure_capacity(self, plain_size: int, datagram_size: int):
+        # Only for frames larger than the MTU, which the server would reject anyway
+        if plain_size > len(self._plain):
+            self._plain.extend(bytes(plain_size - len(self._plain)))
+            self.allocations += 1
+        if datagram_size > len(self._datagram):
+            self._datagram.extend(bytes(datagram_size - len(self._datagram)))
+            self.allocations += 1
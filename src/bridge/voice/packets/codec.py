@@ -0,0 +1,88 @@
+import functools
+import struct
+
+from quarry.types.buffer import BufferUnderrun
+from quarry.types.uuid import UUID
+
+from bridge.util.encodable import Buffer
+
+# Precompiled layouts of the fixed-size parts of voice packets
+UUID_STRUCT = struct.Struct(">16s")
+SEQUENCE = struct.Struct(">q")
+SEQUENCE_WHISPERING = struct.Struct(">q?")
+UUID_LOCATION = struct.Struct(">16sddd")
+UUID_PAIR = struct.Struct(">16s16s")
+UUID_TIMESTAMP = struct.Struct(">16sq")
+
+
+def unpack_from(layout: struct.Struct, buf: Buffer) -> tuple:
+    """
+    Unpacks a fixed-size layout at the current position of the buffer in one go
+    """
+    pos = buf.pos
+    if pos + layout.size > len(buf.buff):
+        raise BufferUnderrun()
+    buf.pos = pos + layout.size
+    return layout.unpack_from(buf.buff, pos)
+
+
+@functools.lru_cache(maxsize=1024)
+def uuid_from_bytes(data: bytes) -> UUID:
+    """
+    Building a UUID is slow compared to the rest of a packet, but there are only
+    a handful of distinct senders, so they are cached
+    """
+    return UUID(bytes=data)
+
+
+def unpack_uuid(buf: Buffer) -> UUID:
+    return uuid_from_bytes(unpack_from(UUID_STRUCT, buf)[0])
+
+
+def unpack_varint(buf: Buffer) -> int:
+    """
+    Same as :meth:`Buffer.unpack_varint`, without a struct call per byte
+    """
+    data = buf.buff
+    pos = buf.pos
+
+    # Single byte, the common case for lengths of voice data
+    if pos < len(data) and data[pos] < 0x80:
+        buf.pos = pos + 1
+        return data[pos]
+
+    number = 0
+    for shift in range(0, 35, 7):
+        if pos >= len(data):
+            raise BufferUnderrun()
+        b = data[pos]
+        pos += 1
+        number |= (b & 0x7F) << shift
+        if not b & 0x80:
+            break
+    buf.pos = pos
+
+    if number & (1 << 31):
+        number -= 1 << 32
+    return number
+
+
+def unpack_bytes(buf: Buffer) -> bytes:
+    """
+    Unpacks varint length-prefixed bytes
+    """
+    length = unpack_varint(buf)
+    pos = buf.pos
+    if length < 0 or pos + length > len(buf.buff):
+        raise BufferUnderrun()
+    buf.pos = pos + length
+    return bytes(buf.buff[pos:pos + length])
+
+
+def pack_varint(number: int) -> bytes:
+    # Lengths of voice data always fit in one or two bytes
+    if 0 <= number < 0x80:
+        return bytes((number,))
+    if 0 <= number < 0x4000:
+        return bytes((number & 0x7F | 0x80, number >> 7))
+    return Buffer.pack_varint(number)
@@ -4,12 +4,15 @@ from bridge.util.encodable import Decodable, Encodable
 
 
 class VoicePacket(abc.ABC):
+    # Empty slots all the way up, so that slotted packets don't get a __dict__
+    __slots__ = ()
+
     ID: int
 
 
 class EncodableVoicePacket(Encodable, VoicePacket, abc.ABC):
-    pass
+    __slots__ = ()
 
 
 class DecodableVoicePacket(Decodable, VoicePacket, abc.ABC):
-    pass
+    __slots__ = ()
@@ -3,10 +3,18 @@ from dataclasses import dataclass
 from typing import NamedTuple
 
 from bridge.util.encodable import Buffer
+from bridge.voice.packets import codec
+from bridge.voice.packets.codec import (
+    SEQUENCE,
+    SEQUENCE_WHISPERING,
+    UUID_LOCATION,
+    UUID_PAIR,
+    UUID_TIMESTAMP,
+)
 from bridge.voice.packets.packet import DecodableVoicePacket, EncodableVoicePacket
 
 
-@dataclass
+@dataclass(slots=True)
 class MicPacket(EncodableVoicePacket, DecodableVoicePacket):
     ID = 0x01
 
@@ -15,14 +23,16 @@ class MicPacket(EncodableVoicePacket, DecodableVoicePacket):
     sequence: int
 
     def to_buf(self) -> bytes:
-        return Buffer.pack_varint(len(self.data)) + self.data + \
-               Buffer.pack("q?", self.sequence, self.whispering)
+        return b"".join((
+            codec.pack_varint(len(self.data)),
+            self.data,
+            SEQUENCE_WHISPERING.pack(self.sequence, self.whispering)
+        ))
 
     @classmethod
     def from_buf(cls, buf: Buffer) -> 'MicPacket':
-        data_len = buf.unpack_varint()
-        data = buf.read(data_len)
-        (sequence, whispering) = buf.unpack("q?")
+        data = codec.unpack_bytes(buf)
+        (sequence, whispering) = codec.unpack_from(SEQUENCE_WHISPERING, buf)
 
         return cls(
             data=data,
@@ -31,14 +41,14 @@ class MicPacket(EncodableVoicePacket, DecodableVoicePacket):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class SoundPacket:
     sender: uuid.UUID
     data: bytes
     sequence: int
 
 
-@dataclass
+@dataclass(slots=True)
 class PlayerSoundPacket(SoundPacket, DecodableVoicePacket):
     ID = 0x02
 
@@ -46,10 +56,9 @@ class PlayerSoundPacket(SoundPacket, DecodableVoicePacket):
 
     @classmethod
     def from_buf(cls, buf: Buffer) -> 'PlayerSoundPacket':
-        sender = buf.unpack_uuid()
-        data_len = buf.unpack_varint()
-        data = buf.read(data_len)
-        (sequence, whispering) = buf.unpack("q?")
+        sender = codec.unpack_uuid(buf)
+        data = codec.unpack_bytes(buf)
+        (sequence, whispering) = codec.unpack_from(SEQUENCE_WHISPERING, buf)
 
         return cls(
             sender=sender,
@@ -59,16 +68,15 @@ class PlayerSoundPacket(SoundPacket, DecodableVoicePacket):
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class GroupSoundPacket(SoundPacket, DecodableVoicePacket):
     ID = 0x03
 
     @classmethod
     def from_buf(cls, buf: Buffer) -> 'GroupSoundPacket':
-        sender = buf.unpack_uuid()
-        data_len = buf.unpack_varint()
-        data = buf.read(data_len)
-        sequence = buf.unpack("q")
+        sender = codec.unpack_uuid(buf)
+        data = codec.unpack_bytes(buf)
+        (sequence,) = codec.unpack_from(SEQUENCE, buf)
 
         return cls(
             sender=sender,
@@ -86,7 +94,7 @@ class Location(NamedTuple):
         return f"({self.x}, {self.y}, {self.z})"
 
 
-@dataclass
+@dataclass(slots=True)
 class LocationSoundPacket(SoundPacket, DecodableVoicePacket):
     ID = 0x04
 
@@ -94,21 +102,20 @@ class LocationSoundPacket(SoundPacket, DecodableVoicePacket):
 
     @classmethod
     def from_buf(cls, buf: Buffer) -> 'LocationSoundPacket':
-        sender = buf.unpack_uuid()
-        location = Location(*buf.unpack("ddd"))
-        data_len = buf.unpack_varint()
-        data = buf.read(data_len)
-        sequence = buf.unpack("q")
+        (sender, x, y, z) = codec.unpack_from(UUID_LOCATION, buf)
+        location = Location(x, y, z)
+        data = codec.unpack_bytes(buf)
+        (sequence,) = codec.unpack_from(SEQUENCE, buf)
 
         return cls(
-            sender=sender,
+            sender=codec.uuid_from_bytes(sender),
             location=location,
             data=data,
             sequence=sequence,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class AuthenticatePacket(EncodableVoicePacket, DecodableVoicePacket):
     ID = 0x05
 
@@ -116,21 +123,19 @@ class AuthenticatePacket(EncodableVoicePacket, DecodableVoicePacket):
     secret: uuid.UUID
 
     def to_buf(self) -> bytes:
-        return Buffer.pack_uuid(self.player_uuid) + \
-               Buffer.pack_uuid(self.secret)
+        return UUID_PAIR.pack(self.player_uuid.bytes, self.secret.bytes)
 
     @classmethod
     def from_buf(cls, buf: Buffer) -> 'AuthenticatePacket':
-        player_uuid = buf.unpack_uuid()
-        secret = buf.unpack_uuid()
+        (player_uuid, secret) = codec.unpack_from(UUID_PAIR, buf)
 
         return cls(
-            player_uuid=player_uuid,
-            secret=secret
+            player_uuid=codec.uuid_from_bytes(player_uuid),
+            secret=codec.uuid_from_bytes(secret)
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class AuthenticateAckPacket(DecodableVoicePacket):
     ID = 0x06
 
@@ -139,7 +144,7 @@ class AuthenticateAckPacket(DecodableVoicePacket):
         return cls()
 
 
-@dataclass
+@dataclass(slots=True)
 class PingPacket(EncodableVoicePacket, DecodableVoicePacket):
     ID = 0x07
 
@@ -147,20 +152,19 @@ class PingPacket(EncodableVoicePacket, DecodableVoicePacket):
     timestamp: int
 
     def to_buf(self) -> bytes:
-        return Buffer.pack_uuid(self.id) + Buffer.pack("q", self.timestamp)
+        return UUID_TIMESTAMP.pack(self.id.bytes, self.timestamp)
 
     @classmethod
     def from_buf(cls, buf: Buffer) -> 'PingPacket':
-        ping_id = buf.unpack_uuid()
-        timestamp = buf.unpack("q")
+        (ping_id, timestamp) = codec.unpack_from(UUID_TIMESTAMP, buf)
 
         return cls(
-            id=ping_id,
+            id=codec.uuid_from_bytes(ping_id),
             timestamp=timestamp
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class KeepAlivePacket(EncodableVoicePacket):
     ID = 0x08
 
@@ -0,0 +1,405 @@
+import ctypes
+import logging
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from twisted.internet import defer
+from twisted.internet.protocol import DatagramProtocol
+
+from bridge.voice.encoding import MAX_DATAGRAM_SIZE
+
+DEFAULT_BATCH = 64
+DEFAULT_RCVBUF = 1024 * 1024
+DEFAULT_SNDBUF = 256 * 1024
+
+# How often the thread checks whether it should stop, in seconds
+POLL_TIMEOUT = 0.5
+
+# Linux only: the kernel reports the number of datagrams dropped because the receive buffer was full
+SO_RXQ_OVFL = 40
+# cmsghdr followed by the 32-bit drop counter
+_OVERFLOW_CMSG = struct.Struct("@NiiI")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SocketOptions:
+    rcvbuf: int = DEFAULT_RCVBUF
+    sndbuf: int = DEFAULT_SNDBUF
+    # Max. datagrams received or sent per syscall
+    batch: int = DEFAULT_BATCH
+
+
+@dataclass
+class UdpStats:
+    received: int = 0
+    receive_syscalls: int = 0
+    # Receive batches that came back full, i.e. more datagrams were waiting
+    full_batches: int = 0
+    sent: int = 0
+    send_syscalls: int = 0
+    # Datagrams dropped because the send buffer was full
+    send_drops: int = 0
+    # Datagrams the kernel dropped because the receive buffer was full
+    receive_overflows: int = 0
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_mmsg() -> tuple | None:
+    """
+    recvmmsg & sendmmsg from libc, None where they don't exist
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg, sendmmsg = libc.recvmmsg, libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return recvmmsg, sendmmsg
+
+
+_mmsg = _load_mmsg()
+
+
+class _MMsgIO:
+    """
+    Receives & sends up to a batch of datagrams per syscall, reusing the same message headers
+    """
+    _fd: int
+    _batch: int
+
+    def __init__(self, sock: socket.socket, batch: int):
+        self._fd = sock.fileno()
+        self._batch = batch
+        self._recvmmsg, self._sendmmsg = _mmsg
+
+        self._buffers = (ctypes.c_char * MAX_DATAGRAM_SIZE * batch)()
+        self._controls = (ctypes.c_char * _OVERFLOW_CMSG.size * batch)()
+        self._receive_iovecs = (_IoVec * batch)()
+        self._receive_msgs = (_MMsgHdr * batch)()
+        for i in range(batch):
+            self._receive_iovecs[i].iov_base = ctypes.addressof(self._buffers[i])
+            self._receive_iovecs[i].iov_len = MAX_DATAGRAM_SIZE
+            self._receive_msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._receive_iovecs[i])
+            self._receive_msgs[i].msg_hdr.msg_iovlen = 1
+            self._receive_msgs[i].msg_hdr.msg_control = ctypes.addressof(self._controls[i])
+
+        self._send_iovecs = (_IoVec * batch)()
+        self._send_msgs = (_MMsgHdr * batch)()
+        for i in range(batch):
+            self._send_msgs[i].msg_hdr.msg_iov = ctypes.pointer(self._send_iovecs[i])
+            self._send_msgs[i].msg_hdr.msg_iovlen = 1
+
+    def receive(self) -> tuple[list[bytes], int | None]:
+        """
+        :return: received datagrams & the kernel's overflow counter, if it was reported
+        """
+        msgs = self._receive_msgs
+        for i in range(self._batch):
+            msgs[i].msg_hdr.msg_controllen = _OVERFLOW_CMSG.size
+
+        count = self._recvmmsg(self._fd, msgs, self._batch, socket.MSG_DONTWAIT, None)
+        if count < 0:
+            _raise_errno()
+
+        datagrams = [ctypes.string_at(self._buffers[i], msgs[i].msg_len) for i in range(count)]
+
+        overflows = None
+        if count and msgs[count - 1].msg_hdr.msg_controllen >= _OVERFLOW_CMSG.size:
+            _, level, kind, dropped = _OVERFLOW_CMSG.unpack_from(self._controls[count - 1])
+            if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL:
+                overflows = dropped
+        return datagrams, overflows
+
+    def send(self, datagrams: list[bytes]) -> int:
+        """
+        :return: number of datagrams sent, fewer than given if the send buffer is full
+        """
+        count = min(len(datagrams), self._batch)
+        for i in range(count):
+            # The datagrams outlive the call, so their buffers can be pointed to directly
+            self._send_iovecs[i].iov_base = ctypes.cast(ctypes.c_char_p(datagrams[i]), ctypes.c_void_p)
+            self._send_iovecs[i].iov_len = len(datagrams[i])
+
+        sent = self._sendmmsg(self._fd, self._send_msgs, count, 0)
+        if sent < 0:
+            _raise_errno()
+        return sent
+
+
+class _SocketIO:
+    """
+    Fallback without recvmmsg & sendmmsg, one syscall per datagram
+    """
+    _socket: socket.socket
+    _batch: int
+
+    def __init__(self, sock: socket.socket, batch: int):
+        self._socket = sock
+        self._batch = batch
+
+    def receive(self) -> tuple[list[bytes], int | None]:
+        datagrams = []
+        try:
+            while len(datagrams) < self._batch:
+                datagrams.append(self._socket.recv(MAX_DATAGRAM_SIZE))
+        except BlockingIOError:
+            if not datagrams:
+                raise
+        return datagrams, None
+
+    def send(self, datagrams: list[bytes]) -> int:
+        sent = 0
+        for datagram in datagrams[:self._batch]:
+            try:
+                self._socket.send(datagram)
+            except BlockingIOError:
+                if not sent:
+                    raise
+                break
+            sent += 1
+        return sent
+
+
+def _raise_errno():
+    # OSError picks the matching subclass, e.g. BlockingIOError for EAGAIN
+    code = ctypes.get_errno()
+    raise OSError(code, os.strerror(code))
+
+
+class VoiceSocketThread(threading.Thread):
+    """
+    Runs the UDP socket of a voice connection on its own thread, instead of on the reactor.
+    Received datagrams are drained in batches & handed to the protocol right on this thread,
+    written datagrams are queued & sent in batches.
+
+    Acts as the transport of the protocol, which must therefore only hop over to the
+    reactor for things that aren't thread-safe.
+    """
+    protocol: DatagramProtocol
+    options: SocketOptions
+    stats: UdpStats
+
+    _socket: socket.socket
+    _io: _MMsgIO | _SocketIO
+    _peer: tuple | None
+
+    _lock: threading.Lock
+    _pending: list[bytes]
+    _wake_r: socket.socket
+    _wake_w: socket.socket
+
+    _started_at: float
+    _end_thread: threading.Event
+
+    def __init__(self, protocol: DatagramProtocol, options: SocketOptions | None = None):
+        super().__init__(name="VoiceSocketThread", daemon=True)
+        self.protocol = protocol
+        self.options = options if options is not None else SocketOptions()
+        self.stats = UdpStats()
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("", 0))
+        self._socket.setblocking(False)
+        self._set_buffer_size(socket.SO_RCVBUF, self.options.rcvbuf)
+        self._set_buffer_size(socket.SO_SNDBUF, self.options.sndbuf)
+
+        self._io = _SocketIO(self._socket, self.options.batch)
+        if _mmsg is not None:
+            self._socket.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            self._io = _MMsgIO(self._socket, self.options.batch)
+        self._peer = None
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+        self._started_at = time.monotonic()
+        self._end_thread = threading.Event()
+
+    def _set_buffer_size(self, option: int, size: int):
+        self._socket.setsockopt(socket.SOL_SOCKET, option, size)
+        # Linux doubles the requested size for bookkeeping & caps it at net.core.[rw]mem_max
+        actual = self._socket.getsockopt(socket.SOL_SOCKET, option)
+        if actual < size:
+            logger.warning(f"Voice socket buffer is {actual} bytes instead of {size}, "
+                           f"raise net.core.{'r' if option == socket.SO_RCVBUF else 'w'}mem_max to allow more")
+
+    def listen(self):
+        """
+        Starts the protocol & the thread, has to be called on the reactor thread
+        """
+        self.protocol.makeConnection(self)
+        self.start()
+
+    # Transport interface used by the protocol
+
+    def connect(self, host: str, port: int):
+        self._socket.connect((host, port))
+        self._peer = (host, port)
+
+    def write(self, datagram: bytes, addr: tuple | None = None):
+        """
+        Queues a datagram for sending to the connected peer, can be called from any thread
+        """
+        with self._lock:
+            self._pending.append(bytes(datagram))
+            if len(self._pending) > 1:
+                # Thread was already woken up
+                return
+
+        if threading.current_thread() is not self:
+            try:
+                self._wake_w.send(b"\x00")
+            except BlockingIOError:
+                # Wakeup already pending
+                pass
+
+    def getHost(self):
+        host, port = self._socket.getsockname()
+        return host, port
+
+    def stopListening(self) -> defer.Deferred:
+        self.stop()
+        return defer.succeed(None)
+
+    def run(self) -> None:
+        selector = selectors.DefaultSelector()
+        selector.register(self._socket, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+
+        while not self._end_thread.is_set():
+            for key, _ in selector.select(POLL_TIMEOUT):
+                if key.fileobj is self._socket:
+                    self._receive_all()
+                else:
+                    self._drain_wakeups()
+
+            # Sends everything written meanwhile, including replies to what was just received
+            self._send_all()
+
+        selector.close()
+
+    def _receive_all(self):
+        stats = self.stats
+        while True:
+            try:
+                datagrams, overflows = self._io.receive()
+            except BlockingIOError:
+                stats.receive_syscalls += 1
+                return
+            except OSError as e:
+                # E.g. ICMP port unreachable while the server restarts
+                stats.receive_syscalls += 1
+                logger.debug(f"Receiving voice datagrams failed: {e}")
+                return
+
+            stats.receive_syscalls += 1
+            stats.received += len(datagrams)
+            if overflows is not None:
+                stats.receive_overflows = overflows
+
+            for datagram in datagrams:
+                try:
+                    self.protocol.datagramReceived(datagram, self._peer)
+                except Exception:
+                    logger.exception("Handling voice datagram failed")
+
+            if len(datagrams) < self.options.batch:
+                # Socket is drained, saves the syscall that would only return EAGAIN
+                return
+            stats.full_batches += 1
+
+    def _send_all(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = []
+
+        stats = self.stats
+        while pending:
+            stats.send_syscalls += 1
+            try:
+                sent = self._io.send(pending)
+            except BlockingIOError:
+                stats.send_drops += len(pending)
+                return
+            except OSError as e:
+                stats.send_drops += len(pending)
+                logger.debug(f"Sending voice datagrams failed: {e}")
+                return
+            stats.sent += sent
+            pending = pending[sent:]
+
+    def _drain_wakeups(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def summary(self) -> dict[str, float]:
+        stats = self.stats
+        uptime = time.monotonic() - self._started_at
+        return {
+            'received': stats.received,
+            'received_per_second': stats.received / uptime if uptime > 0 else 0.0,
+            'receive_syscalls_per_packet': stats.receive_syscalls / stats.received if stats.received else 0.0,
+            'full_batches': stats.full_batches,
+            'receive_overflows': stats.receive_overflows,
+            'sent': stats.sent,
+            'send_syscalls_per_packet': stats.send_syscalls / stats.sent if stats.sent else 0.0,
+            'send_drops': stats.send_drops,
+        }
+
+    def stop(self):
+        self._end_thread.set()
+        if self.is_alive():
+            try:
+                self._wake_w.send(b"\x00")
+            except BlockingIOError:
+                pass
+            super().join()
+
+        if self.protocol.transport is self:
+            self.protocol.doStop()
+            self.protocol.transport = None
+
+        self._socket.close()
+        self._wake_r.close()
+        self._wake_w.close()
@@ -0,0 +1,4 @@
+import bridge
+
+# The bridge's modules & quarry import the reactor, install the bridge's before they do
+bridge.install_reactor()
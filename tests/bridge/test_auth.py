@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+import requests
+from minecraft_launcher_lib.exceptions import InvalidRefreshToken
+
+from bridge.minecraft import auth
+from bridge.minecraft.auth import (AuthDetails, AuthEndpoints, AuthHttpError, AuthRefreshThread, MicrosoftAuthChain,
+                                   RequestsHttpClient, refresh_auth)
+
+ENDPOINTS = AuthEndpoints()
+
+
+class FakeHttp:
+    """
+    Answers the token chain like the real endpoints would, recording the URLs requested
+    """
+
+    def __init__(self, refresh_error: AuthHttpError | None = None):
+        self.requests = []
+        self.refresh_error = refresh_error
+        self.responses = {
+            ENDPOINTS.refresh_token: {'access_token': "ms-token", 'refresh_token': "new-refresh-token"},
+            ENDPOINTS.xbl: {'Token': "xbl-token", 'DisplayClaims': {'xui': [{'uhs': "user-hash"}]}},
+            ENDPOINTS.xsts: {'Token': "xsts-token"},
+            ENDPOINTS.minecraft: {'access_token': "new-access-token", 'expires_in': 86400},
+            ENDPOINTS.profile: {'id': "player-id", 'name': "player"},
+        }
+
+    def _respond(self, url: str):
+        self.requests.append(url)
+        if url == ENDPOINTS.refresh_token and self.refresh_error is not None:
+            raise self.refresh_error
+        return self.responses[url]
+
+    def post_form(self, url, data):
+        return self._respond(url)
+
+    def post_json(self, url, data):
+        return self._respond(url)
+
+    def get_json(self, url, bearer_token):
+        assert bearer_token == "new-access-token"
+        return self._respond(url)
+
+
+def _details(expires_in: float) -> AuthDetails:
+    return AuthDetails({
+        'id': "player-id",
+        'name': "player",
+        'refresh_token': "refresh-token",
+        'access_token': "access-token",
+        'expires_at': time.time() + expires_in,
+    })
+
+
+def _auth_file(tmp_path, details: AuthDetails) -> str:
+    file_name = str(tmp_path / "auth.json")
+    with open(file_name, "w", encoding="utf-8") as f:
+        json.dump(details.to_dict(), f)
+    return file_name
+
+
+def _response(status: int, content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.url = "https://example.com/token"
+    response._content = content
+    return response
+
+
+def test_valid_cached_token_is_reused(tmp_path):
+    file_name = _auth_file(tmp_path, _details(expires_in=24 * 60 * 60))
+    http = FakeHttp()
+
+    details = refresh_auth("client", MicrosoftAuthChain(http), file_name=file_name)
+
+    assert details.access_token == "access-token"
+    assert http.requests == []
+
+
+def test_expiring_token_is_refreshed_and_saved(tmp_path):
+    file_name = _auth_file(tmp_path, _details(expires_in=auth.REFRESH_MARGIN - 60))
+    http = FakeHttp()
+
+    details = refresh_auth("client", MicrosoftAuthChain(http), file_name=file_name)
+
+    assert details.access_token == "new-access-token"
+    assert details.is_access_token_valid()
+    assert http.requests == [ENDPOINTS.refresh_token, ENDPOINTS.xbl, ENDPOINTS.xsts, ENDPOINTS.minecraft,
+                             ENDPOINTS.profile]
+    saved = auth._load_auth_details(file_name)
+    assert (saved.access_token, saved.refresh_token) == ("new-access-token", "new-refresh-token")
+
+
+def test_failed_save_keeps_the_old_file(tmp_path):
+    old = _details(expires_in=60)
+    file_name = _auth_file(tmp_path, old)
+    broken = _details(expires_in=60)
+    # Fails halfway through writing the JSON
+    broken.name = object()
+
+    with pytest.raises(TypeError):
+        auth._save_auth_details(broken, file_name)
+
+    assert os.listdir(tmp_path) == ["auth.json"]
+    assert auth._load_auth_details(file_name).to_dict() == old.to_dict()
+
+
+def test_http_errors_are_raised():
+    with pytest.raises(AuthHttpError) as error:
+        RequestsHttpClient._json(_response(503, b"<html>unavailable</html>"))
+    assert error.value.status == 503
+    assert error.value.body is None
+
+    with pytest.raises(AuthHttpError, match="invalid_grant") as error:
+        RequestsHttpClient._json(_response(400, b'{"error": "invalid_grant"}'))
+    assert error.value.body == {'error': "invalid_grant"}
+
+    assert RequestsHttpClient._json(_response(200, b'{"Token": "t"}')) == {'Token': "t"}
+
+
+def test_rejected_refresh_token_is_invalid():
+    chain = MicrosoftAuthChain(FakeHttp(AuthHttpError(ENDPOINTS.refresh_token, 400, {'error': "invalid_grant"})))
+
+    with pytest.raises(InvalidRefreshToken):
+        chain.refresh("client", "refresh-token")
+
+
+def test_server_errors_are_not_an_invalid_refresh_token():
+    chain = MicrosoftAuthChain(FakeHttp(AuthHttpError(ENDPOINTS.refresh_token, 503)))
+
+    with pytest.raises(AuthHttpError):
+        chain.refresh("client", "refresh-token")
+
+
+def test_refresh_thread_refreshes_on_expiry(tmp_path):
+    details = _details(expires_in=0)
+    file_name = _auth_file(tmp_path, details)
+    refreshed = []
+    done = threading.Event()
+
+    def on_refreshed(new_details: AuthDetails):
+        refreshed.append(new_details.access_token)
+        done.set()
+
+    thread = AuthRefreshThread("client", details, on_refreshed, MicrosoftAuthChain(FakeHttp()), file_name)
+    thread.start()
+    try:
+        assert done.wait(5)
+    finally:
+        thread.stop()
+
+    assert refreshed == ["new-access-token"]
+    assert not thread.is_alive()
+
+
+def test_refresh_thread_stops_while_waiting(tmp_path):
+    details = _details(expires_in=24 * 60 * 60)
+    http = FakeHttp()
+    thread = AuthRefreshThread("client", details, lambda _: None, MicrosoftAuthChain(http),
+                               _auth_file(tmp_path, details))
+    thread.start()
+
+    started = time.monotonic()
+    thread.stop()
+
+    assert time.monotonic() - started < auth.STOP_TIMEOUT
+    assert not thread.is_alive()
+    assert http.requests == []
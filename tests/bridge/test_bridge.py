@@ -0,0 +1,152 @@
+import collections
+import time
+from types import SimpleNamespace
+
+from quarry.types.uuid import UUID
+
+from bridge import audio
+from bridge.app import DiscordMinecraftBridge, _latency_budget
+from bridge.audio.ogg import packet_samples
+from bridge.audio.opus import EncodingApplication, OpusEncoder
+from bridge.audio.process import LOW_DELAY_PENDING_FRAMES, AudioProcessThread
+from bridge.loopback import LoopbackEndpoint
+from bridge.minecraft.packets import PlayerState
+from bridge.util.encodable import Buffer
+from bridge.util.handoff import ReactorOutbox
+from bridge.util.trace import DISCORD_TO_MINECRAFT, MINECRAFT_TO_DISCORD
+from bridge.voice.client import VoiceConnection
+from bridge.voice.encoding import encode_voice_packet
+from bridge.voice.packets import GroupSoundPacket
+
+SAMPLES_PER_FRAME = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+# Stages a frame goes through after being received, in order
+PROCESS_STAGES = ["enqueue", "queue", "tick", "decode", "mix", "encode", "handoff", "send"]
+
+
+class FakeReactor:
+    def __init__(self):
+        self.scheduled = []
+
+    def call_from_thread(self, f):
+        self.scheduled.append(f)
+
+    def run(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for f in scheduled:
+            f()
+
+
+def _bridge(reactor: FakeReactor, **kwargs) -> DiscordMinecraftBridge:
+    return DiscordMinecraftBridge("localhost", 25565, None, endpoint=LoopbackEndpoint([]),
+                                  outbox=ReactorOutbox(reactor.call_from_thread), **kwargs)
+
+
+def _opus(channels: int) -> bytes:
+    encoder = OpusEncoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, channels, EncodingApplication.VOICE)
+    return encoder.encode(bytes(SAMPLES_PER_FRAME * channels * 2))
+
+
+def _tick(process: AudioProcessThread):
+    """
+    Runs one tick of a process without its thread
+    """
+    while process._receive(0):
+        pass
+    process._tick()
+
+
+def _traced_stages(bridge: DiscordMinecraftBridge, direction: str) -> list[list[str]]:
+    return [[stage for stage, _ in trace.marks] for trace in bridge.tracer._recent if trace.direction == direction]
+
+
+def test_every_stage_of_a_sampled_minecraft_frame_is_traced():
+    reactor = FakeReactor()
+    bridge = _bridge(reactor, trace_sample_rate=1)
+    server, secret, sender = ("127.0.0.1", 24454), UUID.random(), UUID.random()
+    connection = VoiceConnection(server[0], server[1], UUID.random(), secret, lambda: None,
+                                 lambda packet, trace: bridge._on_minecraft_audio(packet.sender, packet.data, None,
+                                                                                 packet.sequence, trace),
+                                 tracer=bridge.tracer)
+    connection.server = server
+    data = _opus(audio.MINECRAFT_CHANNELS)
+    payload = Buffer.pack_uuid(sender) + Buffer.pack_varint(len(data)) + data + Buffer.pack("q", 1)
+
+    connection.datagramReceived(encode_voice_packet(GroupSoundPacket.ID, payload, secret), server)
+    _tick(bridge.minecraft_process)
+    reactor.run()
+
+    assert _traced_stages(bridge, MINECRAFT_TO_DISCORD) == [["receive", "decrypt"] + PROCESS_STAGES]
+    marks = bridge.tracer._recent[0].marks
+    assert [at for _, at in marks] == sorted(at for _, at in marks)
+    assert bridge.tracer.summary(MINECRAFT_TO_DISCORD)['traces'] == 1
+
+
+def test_every_stage_of_a_sampled_discord_frame_is_traced():
+    reactor = FakeReactor()
+    bridge = _bridge(reactor, trace_sample_rate=1)
+    sent = []
+    bridge.minecraft.send_voice_data = sent.append
+
+    bridge._on_discord_audio(_opus(audio.DISCORD_CHANNELS), 1234, 1)
+    _tick(bridge.discord_process)
+    reactor.run()
+
+    assert len(sent) == 1
+    assert _traced_stages(bridge, DISCORD_TO_MINECRAFT) == [["receive"] + PROCESS_STAGES]
+
+
+def test_frames_expiring_in_the_handoff_are_dropped():
+    reactor = FakeReactor()
+    bridge = _bridge(reactor, minecraft_latency_budget=0.05)
+
+    bridge._on_processed_minecraft_audio(b"\xfc\xff\xfe", time.monotonic())
+    bridge._on_processed_minecraft_audio(b"\xfc\xff\xfe", time.monotonic() - 0.04)
+    # Both were fresh when they were encoded, the second one goes stale waiting for the reactor
+    time.sleep(0.02)
+    reactor.run()
+
+    assert bridge.endpoint.stats()['frames_received'] == 1
+    assert bridge.minecraft_process.stats.expired_before_send == 1
+
+
+def test_filtered_packets_are_reported_by_player_name():
+    bridge = _bridge(FakeReactor())
+    known, unknown = UUID.random(), UUID.random()
+    bridge.minecraft.player_states.update(PlayerState(uuid=known, name="alice", disabled=True, disconnected=False,
+                                                      group=None))
+    filtered_senders = collections.Counter({known.bytes: 3, unknown.bytes: 1})
+    bridge.minecraft.client = SimpleNamespace(voice=SimpleNamespace(filtered_senders=filtered_senders))
+
+    assert bridge._filtered_player_stats() == {"alice": 3, str(unknown): 1}
+
+
+def test_low_delay_budget():
+    assert _latency_budget(None, True) == audio.LOW_DELAY_LATENCY_BUDGET == 0.08
+    assert _latency_budget(None, False) == audio.LATENCY_BUDGET
+    assert _latency_budget(50, True) == 0.05
+    assert _latency_budget(0, True) is None
+
+
+def test_low_delay_sends_10ms_low_delay_frames_to_discord():
+    reactor = FakeReactor()
+    bridge = _bridge(reactor, low_delay=True, passthrough=True, minecraft_latency_budget=_latency_budget(None, True))
+    process = bridge.minecraft_process
+    sent = []
+    bridge.endpoint.send = sent.append
+
+    assert process._frame_seconds == audio.LOW_DELAY_FRAME_LENGTH / 1000
+    assert process._max_pending_frames == LOW_DELAY_PENDING_FRAMES
+    assert process._latency_budget == 0.08
+    assert process._encoder.encoder.application == EncodingApplication.LOW_DELAY.value
+    assert bridge.discord_process._encoder.encoder.application == EncodingApplication.LOW_DELAY.value
+
+    # A 20ms voice chat packet is spread over two ticks
+    bridge._on_minecraft_audio(UUID.random(), _opus(audio.MINECRAFT_CHANNELS), None, 1)
+    for _ in range(2):
+        _tick(process)
+    reactor.run()
+
+    assert len(sent) == 2
+    assert all(packet_samples(frame) == audio.SAMPLE_RATE // 1000 * audio.LOW_DELAY_FRAME_LENGTH for frame in sent)
+    # Never forwarded as is, its frames are too long
+    assert process.stats.passthrough_frames == 0
@@ -0,0 +1,119 @@
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from bridge import audio
+from bridge.audio.clips import Clip, ClipCache, _write_clip
+from bridge.audio.ogg import packet_samples
+
+
+def _write_wav(path, seconds: float, channels: int = 1, amplitude: int = 8000):
+    t = np.arange(int(audio.SAMPLE_RATE * seconds)) / audio.SAMPLE_RATE
+    samples = (np.sin(2 * np.pi * 440 * t) * amplitude).astype(np.int16)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(audio.SAMPLE_RATE)
+        f.writeframes(np.repeat(samples, channels).tobytes())
+
+
+def test_clip_round_trip(tmp_path):
+    frames = [b"\x01", b"", bytes(range(256)) * 3, b"\xf8\xff\xfe"]
+    _write_clip(str(tmp_path / "a.clip"), frames)
+
+    clip = Clip("a", str(tmp_path / "a.clip"))
+    try:
+        assert len(clip) == len(frames)
+        assert clip[2] == frames[2]
+        assert list(clip) == frames
+    finally:
+        clip.close()
+
+
+def test_empty_clip(tmp_path):
+    _write_clip(str(tmp_path / "a.clip"), [])
+
+    clip = Clip("a", str(tmp_path / "a.clip"))
+    assert list(clip) == []
+    clip.close()
+
+
+def test_not_a_clip(tmp_path):
+    (tmp_path / "a.clip").write_bytes(b"RIFF" + bytes(20))
+
+    with pytest.raises(ValueError, match="not a clip"):
+        Clip("a", str(tmp_path / "a.clip"))
+
+
+@pytest.mark.parametrize("channels, frame_length", [(1, 20), (2, 20), (2, 10)])
+def test_cache_encodes_whole_frames(tmp_path, channels: int, frame_length: int):
+    _write_wav(tmp_path / "join.wav", 0.105)
+
+    clip = ClipCache(str(tmp_path / "cache")).load(str(tmp_path / "join.wav"), channels, frame_length)
+
+    assert clip.name == "join"
+    # The last frame is padded with silence
+    assert len(clip) == -(-105 // frame_length)
+    assert all(packet_samples(frame) == audio.SAMPLE_RATE // 1000 * frame_length for frame in clip)
+    # Stereo flag of the TOC byte
+    assert all(bool(frame[0] & 0x04) == (channels == 2) for frame in clip)
+    clip.close()
+
+
+def test_cache_is_reused_per_channel_count(tmp_path):
+    _write_wav(tmp_path / "join.wav", 0.1)
+    cache = ClipCache(str(tmp_path / "cache"))
+
+    mono = cache.load(str(tmp_path / "join.wav"), 1)
+    again = cache.load(str(tmp_path / "join.wav"), 1)
+    stereo = cache.load(str(tmp_path / "join.wav"), 2)
+
+    assert again is mono
+    assert list(stereo) != list(mono)
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    cache.close()
+
+
+def test_files_are_only_hashed_again_once_changed(tmp_path):
+    wav = tmp_path / "join.wav"
+    _write_wav(wav, 0.1)
+    cache = ClipCache(str(tmp_path / "cache"))
+    first = list(cache.load(str(wav), 1))
+    stat = os.stat(wav)
+
+    # Same size & modification time, so the content isn't read again
+    _write_wav(wav, 0.1, amplitude=2000)
+    os.utime(wav, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert list(cache.load(str(wav), 1)) == first
+
+    os.utime(wav, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert list(cache.load(str(wav), 1)) != first
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    cache.close()
+
+
+def test_close_unmaps_clips(tmp_path):
+    _write_wav(tmp_path / "join.wav", 0.1)
+    cache = ClipCache(str(tmp_path / "cache"))
+    clip = cache.load(str(tmp_path / "join.wav"), 1)
+
+    cache.close()
+
+    with pytest.raises(ValueError):
+        clip[0]
+    # Loading again maps it again
+    assert len(list(cache.load(str(tmp_path / "join.wav"), 1))) == len(clip)
+    cache.close()
+
+
+def test_cache_rejects_other_sample_rates(tmp_path):
+    with wave.open(str(tmp_path / "join.wav"), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(bytes(4410 * 2))
+
+    with pytest.raises(ValueError, match="48kHz"):
+        ClipCache(str(tmp_path / "cache")).load(str(tmp_path / "join.wav"), 1)
@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+from discord import VoiceClient
+
+from bridge.discord_bot import VoiceFanout
+
+FRAME = b"\xfc\xff\xfe"
+
+
+class FakeVoiceClient(VoiceClient):
+    def __init__(self, channel_id: int, fail: bool = False):
+        # Nothing of the real client is set up, only what the fanout uses
+        self.channel = SimpleNamespace(id=channel_id)
+        self.connected = True
+        self.fail = fail
+        self.sent = []
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def send_audio_packet(self, data: bytes, *, encode: bool = True):
+        assert not encode
+        if self.fail:
+            raise OSError("socket closed")
+        self.sent.append(data)
+
+
+def _fanout(*voice_clients: FakeVoiceClient) -> VoiceFanout:
+    return VoiceFanout(SimpleNamespace(voice_clients=list(voice_clients)))
+
+
+def test_frames_go_to_every_connection():
+    first, second = FakeVoiceClient(1), FakeVoiceClient(2)
+    fanout = _fanout(first, second)
+
+    fanout.send(FRAME)
+    fanout.send(FRAME)
+
+    assert first.sent == second.sent == [FRAME, FRAME]
+    assert fanout.stats.frames == 2
+    assert fanout.stats.sends == 4
+    assert fanout.stats.max_subscribers == 2
+
+
+def test_disconnected_clients_are_left_out():
+    first, second = FakeVoiceClient(1), FakeVoiceClient(2)
+    fanout = _fanout(first, second)
+
+    fanout.send(FRAME)
+    second.connected = False
+    fanout.send(FRAME)
+    # pycord drops the client from the bot after disconnecting
+    fanout.bot.voice_clients.remove(second)
+    fanout.send(FRAME)
+
+    assert len(first.sent) == 3
+    assert len(second.sent) == 1
+    assert fanout.stats.sends == 4
+
+
+def test_failing_connection_does_not_affect_the_others(caplog):
+    first, failing, last = FakeVoiceClient(1), FakeVoiceClient(2, fail=True), FakeVoiceClient(3)
+    fanout = _fanout(first, failing, last)
+
+    for _ in range(3):
+        fanout.send(FRAME)
+
+    assert first.sent == last.sent == [FRAME] * 3
+    assert fanout.stats.send_failures == 3
+    assert fanout.stats.sends == 6
+    # Logged once until it recovers
+    assert len(caplog.records) == 1
+
+    failing.fail = False
+    fanout.send(FRAME)
+    failing.fail = True
+    fanout.send(FRAME)
+    assert len(caplog.records) == 2
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+import pytest
+
+from bridge.audio.dsp import AutomaticGainControl, DspChain, Gain, NoiseGate, SoftLimiter, db_to_gain
+
+
+def _frame(amplitude: float, samples: int = 960) -> np.ndarray:
+    return np.full(samples, amplitude, dtype=np.int16)
+
+
+def test_parse():
+    chain = DspChain.parse("gain:db=6, agc:target=-18:max_gain=12,gate,limiter")
+
+    assert [type(stage) for stage in chain.stages] == [Gain, AutomaticGainControl, NoiseGate, SoftLimiter]
+    assert chain.stages[0].gain == pytest.approx(db_to_gain(6))
+    assert chain.stages[1].target == pytest.approx(db_to_gain(-18))
+    assert chain.stages[1].max_gain == pytest.approx(db_to_gain(12))
+
+
+def test_parse_empty_spec_gives_an_empty_chain():
+    assert not DspChain.parse("")
+
+
+def test_parse_unknown_stage():
+    with pytest.raises(ValueError, match="unknown DSP stage 'reverb'"):
+        DspChain.parse("gain,reverb")
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("gain:volume=6", "DSP stage 'gain'.*volume"),
+    ("gate:threshold=loud", "'threshold' of DSP stage 'gate'"),
+    ("agc:target", "'target' of DSP stage 'agc'"),
+    ("gain:db=1e10", "DSP stage 'gain'"),
+])
+def test_parse_invalid_parameters(spec: str, message: str):
+    with pytest.raises(ValueError, match=message):
+        DspChain.parse(spec)
+
+
+def test_fused_gains_multiply():
+    chain = DspChain([Gain(20 * math.log10(2)), Gain(20 * math.log10(1.5))])
+
+    result = chain.process(_frame(1000))
+
+    assert np.all(result == 3000)
+
+
+def test_gain_change_is_ramped():
+    gain = Gain(0)
+    chain = DspChain([gain])
+    chain.process(_frame(1000))
+
+    gain.gain = 2.0
+    result = chain.process(_frame(1000))
+
+    # From the previous frame's gain to the new one, without a jump
+    assert result[0] == 1000
+    assert result[-1] == 2000
+    assert np.all(np.diff(result.astype(np.int32)) >= 0)
+    assert np.all(chain.process(_frame(1000)) == 2000)
+
+
+def test_output_is_clipped():
+    result = DspChain([Gain(12)]).process(_frame(20000))
+
+    assert np.all(result == np.iinfo(np.int16).max)
+
+
+def test_gate_closes_after_hold():
+    gate = NoiseGate(threshold=-40, hold=2, attenuation=-60)
+    loud, quiet = 0.1, 0.001
+
+    assert gate.frame_gain(loud) == 1.0
+    assert gate.frame_gain(quiet) == 1.0
+    assert gate.frame_gain(quiet) == 1.0
+    assert gate.frame_gain(quiet) == pytest.approx(db_to_gain(-60))
+    assert gate.frame_gain(loud) == 1.0
+
+
+def test_agc_moves_towards_target():
+    agc = AutomaticGainControl(target=-20, max_gain=20, attack=0.5, release=0.5)
+    quiet = db_to_gain(-30)
+
+    gains = [agc.frame_gain(quiet) for _ in range(20)]
+
+    assert all(a <= b for a, b in zip(gains, gains[1:]))
+    assert gains[-1] == pytest.approx(db_to_gain(10), rel=1e-3)
+
+
+def test_agc_keeps_gain_on_silence():
+    agc = AutomaticGainControl(floor=-55)
+    agc.gain = 2.0
+
+    assert agc.frame_gain(db_to_gain(-70)) == 2.0
+
+
+def test_limiter_compresses_peaks_only():
+    limiter = SoftLimiter(threshold=-6)
+    samples = np.array([1000, -1000, 30000, -32000, 40000], dtype=np.float32)
+
+    limiter.process(samples)
+
+    assert samples[0] == 1000 and samples[1] == -1000
+    knee = db_to_gain(-6) * 32768
+    assert knee < samples[2] < 30000
+    assert -32768 < samples[3] < -knee
+    assert samples[4] < 32768
+
+
+def test_shaping_can_be_skipped():
+    limiter = SoftLimiter(threshold=-6)
+    chain = DspChain([limiter])
+
+    chain.process(_frame(30000), shaping=False)
+    assert limiter.frames == 0
+
+    assert chain.process(_frame(30000))[0] < 30000
+    assert limiter.frames == 1
@@ -0,0 +1,75 @@
+import asyncio
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import bridge
+
+
+class NoWatcherLoop(asyncio.SelectorEventLoop):
+    """
+    Loop which can't watch sockets, like uvloop builds that break the reactor
+    """
+
+    def add_reader(self, fd, callback, *args):
+        raise NotImplementedError
+
+
+def _uvloop(monkeypatch, loop_class):
+    monkeypatch.setitem(sys.modules, "uvloop", SimpleNamespace(new_event_loop=loop_class))
+
+
+def test_auto_uses_a_working_uvloop(monkeypatch):
+    _uvloop(monkeypatch, asyncio.SelectorEventLoop)
+
+    loop, name = bridge._create_event_loop("auto")
+    loop.close()
+
+    assert name == "uvloop"
+
+
+def test_auto_falls_back_without_uvloop(monkeypatch):
+    # Makes importing it fail
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+
+    loop, name = bridge._create_event_loop("auto")
+    loop.close()
+
+    assert name == "asyncio"
+
+
+def test_auto_falls_back_if_uvloop_breaks_the_reactor(monkeypatch, caplog):
+    _uvloop(monkeypatch, NoWatcherLoop)
+
+    loop, name = bridge._create_event_loop("auto")
+    loop.close()
+
+    assert name == "asyncio"
+    assert not isinstance(loop, NoWatcherLoop)
+    assert "does not work with the Twisted asyncio reactor" in caplog.text
+
+
+def test_uvloop_is_required_if_asked_for(monkeypatch):
+    _uvloop(monkeypatch, NoWatcherLoop)
+    with pytest.raises(RuntimeError):
+        bridge._create_event_loop("uvloop")
+
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    with pytest.raises(ImportError):
+        bridge._create_event_loop("uvloop")
+
+
+def test_unknown_event_loop():
+    with pytest.raises(ValueError, match="unknown event loop 'trio'"):
+        bridge._create_event_loop("trio")
+
+
+def test_reactor_is_only_installed_once():
+    # By the conftest
+    installed = bridge.installed_event_loop()
+
+    assert bridge.install_reactor() == installed
+    assert bridge.install_reactor(installed) == installed
+    with pytest.raises(RuntimeError, match="already installed"):
+        bridge.install_reactor("uvloop" if installed == "asyncio" else "asyncio")
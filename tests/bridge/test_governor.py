@@ -0,0 +1,84 @@
+import pytest
+
+from bridge.audio import governor
+from bridge.audio.governor import LEVELS, QualityGovernor
+
+FRAME_LENGTH = 20
+FRAME_SECONDS = FRAME_LENGTH / 1000
+TICKS_PER_WINDOW = round(governor.WINDOW / FRAME_SECONDS)
+
+
+def _window(quality_governor: QualityGovernor, load: float, misses: int = 0):
+    """
+    Records a window of ticks at the given load
+    :return: the last quality change in the window, if any
+    """
+    change = None
+    for tick in range(TICKS_PER_WINDOW):
+        result = quality_governor.record(load * FRAME_SECONDS, tick < misses)
+        if result is not None:
+            change = result
+    return change
+
+
+def test_decides_once_per_window():
+    quality_governor = QualityGovernor("test", FRAME_LENGTH)
+
+    for _ in range(TICKS_PER_WINDOW - 1):
+        assert quality_governor.record(FRAME_SECONDS, True) is None
+    assert quality_governor.record(FRAME_SECONDS, True) == LEVELS[1]
+    assert quality_governor.load == pytest.approx(1.0)
+
+
+def test_steps_down_on_load_or_late_ticks():
+    quality_governor = QualityGovernor("test", FRAME_LENGTH)
+
+    assert _window(quality_governor, 0.9) == LEVELS[1]
+    assert _window(quality_governor, 0.1, misses=governor.MAX_MISSES + 1) == LEVELS[2]
+    assert _window(quality_governor, 0.1, misses=governor.MAX_MISSES) is None
+    assert quality_governor.level == 2
+
+
+def test_stops_at_the_lowest_level():
+    quality_governor = QualityGovernor("test", FRAME_LENGTH)
+
+    for _ in range(len(LEVELS) + 3):
+        _window(quality_governor, 1.5)
+
+    assert quality_governor.level == len(LEVELS) - 1
+    assert quality_governor.quality == LEVELS[-1]
+
+
+def test_steps_up_after_calm_windows():
+    quality_governor = QualityGovernor("test", FRAME_LENGTH)
+    _window(quality_governor, 0.9)
+    _window(quality_governor, 0.9)
+
+    for _ in range(governor.HOLD_WINDOWS - 1):
+        assert _window(quality_governor, 0.1) is None
+    assert _window(quality_governor, 0.1) == LEVELS[1]
+
+    # Load between the thresholds holds the level
+    for _ in range(governor.HOLD_WINDOWS * 2):
+        assert _window(quality_governor, 0.6) is None
+    assert quality_governor.level == 1
+
+
+def test_holds_longer_after_premature_step_up():
+    quality_governor = QualityGovernor("test", FRAME_LENGTH)
+    _window(quality_governor, 0.9)
+    for _ in range(governor.HOLD_WINDOWS):
+        _window(quality_governor, 0.1)
+    assert quality_governor.level == 0
+
+    # Raising the quality overloaded it right away
+    _window(quality_governor, 0.9)
+    assert quality_governor.level == 1
+
+    for _ in range(governor.HOLD_WINDOWS):
+        _window(quality_governor, 0.1)
+    assert quality_governor.level == 1
+
+    for _ in range(governor.HOLD_WINDOWS):
+        _window(quality_governor, 0.1)
+    assert quality_governor.level == 0
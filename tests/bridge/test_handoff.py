@@ -0,0 +1,60 @@
+from bridge.util.handoff import ReactorOutbox
+
+
+class FakeReactor:
+    def __init__(self):
+        self.scheduled = []
+
+    def call_from_thread(self, f):
+        self.scheduled.append(f)
+
+    def run(self):
+        scheduled, self.scheduled = self.scheduled, []
+        for f in scheduled:
+            f()
+
+
+def test_calls_are_batched_into_one_wakeup():
+    reactor = FakeReactor()
+    outbox = ReactorOutbox(reactor.call_from_thread)
+    calls = []
+
+    for i in range(5):
+        outbox.call(calls.append, i)
+    assert len(reactor.scheduled) == 1
+
+    reactor.run()
+    assert calls == [0, 1, 2, 3, 4]
+    assert outbox.stats.calls == 5
+    assert outbox.stats.wakeups == 1
+
+
+def test_wakes_up_again_after_draining():
+    reactor = FakeReactor()
+    outbox = ReactorOutbox(reactor.call_from_thread)
+    calls = []
+
+    outbox.call(calls.append, 1)
+    reactor.run()
+    outbox.call(calls.append, 2)
+    assert len(reactor.scheduled) == 1
+
+    reactor.run()
+    assert calls == [1, 2]
+    assert outbox.summary()['calls_per_wakeup'] == 1.0
+
+
+def test_failing_call_does_not_lose_the_batch():
+    reactor = FakeReactor()
+    outbox = ReactorOutbox(reactor.call_from_thread)
+    calls = []
+
+    def fail():
+        raise RuntimeError("failed")
+
+    outbox.call(calls.append, 1)
+    outbox.call(fail)
+    outbox.call(calls.append, 2)
+    reactor.run()
+
+    assert calls == [1, 2]
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import wave
+
+import numpy as np
+
+from bridge import audio
+from bridge.audio.opus import EncodingApplication, OpusEncoder
+from bridge.endpoint import ReceiveMode
+from bridge.loopback import (
+    CAPTURE_HEADER,
+    FIRST_USER_ID,
+    LoopbackEndpoint,
+    load_clip,
+    read_frames,
+    write_frames,
+)
+
+SAMPLES_PER_FRAME = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+STEREO_FRAME_SIZE = SAMPLES_PER_FRAME * audio.DISCORD_CHANNELS * 2
+
+
+def _write_wav(path, samples: np.ndarray, channels: int):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(audio.SAMPLE_RATE)
+        f.writeframes(samples.astype(np.int16).tobytes())
+
+
+def test_frames_round_trip(tmp_path):
+    frames = [b"", b"\x01", bytes(300)]
+    write_frames(str(tmp_path / "a.frames"), frames)
+
+    assert read_frames(str(tmp_path / "a.frames")) == frames
+
+
+def test_mono_wav_is_upmixed_and_padded(tmp_path):
+    samples = np.arange(SAMPLES_PER_FRAME + 10) % 1000
+    _write_wav(tmp_path / "mono.wav", samples, 1)
+
+    frames = load_clip(str(tmp_path / "mono.wav"), ReceiveMode.PCM)
+
+    assert [len(frame) for frame in frames] == [STEREO_FRAME_SIZE] * 2
+    stereo = np.frombuffer(b"".join(frames), dtype=np.int16).reshape(-1, 2)
+    assert np.array_equal(stereo[:len(samples), 0], samples)
+    assert np.array_equal(stereo[:len(samples), 1], samples)
+    # The last frame is filled up with silence
+    assert not stereo[len(samples):].any()
+
+
+def test_opus_frames_decode_in_pcm_mode(tmp_path):
+    encoder = OpusEncoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, audio.DISCORD_CHANNELS, EncodingApplication.VOICE)
+    write_frames(str(tmp_path / "a.frames"), [encoder.encode(bytes(STEREO_FRAME_SIZE))] * 3)
+
+    frames = load_clip(str(tmp_path / "a.frames"), ReceiveMode.PCM)
+
+    assert [len(frame) for frame in frames] == [STEREO_FRAME_SIZE] * 3
+    assert np.abs(np.frombuffer(b"".join(frames), dtype=np.int16)).max() < 10
+
+
+def test_endpoint_plays_inputs_and_captures_output(tmp_path):
+    t = np.arange(SAMPLES_PER_FRAME * 5) / audio.SAMPLE_RATE
+    _write_wav(tmp_path / "a.wav", np.sin(2 * np.pi * 440 * t) * 8000, 1)
+    _write_wav(tmp_path / "b.wav", np.zeros(SAMPLES_PER_FRAME * 3), 1)
+
+    received = []
+    done = threading.Event()
+
+    def on_audio(packet: bytes, user: int, sequence: int | None):
+        received.append((user, sequence))
+        if len(received) == 8:
+            done.set()
+
+    endpoint = LoopbackEndpoint([str(tmp_path / "a.wav"), str(tmp_path / "b.wav")], str(tmp_path / "out"))
+    endpoint.start(on_audio)
+    assert done.wait(5)
+
+    encoder = OpusEncoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, audio.DISCORD_CHANNELS, EncodingApplication.VOICE)
+    for _ in range(4):
+        endpoint.send(encoder.encode(bytes(STEREO_FRAME_SIZE)))
+    asyncio.run(endpoint.close())
+
+    # Every user plays their own clip, with the tick as sequence number
+    assert sorted(received) == [(FIRST_USER_ID, i) for i in range(5)] + [(FIRST_USER_ID + 1, i) for i in range(3)]
+    stats = endpoint.stats()
+    assert stats['frames_played'] == 8
+    assert stats['frames_received'] == 4
+
+    capture = (tmp_path / "out" / "received.capture").read_bytes()
+    pos = frames = 0
+    while pos < len(capture):
+        _, length = CAPTURE_HEADER.unpack_from(capture, pos)
+        pos += CAPTURE_HEADER.size + length
+        frames += 1
+    assert frames == 4
+
+    with wave.open(str(tmp_path / "out" / "received.wav"), "rb") as f:
+        assert f.getnchannels() == audio.DISCORD_CHANNELS
+        assert f.getnframes() >= SAMPLES_PER_FRAME * 4
+
+
+def _captured_frames(path) -> list[bytes]:
+    capture = path.read_bytes()
+    frames = []
+    pos = 0
+    while pos < len(capture):
+        _, length = CAPTURE_HEADER.unpack_from(capture, pos)
+        pos += CAPTURE_HEADER.size
+        frames.append(capture[pos:pos + length])
+        pos += length
+    return frames
+
+
+def test_capture_keeps_the_most_recent_frames(tmp_path):
+    endpoint = LoopbackEndpoint([], str(tmp_path / "out"), max_frames=3)
+    encoder = OpusEncoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, audio.DISCORD_CHANNELS, EncodingApplication.VOICE)
+    frames = [encoder.encode(bytes([i]) * STEREO_FRAME_SIZE) for i in range(5)]
+
+    for frame in frames:
+        endpoint.send(frame)
+    asyncio.run(endpoint.close())
+
+    assert _captured_frames(tmp_path / "out" / "received.capture") == frames[2:]
+    assert endpoint.stats()['frames_received'] == 5
+    assert endpoint.stats()['frames_dropped'] == 2
+
+
+def test_nothing_is_captured_without_output():
+    endpoint = LoopbackEndpoint([])
+
+    endpoint.send(b"\xfc\xff\xfe")
+
+    assert endpoint.stats()['frames_received'] == 1
+    assert not endpoint._capture
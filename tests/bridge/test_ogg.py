@@ -0,0 +1,189 @@
+import io
+import os
+import struct
+import threading
+
+import pytest
+
+from bridge import audio
+from bridge.audio.ogg import SILENCE_FRAME, OggOpusWriter, ogg_crc, packet_samples
+from bridge.audio.recorder import QUEUE_SIZE, SessionRecorder
+
+PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+
+
+def _reference_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def _pages(data: bytes) -> list[tuple[int, int, int, list[bytes]]]:
+    """
+    (flags, granule, sequence, packets) of every page, checking the CRCs on the way
+    """
+    pages = []
+    pos = 0
+    while pos < len(data):
+        magic, version, flags, granule, serial, sequence, crc, count = PAGE_HEADER.unpack_from(data, pos)
+        assert magic == b"OggS" and version == 0
+        segments = data[pos + PAGE_HEADER.size:pos + PAGE_HEADER.size + count]
+        end = pos + PAGE_HEADER.size + count + sum(segments)
+
+        page = bytearray(data[pos:end])
+        struct.pack_into("<I", page, 22, 0)
+        assert ogg_crc(bytes(page)) == crc
+
+        packets, packet, body = [], b"", pos + PAGE_HEADER.size + count
+        for segment in segments:
+            packet += data[body:body + segment]
+            body += segment
+            if segment < 255:
+                packets.append(packet)
+                packet = b""
+        pages.append((flags, granule, sequence, packets))
+        pos = end
+    return pages
+
+
+class _File(io.BytesIO):
+    def close(self):
+        # Keep the contents readable after the writer closed the file
+        pass
+
+
+@pytest.mark.parametrize("data", [b"", b"OggS", bytes(range(256)) * 4])
+def test_crc_matches_reference(data: bytes):
+    assert ogg_crc(data) == _reference_crc(data)
+
+
+@pytest.mark.parametrize("packet, samples", [
+    (SILENCE_FRAME, 960),
+    # SILK 10 & 60ms, hybrid 20ms, CELT 2.5ms
+    (bytes([0 << 3]), 480),
+    (bytes([3 << 3]), 2880),
+    (bytes([13 << 3]), 960),
+    (bytes([16 << 3]), 120),
+    # Two frames, then an arbitrary number given by the second byte
+    (bytes([31 << 3 | 1]), 1920),
+    (bytes([31 << 3 | 2]), 1920),
+    (bytes([31 << 3 | 3, 3]), 2880),
+])
+def test_packet_samples(packet: bytes, samples: int):
+    assert packet_samples(packet) == samples
+
+
+def test_headers():
+    f = _File()
+    writer = OggOpusWriter(f, 2, 1234, comments={"TITLE": "test"}, pre_skip=312)
+    writer.close()
+
+    pages = _pages(f.getvalue())
+    flags, granule, sequence, (head,) = pages[0]
+    assert flags == 0x02 and granule == 0 and sequence == 0
+    assert struct.unpack("<8sBBHIhB", head) == (b"OpusHead", 1, 2, 312, audio.SAMPLE_RATE, 0, 0)
+
+    (tags,) = pages[1][3]
+    assert tags.startswith(b"OpusTags")
+    assert tags.endswith(b"TITLE=test")
+    # Empty last page ends the stream
+    assert pages[-1][0] == 0x04
+
+
+def test_granule_positions_and_pages():
+    f = _File()
+    writer = OggOpusWriter(f, 1, 1, page_duration=0.1)
+    packets = [bytes([31 << 3]) + bytes([i]) * (i * 10) for i in range(12)]
+    for packet in packets:
+        writer.write(packet)
+    writer.close()
+
+    pages = _pages(f.getvalue())[2:]
+    # 5 packets of 20ms per 100ms page
+    assert [len(page[3]) for page in pages] == [5, 5, 2]
+    assert [page[1] for page in pages] == [4800, 9600, 11520]
+    assert [page[2] for page in pages] == [2, 3, 4]
+    assert [packet for page in pages for packet in page[3]] == packets
+    assert pages[-1][0] == 0x04
+    assert writer.bytes_written == len(f.getvalue())
+
+
+def test_packets_spanning_segments():
+    f = _File()
+    writer = OggOpusWriter(f, 1, 1)
+    packets = [SILENCE_FRAME + bytes(252), SILENCE_FRAME + bytes(1000), SILENCE_FRAME]
+    for packet in packets:
+        writer.write(packet)
+    writer.close()
+
+    # A multiple of 255 bytes ends with an empty segment
+    assert len(packets[0]) == 255
+    assert [packet for page in _pages(f.getvalue())[2:] for packet in page[3]] == packets
+
+
+def test_page_is_flushed_before_running_out_of_segments():
+    f = _File()
+    writer = OggOpusWriter(f, 1, 1, page_duration=60)
+    for _ in range(100):
+        # 3 segments each
+        writer.write(SILENCE_FRAME + bytes(600))
+    writer.close()
+
+    pages = _pages(f.getvalue())[2:]
+    assert len(pages) > 1
+    assert sum(len(page[3]) for page in pages) == 100
+    assert pages[-1][1] == 100 * 960
+
+
+def test_silence_is_whole_frames():
+    f = _File()
+    writer = OggOpusWriter(f, 1, 1)
+    writer.write_silence(960 * 3 + 100)
+
+    assert writer.granule == 960 * 3
+
+
+def test_recorder_lines_up_tracks(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    packet = bytes([31 << 3]) + bytes(10)
+
+    # Queued with made up arrival times: both tracks start with the session,
+    # the second one only speaks after a second
+    recorder._queue.put(("a", 1, 0, 100.0, packet))
+    recorder._queue.put(("b", 2, 312, 101.0, packet))
+    # Jitter within the tolerance doesn't insert silence
+    recorder._queue.put(("a", 1, 0, 100.05, packet))
+    recorder.start()
+    recorder.stop()
+
+    files = {}
+    for name in os.listdir(recorder.directory):
+        with open(os.path.join(recorder.directory, name), "rb") as f:
+            files[name] = _pages(f.read())
+    assert set(files) == {"a.opus", "b.opus"}
+    assert files["a.opus"][-1][1] == 960 * 2
+    assert files["b.opus"][-1][1] == 960 * 51
+    assert struct.unpack_from("<H", files["b.opus"][0][3][0], 10) == (312,)
+    assert recorder.stats.tracks == 2
+    assert recorder.stats.packets == 3
+    assert recorder.stats.silence_frames == 50
+
+
+def test_recorder_counts_drops_from_every_thread(tmp_path):
+    # Not started, so nothing takes packets off the queue
+    recorder = SessionRecorder(str(tmp_path))
+    packets_per_thread = 2000
+    threads = [threading.Thread(target=lambda: [recorder.record("mixed", 1, SILENCE_FRAME)
+                                                for _ in range(packets_per_thread)])
+               for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert recorder.stats.dropped_packets == len(threads) * packets_per_thread - QUEUE_SIZE
@@ -0,0 +1,79 @@
+from quarry.types.uuid import UUID
+
+from bridge.minecraft.packets import PlayerState
+from bridge.minecraft.packets.voicechat import ClientGroup
+from bridge.minecraft.players import IgnoreList, PlayerStateIndex
+
+GROUP = ClientGroup(id=UUID.random(), name="Muted", has_password=False)
+
+
+def _state(name: str, player: UUID | None = None, disabled: bool = False, disconnected: bool = False,
+           group: ClientGroup | None = None) -> PlayerState:
+    return PlayerState(uuid=player if player is not None else UUID.random(), name=name, disabled=disabled,
+                       disconnected=disconnected, group=group)
+
+
+def test_join_leave_and_rename():
+    index = PlayerStateIndex()
+    player = UUID.random()
+
+    assert index.update(_state("alice", player)) is None
+    assert index.name(player) == "alice"
+
+    previous = index.update(_state("alice", player, disconnected=True))
+    assert not previous.disconnected
+    assert index.get(player).disconnected
+
+    index.update(_state("alicia", player))
+    assert index.name(player) == "alicia"
+    assert len(index) == 1
+    assert index.name(UUID.random()) is None
+
+
+def test_disabled_and_ignored_players_are_blocked():
+    index = PlayerStateIndex(IgnoreList(players={"Bob"}, groups={"muted"}))
+    alice, bob, carol = _state("alice"), _state("bob"), _state("carol", group=GROUP)
+
+    for state in (alice, bob, carol):
+        index.update(state)
+    assert index.blocked == {bob.uuid.bytes, carol.uuid.bytes}
+
+    index.update(_state("alice", alice.uuid, disabled=True))
+    index.update(_state("carol", carol.uuid))
+    assert index.blocked == {alice.uuid.bytes, bob.uuid.bytes}
+
+    # Ignored by name, renaming lifts it
+    index.update(_state("robert", bob.uuid))
+    assert not index.is_blocked(bob.uuid)
+
+
+def test_replace_all_keeps_the_blocked_set():
+    index = PlayerStateIndex(IgnoreList(players={"bob"}))
+    bob = _state("bob")
+    index.update(bob)
+    blocked = index.blocked
+
+    alice = _state("alice", disabled=True)
+    index.replace_all({alice.uuid: alice, bob.uuid: bob})
+
+    # The voice connection holds on to the set, it's only ever modified in place
+    assert index.blocked is blocked
+    assert blocked == {alice.uuid.bytes, bob.uuid.bytes}
+    assert len(index) == 2
+
+    index.replace_all({})
+    assert blocked == set()
+    assert index.get(alice.uuid) is None
+
+
+def test_clear():
+    index = PlayerStateIndex()
+    state = _state("alice", disabled=True)
+    index.update(state)
+    blocked = index.blocked
+
+    index.clear()
+
+    assert len(index) == 0
+    assert index.blocked is blocked and not blocked
+    assert index.name(state.uuid) is None
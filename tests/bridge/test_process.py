@@ -0,0 +1,165 @@
+import threading
+import time
+
+import numpy as np
+from opuslib.api import ctl
+from opuslib.api import encoder as opus_encoder
+
+from bridge import audio
+from bridge.audio.opus import EncodingApplication, OpusDecoder, OpusEncoder
+from bridge.audio.opus import packet_has_fec
+from bridge.audio.process import MAX_LOST_FRAMES, AudioProcessThread
+
+SAMPLES_PER_FRAME = audio.SAMPLE_RATE // 1000 * audio.FRAME_LENGTH
+
+
+def _tone(frequency: float, frames: int, channels: int) -> list[bytes]:
+    t = np.arange(SAMPLES_PER_FRAME * frames) / audio.SAMPLE_RATE
+    samples = (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int16)
+    samples = np.repeat(samples, channels)
+    size = SAMPLES_PER_FRAME * channels
+    return [samples[i * size:(i + 1) * size].tobytes() for i in range(frames)]
+
+
+def _rms(pcm: bytes) -> float:
+    return float(np.sqrt(np.mean(np.frombuffer(pcm, dtype=np.int16).astype(np.float64) ** 2)))
+
+
+def _packets(frequency: float, frames: int, channels: int = audio.MINECRAFT_CHANNELS,
+             fec: bool = False) -> list[bytes]:
+    encoder = OpusEncoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, channels, EncodingApplication.VOICE)
+    if fec:
+        # opuslib's inband_fec setter drops the value
+        opus_encoder.encoder_ctl(encoder.encoder.encoder_state, ctl.set_inband_fec, 1)
+        encoder.encoder.packet_loss_perc = 20
+    return [encoder.encode(frame) for frame in _tone(frequency, frames, channels)]
+
+
+def _step(process: AudioProcessThread, *inputs: tuple):
+    """
+    Runs one tick of the process without its thread, after enqueueing (speaker, packet, sequence) inputs
+    """
+    for speaker, packet, sequence in inputs:
+        process.enqueue(packet, speaker, sequence=sequence)
+    while process._receive(0):
+        pass
+    process._tick()
+    process._tick_count += 1
+
+
+def test_stereo_opus_is_decoded_straight_to_mono():
+    # Discord sends stereo opus, decoded per user into the mono Minecraft direction
+    encoder = OpusEncoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, audio.DISCORD_CHANNELS, EncodingApplication.VOICE)
+    packets = [encoder.encode(frame) for frame in _tone(440, 10, audio.DISCORD_CHANNELS)]
+
+    frames = []
+    done = threading.Event()
+
+    def sink(frame: bytes, received_at: float, trace):
+        frames.append(frame)
+        if len(frames) == len(packets):
+            done.set()
+
+    process = AudioProcessThread(sink, audio.SAMPLE_RATE, audio.FRAME_LENGTH, audio.MINECRAFT_CHANNELS,
+                                 audio.MINECRAFT_CHANNELS, decode=True)
+    process.start()
+    try:
+        # In real time, speakers only get a few frames of buffer
+        for sequence, packet in enumerate(packets):
+            process.enqueue(packet, "user", sequence=sequence)
+            time.sleep(audio.FRAME_LENGTH / 1000)
+        assert done.wait(5)
+    finally:
+        process.stop()
+
+    decoder = OpusDecoder(audio.SAMPLE_RATE, SAMPLES_PER_FRAME, audio.MINECRAFT_CHANNELS)
+    decoded = [decoder.decode(frame) for frame in frames]
+    assert all(len(pcm) == SAMPLES_PER_FRAME * 2 for pcm in decoded)
+    # Past the encoders' warm-up the tone comes through
+    assert _rms(b"".join(decoded[3:])) > 1000
+
+
+def test_passthrough_only_while_one_speaker_is_active():
+    frames = []
+    process = AudioProcessThread(lambda frame, received_at, trace: frames.append(frame), audio.SAMPLE_RATE,
+                                 audio.FRAME_LENGTH, audio.MINECRAFT_CHANNELS, audio.MINECRAFT_CHANNELS,
+                                 decode=True, passthrough=True)
+    first = _packets(440, 6)
+    second = _packets(660, 3)
+
+    for sequence in range(3):
+        _step(process, ("first", first[sequence], sequence))
+    assert frames == first[:3]
+    assert process.stats.passthrough_frames == 3
+
+    for sequence in range(3, 6):
+        _step(process, ("first", first[sequence], sequence), ("second", second[sequence - 3], sequence - 3))
+    assert process.stats.passthrough_frames == 3
+    assert process.stats.transcoded_frames == 3
+    assert process.stats.mixed_frames == 3
+    assert not set(frames[3:]) & set(first + second)
+
+
+def test_parallel_decoding_matches_serial_decoding():
+    packets = [_packets(200 + 100 * speaker, 5) for speaker in range(5)]
+    outputs = []
+
+    for workers in (0, 3):
+        process = AudioProcessThread(lambda frame, received_at, trace: None, audio.SAMPLE_RATE, audio.FRAME_LENGTH,
+                                     audio.MINECRAFT_CHANNELS, audio.MINECRAFT_CHANNELS, decode=True,
+                                     decode_workers=workers)
+        try:
+            outputs.append([
+                [samples.tobytes() for samples in process.decode_frames(
+                    [(speaker, packets[speaker][tick]) for speaker in range(len(packets))])]
+                for tick in range(5)
+            ])
+        finally:
+            process.stop()
+
+    serial, parallel = outputs
+    assert parallel == serial
+    # 16-bit mono
+    assert all(len(samples) == SAMPLES_PER_FRAME * 2 for tick in serial for samples in tick)
+
+
+def _lose(sequences: list[int]) -> AudioProcessThread:
+    """
+    Runs the given packets of a speaker through a process, a tick for each sequence number
+    """
+    packets = _packets(300, max(sequences) + 1, fec=True)
+    process = AudioProcessThread(lambda frame, received_at, trace: None, audio.SAMPLE_RATE, audio.FRAME_LENGTH,
+                                 audio.MINECRAFT_CHANNELS, audio.MINECRAFT_CHANNELS, decode=True)
+    for sequence in range(max(sequences) + 1):
+        if sequence in sequences:
+            _step(process, ("user", packets[sequence], sequence))
+        else:
+            _step(process)
+    # The stand-in for a lost packet delays the ones after it by a tick
+    _step(process)
+    return process
+
+
+def test_single_lost_packet_is_recovered_from_fec():
+    assert packet_has_fec(_packets(300, 6, fec=True)[5])
+
+    process = _lose([0, 1, 2, 3, 5, 6])
+
+    assert process.stats.fec_recovered_frames == 1
+    assert process.stats.concealed_frames == 0
+    assert process.stats.transcoded_frames == 7
+
+
+def test_longer_gaps_are_concealed():
+    process = _lose([0, 1, 4, 5])
+
+    # Only the packet right before the next one can be recovered
+    assert process.stats.fec_recovered_frames == 1
+    assert process.stats.concealed_frames == 1
+
+
+def test_pauses_are_not_filled_in():
+    process = _lose([0, MAX_LOST_FRAMES + 2])
+
+    assert process.stats.fec_recovered_frames == 0
+    assert process.stats.concealed_frames == 0
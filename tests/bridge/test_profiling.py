@@ -0,0 +1,136 @@
+import asyncio
+import glob
+import os
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+from bridge.discord_bot import ProfilingCog
+from bridge.util.profiling import Profiler, SamplingProfiler
+
+
+def _busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy, args=(stop,), name="Busy")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = Profiler(str(tmp_path))
+    yield profiler
+    profiler.stop()
+
+
+def _wait_for_snapshot(profiler: Profiler):
+    deadline = time.monotonic() + 10
+    while profiler._snapshotting:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_sampler_counts_stacks_per_thread(busy_thread):
+    stopped = []
+    sampler = SamplingProfiler(interval=0.001, on_stopped=stopped.append)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+
+    assert not sampler.is_alive()
+    assert stopped == [sampler]
+    assert sampler.samples > 0
+    busy = [stack for stack in sampler.stacks if stack.startswith("Busy;")]
+    assert busy and all("test_profiling.py:_busy" in stack for stack in busy)
+    assert sum(sampler.self_time().values()) == sum(sampler.stacks.values())
+
+
+def test_cpu_profile_lifecycle(profiler, tmp_path, busy_thread):
+    assert profiler.start_cpu() == "Started CPU profile"
+    assert profiler.cpu_running
+    assert profiler.start_cpu() == "CPU profile already running"
+
+    time.sleep(0.1)
+    assert profiler.stop_cpu(wait=True).startswith("Stopped CPU profile")
+    assert not profiler.cpu_running
+    assert profiler.stop_cpu() == "No CPU profile running"
+
+    [file_name] = glob.glob(os.path.join(tmp_path, "cpu-*.folded"))
+    with open(file_name, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert any(line.startswith("Busy;") for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    # Toggling starts a new profile
+    assert profiler.toggle_cpu() == "Started CPU profile"
+
+
+def test_memory_snapshots(profiler, tmp_path):
+    assert not tracemalloc.is_tracing()
+
+    assert profiler.snapshot_memory().startswith("Started tracing allocations")
+    _wait_for_snapshot(profiler)
+    assert tracemalloc.is_tracing()
+    assert glob.glob(os.path.join(tmp_path, "memory-*.txt")) == []
+
+    kept = [bytearray(1024) for _ in range(100)]
+    assert profiler.snapshot_memory() == "Taking memory snapshot"
+    _wait_for_snapshot(profiler)
+
+    [file_name] = glob.glob(os.path.join(tmp_path, "memory-*.txt"))
+    with open(file_name, encoding="utf-8") as f:
+        report = f.read()
+    assert report.startswith("Traced memory:")
+    assert "Since previous snapshot" in report and "Since first snapshot" in report
+    assert "test_profiling.py" in report
+    del kept
+
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+
+class FakeContext:
+    def __init__(self, administrator: bool):
+        self.author = SimpleNamespace(guild_permissions=SimpleNamespace(administrator=administrator))
+        self.responses = []
+
+    async def respond(self, message: str, ephemeral: bool = False):
+        assert ephemeral
+        self.responses.append(message)
+
+
+def _profile_command(cog: ProfilingCog, ctx: FakeContext, kind: str):
+    asyncio.run(ProfilingCog.on_profile_command.callback(cog, ctx, kind))
+
+
+def test_profile_command_toggles_cpu_profile(profiler):
+    cog = ProfilingCog(profiler)
+    ctx = FakeContext(administrator=True)
+
+    _profile_command(cog, ctx, "cpu")
+    assert profiler.cpu_running
+    _profile_command(cog, ctx, "cpu")
+    assert not profiler.cpu_running
+
+    assert ctx.responses[0] == "Started CPU profile"
+    assert ctx.responses[1].startswith("Stopped CPU profile")
+
+
+def test_profile_command_is_only_for_administrators(profiler):
+    ctx = FakeContext(administrator=False)
+
+    _profile_command(ProfilingCog(profiler), ctx, "cpu")
+
+    assert not profiler.cpu_running
+    assert ctx.responses == ["Only administrators can profile the bridge"]
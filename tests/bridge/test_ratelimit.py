@@ -0,0 +1,95 @@
+import pytest
+
+from bridge.util import ratelimit
+from bridge.util.ratelimit import SourceRateLimiter, TokenBucket
+
+
+class FakeTime:
+    now = 1000.0
+
+    @classmethod
+    def monotonic(cls) -> float:
+        return cls.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    FakeTime.now = 1000.0
+    monkeypatch.setattr(ratelimit, "time", FakeTime)
+    return FakeTime
+
+
+def test_burst_then_limited(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+
+    assert [bucket.allow() for _ in range(7)] == [True] * 5 + [False] * 2
+
+
+def test_refills_at_rate(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    for _ in range(5):
+        bucket.allow()
+
+    clock.now += 0.25
+    assert [bucket.allow() for _ in range(3)] == [True, True, False]
+
+
+def test_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    for _ in range(5):
+        bucket.allow()
+
+    clock.now += 60
+    assert sum(bucket.allow() for _ in range(10)) == 5
+
+
+def test_rejected_events_do_not_use_up_tokens(clock):
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.allow()
+
+    allowed = 0
+    for _ in range(110):
+        clock.now += 0.002
+        allowed += bucket.allow()
+
+    # 220ms passed in total, two tokens' worth
+    assert allowed == 2
+
+
+def test_sources_are_limited_separately(clock):
+    limiter = SourceRateLimiter(rate=10, burst=2)
+
+    assert [limiter.allow("a") for _ in range(3)] == [True, True, False]
+    assert [limiter.allow("b") for _ in range(3)] == [True, True, False]
+    assert len(limiter) == 2
+
+
+def test_least_recently_seen_sources_are_forgotten(clock):
+    limiter = SourceRateLimiter(rate=10, burst=2, max_sources=2)
+    for source in ("a", "b"):
+        limiter.allow(source)
+        limiter.allow(source)
+    # Seen more recently than b
+    limiter.allow("a")
+
+    limiter.allow("c")
+
+    assert len(limiter) == 2
+    # Still empty, so it was kept
+    assert not limiter.allow("a")
+    # Forgotten, so it starts with a full bucket again
+    assert limiter.allow("b")
+
+
+def test_idle_sources_are_forgotten(clock):
+    limiter = SourceRateLimiter(rate=10, burst=2)
+    limiter.allow("a")
+    limiter.allow("b")
+    limiter.allow("b")
+
+    # a refilled by now, b didn't
+    clock.now += 0.15
+    limiter.allow("c")
+
+    assert len(limiter) == 2
+    assert [limiter.allow("b") for _ in range(3)] == [True, False, False]
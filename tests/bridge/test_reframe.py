@@ -0,0 +1,51 @@
+import pytest
+
+from bridge.audio.reframe import Reframer
+
+FRAME_SIZE = 8
+
+
+def test_whole_frames_pass_through():
+    reframer = Reframer(FRAME_SIZE)
+    data = bytes(range(FRAME_SIZE * 3))
+
+    frames = reframer.push(data)
+
+    assert [bytes(frame) for frame in frames] == [data[0:8], data[8:16], data[16:24]]
+    assert reframer.pending() == 0
+
+
+def test_partial_input_is_carried_over():
+    reframer = Reframer(FRAME_SIZE)
+
+    assert reframer.push(b"\x01" * 3) == []
+    assert reframer.pending() == 3
+    assert reframer.push(b"\x02" * 3) == []
+
+    frames = reframer.push(b"\x03" * 4)
+    assert [bytes(frame) for frame in frames] == [b"\x01" * 3 + b"\x02" * 3 + b"\x03" * 2]
+    assert reframer.pending() == 2
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 8, 9, 20])
+def test_output_matches_input_for_any_chunking(chunk_size: int):
+    reframer = Reframer(FRAME_SIZE)
+    data = bytes(i % 251 for i in range(FRAME_SIZE * 25 + 5))
+
+    frames = []
+    for offset in range(0, len(data), chunk_size):
+        frames += [bytes(frame) for frame in reframer.push(data[offset:offset + chunk_size])]
+
+    assert all(len(frame) == FRAME_SIZE for frame in frames)
+    assert b"".join(frames) == data[:FRAME_SIZE * 25]
+    assert reframer.pending() == 5
+
+
+def test_reset_drops_carry_over():
+    reframer = Reframer(FRAME_SIZE)
+    reframer.push(b"\x01" * 5)
+
+    reframer.reset()
+
+    assert reframer.pending() == 0
+    assert [bytes(frame) for frame in reframer.push(b"\x02" * FRAME_SIZE)] == [b"\x02" * FRAME_SIZE]
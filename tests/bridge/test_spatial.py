@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from bridge.audio.spatial import ListenerPose, SoundSource, Spatializer
+
+# Facing south (+Z), so west (-X) is to the right
+POSE = ListenerPose(0.0, 64.0, 0.0, 0.0)
+
+
+def _source(x: float, y: float, z: float, max_distance: float = 48.0, fade_distance: float = 16.0) -> SoundSource:
+    return SoundSource(x, y, z, max_distance, fade_distance)
+
+
+def test_without_listener_all_play_as_is():
+    gains = Spatializer(lambda: None).gains([_source(100, 64, 0), None])
+
+    assert gains.tolist() == [[1, 1], [1, 1]]
+
+
+def test_unpositioned_speakers_play_as_is():
+    gains = Spatializer(lambda: POSE).gains([None, _source(0, 64, 100)])
+
+    assert gains[0].tolist() == [1, 1]
+    assert gains[1].tolist() == [0, 0]
+
+
+@pytest.mark.parametrize("distance, volume", [(0, 1.0), (10, 1.0), (16, 1.0), (32, 0.5), (48, 0.0), (60, 0.0)])
+def test_volume_fades_with_distance(distance: float, volume: float):
+    gains = Spatializer(lambda: POSE).gains([_source(0, 64, distance)])
+
+    # Straight ahead, centered
+    assert gains[0] == pytest.approx([volume, volume])
+
+
+@pytest.mark.parametrize("pose, position, expected", [
+    (POSE, (-5, 64, 0), [0, 1]),
+    (POSE, (5, 64, 0), [1, 0]),
+    (POSE, (0, 64, -5), [1, 1]),
+    # Facing west (-X), north (-Z) is to the right
+    (ListenerPose(0, 64, 0, 90), (0, 64, -5), [0, 1]),
+    (ListenerPose(0, 64, 0, 90), (0, 64, 5), [1, 0]),
+    # Straight above, no horizontal direction to pan by
+    (POSE, (0, 70, 0), [1, 1]),
+])
+def test_pan_by_direction(pose: ListenerPose, position: tuple[float, float, float], expected: list[float]):
+    gains = Spatializer(lambda: pose).gains([_source(*position)])
+
+    assert gains[0] == pytest.approx(expected, abs=1e-6)
+
+
+def test_diagonal_pans_partially():
+    gains = Spatializer(lambda: POSE).gains([_source(-5, 64, 5)])
+
+    left, right = gains[0]
+    assert right == pytest.approx(1.0)
+    assert left == pytest.approx(1 - np.sqrt(0.5), abs=1e-6)
+
+
+def test_mix_interleaves_weighted_speakers():
+    frames = [np.full(4, 1000, dtype=np.int16), np.full(2, 2000, dtype=np.int16)]
+    gains = np.array([[1.0, 0.0], [0.5, 0.5]], dtype=np.float32)
+
+    stereo = Spatializer.mix(frames, gains, 4)
+
+    # Short frames are padded with silence
+    assert stereo.tolist() == [2000, 1000, 2000, 1000, 1000, 0, 1000, 0]
+
+
+def test_mix_clips():
+    frames = [np.full(2, 30000, dtype=np.int16)] * 2
+    gains = np.ones((2, 2), dtype=np.float32)
+
+    assert np.all(Spatializer.mix(frames, gains, 2) == np.iinfo(np.int16).max)
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+from bridge.supervisor import BridgeDefinition, Supervisor, load_definitions, pack
+
+
+def _definitions(*names: str, weight: float = 1.0) -> list[BridgeDefinition]:
+    return [BridgeDefinition(name, [], weight=weight) for name in names]
+
+
+class FakeProcess:
+    terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+
+def test_definition_defaults():
+    definition = BridgeDefinition.from_dict({'name': "a", 'args': ["--port", "25566"]})
+
+    assert definition == BridgeDefinition("a", ["--port", "25566"], "BOT_TOKEN", 1.0)
+
+
+def test_load_definitions(tmp_path):
+    file = tmp_path / "bridges.json"
+    file.write_text(json.dumps([
+        {'name': "a", 'args': []},
+        {'name': "b", 'args': ["--proximity"], 'bot_token_env': "B_TOKEN", 'weight': 2},
+    ]))
+
+    definitions = load_definitions(str(file))
+
+    assert [definition.name for definition in definitions] == ["a", "b"]
+    assert definitions[1].bot_token_env == "B_TOKEN"
+    assert definitions[1].weight == 2.0
+
+
+def test_load_definitions_rejects_duplicate_names(tmp_path):
+    file = tmp_path / "bridges.json"
+    file.write_text(json.dumps([{'name': "a", 'args': []}, {'name': "a", 'args': []}]))
+
+    with pytest.raises(ValueError, match="unique"):
+        load_definitions(str(file))
+
+
+def test_pack_balances_measured_loads():
+    definitions = _definitions("a", "b", "c", "d")
+    loads = {'a': 0.5, 'b': 0.4, 'c': 0.3, 'd': 0.2}
+
+    bins = pack(definitions, loads, 2)
+
+    assert [[definition.name for definition in workers] for workers in bins] == [["a", "d"], ["b", "c"]]
+
+
+def test_pack_weighs_unmeasured_bridges_by_the_average():
+    definitions = _definitions("a", "b") + _definitions("heavy", weight=3.0)
+    loads = {'a': 0.1, 'b': 0.1}
+
+    bins = pack(definitions, loads, 2)
+
+    assert [[definition.name for definition in workers] for workers in bins] == [["heavy"], ["a", "b"]]
+
+
+def test_pack_uses_no_more_workers_than_bridges():
+    assert len(pack(_definitions("a"), {}, 4)) == 1
+
+
+def test_report_measures_smoothed_load():
+    supervisor = Supervisor(_definitions("a"), 1)
+    worker = supervisor.workers[0]
+
+    supervisor._on_report(worker, {'time': 10.0, 'bridges': {'a': {'cpu': 1.0}}})
+    assert "a" not in supervisor.loads
+
+    supervisor._on_report(worker, {'time': 20.0, 'bridges': {'a': {'cpu': 6.0}}})
+    assert supervisor.loads['a'] == pytest.approx(0.5)
+
+    supervisor._on_report(worker, {'time': 30.0, 'bridges': {'a': {'cpu': 6.0}}})
+    assert 0 < supervisor.loads['a'] < 0.5
+
+
+def test_reactor_load_is_split_by_bridge_load():
+    supervisor = Supervisor(_definitions("a", "b"), 1)
+    worker = supervisor.workers[0]
+
+    supervisor._on_report(worker, {'time': 10.0, 'reactor_cpu': 1.0,
+                                   'bridges': {'a': {'cpu': 1.0}, 'b': {'cpu': 1.0}}})
+    supervisor._on_report(worker, {'time': 20.0, 'reactor_cpu': 3.0,
+                                   'bridges': {'a': {'cpu': 4.0}, 'b': {'cpu': 2.0}}})
+
+    assert supervisor.loads['a'] == pytest.approx(0.3 + 0.15)
+    assert supervisor.loads['b'] == pytest.approx(0.1 + 0.05)
+
+
+def test_invalid_bridges_are_not_restarted():
+    supervisor = Supervisor(_definitions("a", "b"), 1)
+    worker = supervisor.workers[0]
+    worker.process = FakeProcess()
+
+    supervisor._on_report(worker, {'time': 1.0, 'bridges': {'b': {'cpu': 0.0}}, 'invalid': {'a': "bad token"}})
+
+    assert supervisor.invalid == {'a': "bad token"}
+    assert [definition.name for definition in worker.definitions] == ["b"]
+    assert not worker.retired
+
+    supervisor._on_report(worker, {'time': 2.0, 'bridges': {}, 'invalid': {'a': "bad token", 'b': "bad token"}})
+
+    # Nothing left to run in the worker
+    assert worker.retired
+    assert worker.process.terminated
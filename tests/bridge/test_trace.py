@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from bridge.util.trace import DISCORD_TO_MINECRAFT, MINECRAFT_TO_DISCORD, FrameTrace, LatencyHistogram, Tracer
+
+
+def _trace(direction: str, stages: list[tuple[str, float]]) -> FrameTrace:
+    trace = FrameTrace(direction, "receive")
+    trace.marks = [("receive", 100.0)] + stages
+    return trace
+
+
+def test_every_nth_frame_is_sampled():
+    tracer = Tracer(0.25)
+
+    sampled = [tracer.sample(MINECRAFT_TO_DISCORD) is not None for _ in range(12)]
+
+    assert sampled == [False, False, False, True] * 3
+
+
+def test_invalid_sample_rate():
+    with pytest.raises(ValueError):
+        Tracer(0)
+    with pytest.raises(ValueError):
+        Tracer(1.5)
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in [0.3] * 98 + [3, 250]:
+        histogram.add(ms)
+
+    assert histogram.percentile(0.5) == 0.5
+    assert histogram.percentile(0.99) == 5
+    assert histogram.percentile(1) == 250
+    assert LatencyHistogram().percentile(0.5) == 0.0
+
+
+def test_finished_traces_are_summarised_per_stage():
+    tracer = Tracer(1)
+
+    tracer.finish(_trace(MINECRAFT_TO_DISCORD, [("decode", 100.0003), ("send", 100.0103)]))
+
+    summary = tracer.summary(MINECRAFT_TO_DISCORD)
+    assert summary['traces'] == 1
+    # Capped at the slowest frame seen
+    assert [summary['decode_p50'], summary['send_p50'], summary['total_p50']] == pytest.approx([0.3, 10, 10.3])
+    assert tracer.summary(DISCORD_TO_MINECRAFT) == {'traces': 0}
+
+
+def test_export_is_a_chrome_trace(tmp_path):
+    tracer = Tracer(1)
+    tracer.finish(_trace(MINECRAFT_TO_DISCORD, [("decode", 100.001), ("send", 100.002)]))
+    tracer.finish(_trace(DISCORD_TO_MINECRAFT, [("send", 100.003)]))
+    file_name = str(tmp_path / "trace.json")
+
+    tracer.export(file_name)
+
+    with open(file_name, encoding="utf-8") as f:
+        events = json.load(f)['traceEvents']
+    assert all(isinstance(event['tid'], int) for event in events)
+    tracks = {event['args']['name']: event['tid'] for event in events if event['ph'] == "M"}
+    assert set(tracks) == {MINECRAFT_TO_DISCORD, DISCORD_TO_MINECRAFT}
+    assert len(set(tracks.values())) == 2
+
+    first = [event for event in events if event.get('id') == 0]
+    spans = [(event['name'], event['ph'], event['tid']) for event in first]
+    tid = tracks[MINECRAFT_TO_DISCORD]
+    assert spans == [("frame", "b", tid), ("decode", "b", tid), ("decode", "e", tid), ("send", "b", tid),
+                     ("send", "e", tid), ("frame", "e", tid)]
+    assert [event['ts'] for event in first if event['name'] == "decode"] == pytest.approx([100e6, 100.001e6])
+    assert not (tmp_path / "trace.json.tmp").exists()
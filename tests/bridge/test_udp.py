@@ -0,0 +1,83 @@
+import socket
+import threading
+
+import pytest
+from twisted.internet.protocol import DatagramProtocol
+
+from bridge.voice import udp
+from bridge.voice.udp import SocketOptions, VoiceSocketThread
+
+DATAGRAMS = 200
+
+
+class EchoProtocol(DatagramProtocol):
+    def __init__(self, expected: int):
+        self.received = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def datagramReceived(self, datagram: bytes, addr: tuple):
+        self.received.append(bytes(datagram))
+        self.transport.write(datagram)
+        if len(self.received) == self.expected:
+            self.done.set()
+
+
+@pytest.fixture(params=["mmsg", "socket"])
+def io(request, monkeypatch):
+    if request.param == "mmsg":
+        if udp._mmsg is None:
+            pytest.skip("recvmmsg & sendmmsg aren't available")
+    else:
+        monkeypatch.setattr(udp, "_mmsg", None)
+    return request.param
+
+
+def test_echo_in_batches(io: str):
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(("127.0.0.1", 0))
+    peer.settimeout(5)
+
+    protocol = EchoProtocol(DATAGRAMS)
+    thread = VoiceSocketThread(protocol, SocketOptions(batch=16))
+    thread.connect(*peer.getsockname())
+    thread.listen()
+    try:
+        _, port = thread.getHost()
+        datagrams = [i.to_bytes(2, "big") * 50 for i in range(DATAGRAMS)]
+        for datagram in datagrams:
+            peer.sendto(datagram, ("127.0.0.1", port))
+
+        assert protocol.done.wait(5)
+        assert protocol.received == datagrams
+        assert [peer.recv(udp.MAX_DATAGRAM_SIZE) for _ in datagrams] == datagrams
+    finally:
+        thread.stop()
+        peer.close()
+
+    stats = thread.stats
+    assert stats.received == DATAGRAMS
+    assert stats.sent == DATAGRAMS
+    assert stats.send_drops == 0
+    assert protocol.transport is None
+
+
+def test_write_from_another_thread_wakes_the_thread(io: str):
+    peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    peer.bind(("127.0.0.1", 0))
+    peer.settimeout(5)
+
+    thread = VoiceSocketThread(EchoProtocol(0))
+    thread.connect(*peer.getsockname())
+    thread.listen()
+    try:
+        thread.write(b"first")
+        thread.write(b"second")
+
+        # Well before the thread would poll again on its own
+        peer.settimeout(udp.POLL_TIMEOUT / 2)
+        assert peer.recv(udp.MAX_DATAGRAM_SIZE) == b"first"
+        assert peer.recv(udp.MAX_DATAGRAM_SIZE) == b"second"
+    finally:
+        thread.stop()
+        peer.close()
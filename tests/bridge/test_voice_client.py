@@ -0,0 +1,91 @@
+from quarry.types.uuid import UUID
+
+from bridge.util.encodable import Buffer
+from bridge.voice.client import VoiceConnection
+from bridge.voice.encoding import MAX_DATAGRAM_SIZE, encode_voice_packet
+from bridge.voice.packets import GroupSoundPacket, PingPacket
+
+SERVER = ("127.0.0.1", 24454)
+SECRET = UUID.random()
+SENDER = UUID.random()
+
+
+def _connection(**kwargs) -> tuple[VoiceConnection, list]:
+    received = []
+    connection = VoiceConnection(SERVER[0], SERVER[1], UUID.random(), SECRET, lambda: None,
+                                 lambda packet, trace: received.append(packet), **kwargs)
+    connection.server = SERVER
+    return connection, received
+
+
+def _group_sound(sequence: int = 1, sender: UUID = SENDER) -> bytes:
+    data = b"\xf8\xff\xfe"
+    payload = Buffer.pack_uuid(sender) + Buffer.pack_varint(len(data)) + data + Buffer.pack("q", sequence)
+    return encode_voice_packet(GroupSoundPacket.ID, payload, SECRET)
+
+
+def test_sound_packet_is_delivered():
+    connection, received = _connection()
+
+    connection.datagramReceived(_group_sound(7), SERVER)
+
+    assert received == [GroupSoundPacket(sender=SENDER, data=b"\xf8\xff\xfe", sequence=7)]
+
+
+def test_foreign_and_malformed_datagrams_are_dropped():
+    connection, received = _connection()
+
+    connection.datagramReceived(_group_sound(), ("127.0.0.2", SERVER[1]))
+    connection.datagramReceived(b"\x00" * 20, SERVER)
+    connection.datagramReceived(b"\x00" * (MAX_DATAGRAM_SIZE + 16), SERVER)
+    connection.datagramReceived(_group_sound()[:-1], SERVER)
+
+    assert received == []
+    assert connection.inbound.foreign_packets == 1
+    assert connection.inbound.malformed_packets == 3
+
+
+def test_wrong_secret_is_invalid():
+    connection, received = _connection()
+    payload = Buffer.pack_uuid(SENDER) + Buffer.pack_varint(0) + Buffer.pack("q", 1)
+
+    connection.datagramReceived(encode_voice_packet(GroupSoundPacket.ID, payload, UUID.random()), SERVER)
+
+    assert received == []
+    assert connection.inbound.invalid_packets == 1
+
+
+def test_truncated_packets_are_invalid():
+    connection, received = _connection()
+    truncated_sound = Buffer.pack_uuid(SENDER) + Buffer.pack_varint(100) + b"\x00" * 10
+    truncated_ping = Buffer.pack_uuid(UUID.random())
+
+    connection.datagramReceived(encode_voice_packet(GroupSoundPacket.ID, truncated_sound, SECRET), SERVER)
+    connection.datagramReceived(encode_voice_packet(PingPacket.ID, truncated_ping, SECRET), SERVER)
+
+    assert received == []
+    assert connection.inbound.invalid_packets == 2
+
+
+def test_blocked_senders_are_filtered():
+    blocked = UUID.random()
+    connection, received = _connection(blocked_senders={blocked.bytes})
+
+    connection.datagramReceived(_group_sound(1, blocked), SERVER)
+    connection.datagramReceived(_group_sound(2), SERVER)
+
+    assert [packet.sequence for packet in received] == [2]
+    assert connection.filtered_packets == 1
+    assert connection.filtered_senders == {blocked.bytes: 1}
+
+
+def test_rate_limit():
+    connection, received = _connection(rate_limit=1)
+    datagram = _group_sound()
+
+    for _ in range(2000):
+        connection.datagramReceived(datagram, SERVER)
+
+    # Only the burst gets through right away
+    assert 0 < len(received) < 2000
+    assert connection.inbound.rate_limited_packets == 2000 - len(received)
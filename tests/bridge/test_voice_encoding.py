@@ -0,0 +1,73 @@
+import pytest
+from quarry.types.uuid import UUID
+
+from bridge.util.encodable import Buffer
+from bridge.voice.encoding import (
+    InvalidSecretException,
+    MicPacketWriter,
+    decode_client_sent_voice_packet,
+    decode_voice_packet,
+    encode_client_sent_voice_packet,
+    encode_voice_packet,
+)
+from bridge.voice.packets import MicPacket
+
+SENDER = UUID.random()
+SECRET = UUID.random()
+
+
+def _decode(datagram: bytes) -> MicPacket:
+    sender, payload = decode_client_sent_voice_packet(Buffer(datagram), {SENDER: SECRET})
+    assert sender == SENDER
+    assert payload.unpack("B") == MicPacket.ID
+    return MicPacket.from_buf(payload)
+
+
+@pytest.mark.parametrize("length", [0, 1, 60, 0x7F, 0x80, 400, 1000, 2000])
+def test_mic_packet_writer_round_trip(length: int):
+    writer = MicPacketWriter(SENDER, SECRET)
+    data = bytes(i % 256 for i in range(length))
+
+    datagram = writer.write(data, 1234, whispering=True)
+
+    assert _decode(bytes(datagram)) == MicPacket(data=data, whispering=True, sequence=1234)
+
+
+def test_mic_packet_writer_matches_reference_encoding():
+    writer = MicPacketWriter(SENDER, SECRET)
+    data = b"\xfc" + bytes(80)
+    packet = MicPacket(data=data, whispering=False, sequence=99)
+
+    datagram = bytes(writer.write(data, 99))
+    reference = encode_client_sent_voice_packet(MicPacket.ID, SENDER, packet.to_buf(), SECRET)
+
+    # Only the random IVs differ
+    assert len(datagram) == len(reference)
+    assert _decode(datagram) == _decode(reference) == packet
+
+
+def test_mic_packet_writer_reuses_buffers():
+    writer = MicPacketWriter(SENDER, SECRET)
+
+    packets = [bytes(writer.write(bytes([i]) * (10 + i * 50), i)) for i in range(5)]
+
+    assert [_decode(datagram).sequence for datagram in packets] == list(range(5))
+    assert [_decode(datagram).data for datagram in packets] == [bytes([i]) * (10 + i * 50) for i in range(5)]
+    assert writer.packets == 5
+    assert writer.allocations == 3
+
+
+def test_mic_packet_writer_grows_for_oversized_frames():
+    writer = MicPacketWriter(SENDER, SECRET, mtu=100)
+
+    datagrams = [bytes(writer.write(bytes(length), 1)) for length in (10, 500, 10)]
+
+    assert [len(_decode(datagram).data) for datagram in datagrams] == [10, 500, 10]
+    assert writer.allocations == 5
+
+
+def test_wrong_secret_is_rejected():
+    encrypted = encode_voice_packet(MicPacket.ID, b"payload", SECRET)
+
+    with pytest.raises((InvalidSecretException, ValueError)):
+        decode_voice_packet(Buffer(encrypted), UUID.random())
@@ -0,0 +1,104 @@
+import pytest
+from quarry.types.buffer import BufferUnderrun
+from quarry.types.uuid import UUID
+
+from bridge.util.encodable import Buffer
+from bridge.voice.packets import (
+    AuthenticatePacket,
+    GroupSoundPacket,
+    Location,
+    LocationSoundPacket,
+    MicPacket,
+    PingPacket,
+    PlayerSoundPacket,
+)
+from bridge.voice.packets import codec
+
+SENDER = UUID.random()
+DATA = bytes(range(200))
+
+
+@pytest.mark.parametrize("number", [0, 1, 0x7F, 0x80, 300, 0x3FFF, 0x4000, 2 ** 31 - 1, -1])
+def test_varint_matches_quarry(number: int):
+    packed = codec.pack_varint(number)
+
+    assert packed == Buffer.pack_varint(number)
+    assert codec.unpack_varint(Buffer(packed)) == number
+
+
+def test_unpack_from_checks_length():
+    buf = Buffer(b"\x00" * 7)
+
+    with pytest.raises(BufferUnderrun):
+        codec.unpack_from(codec.SEQUENCE, buf)
+    assert buf.pos == 0
+
+
+def test_unpack_bytes_checks_length():
+    with pytest.raises(BufferUnderrun):
+        codec.unpack_bytes(Buffer(Buffer.pack_varint(10) + b"\x00" * 9))
+
+
+def test_uuids_are_cached():
+    assert codec.uuid_from_bytes(SENDER.bytes) is codec.uuid_from_bytes(SENDER.bytes)
+    assert codec.uuid_from_bytes(SENDER.bytes) == SENDER
+
+
+@pytest.mark.parametrize("data", [b"", b"\x01", DATA])
+def test_mic_packet_round_trip(data: bytes):
+    packet = MicPacket(data=data, whispering=True, sequence=12345)
+
+    assert MicPacket.from_buf(Buffer(packet.to_buf())) == packet
+
+
+def test_player_sound_packet():
+    buf = Buffer(Buffer.pack_uuid(SENDER) + Buffer.pack_varint(len(DATA)) + DATA + Buffer.pack("q?", 42, True))
+
+    packet = PlayerSoundPacket.from_buf(buf)
+
+    assert packet == PlayerSoundPacket(sender=SENDER, data=DATA, sequence=42, whispering=True)
+    assert buf.pos == len(buf.buff)
+
+
+def test_group_sound_packet():
+    buf = Buffer(Buffer.pack_uuid(SENDER) + Buffer.pack_varint(len(DATA)) + DATA + Buffer.pack("q", -5))
+
+    assert GroupSoundPacket.from_buf(buf) == GroupSoundPacket(sender=SENDER, data=DATA, sequence=-5)
+
+
+def test_location_sound_packet():
+    buf = Buffer(Buffer.pack_uuid(SENDER) + Buffer.pack("ddd", 1.5, 64.0, -20.25) +
+                 Buffer.pack_varint(len(DATA)) + DATA + Buffer.pack("q", 7))
+
+    packet = LocationSoundPacket.from_buf(buf)
+
+    assert packet.sender == SENDER
+    assert packet.location == Location(1.5, 64.0, -20.25)
+    assert packet.data == DATA
+    assert packet.sequence == 7
+
+
+def test_truncated_sound_packet():
+    payload = Buffer.pack_uuid(SENDER) + Buffer.pack_varint(len(DATA)) + DATA + Buffer.pack("q?", 42, True)
+
+    for length in (0, 10, 16, 17, 100, len(payload) - 1):
+        with pytest.raises(BufferUnderrun):
+            PlayerSoundPacket.from_buf(Buffer(payload[:length]))
+
+
+def test_authenticate_packet_round_trip():
+    packet = AuthenticatePacket(player_uuid=SENDER, secret=UUID.random())
+
+    assert AuthenticatePacket.from_buf(Buffer(packet.to_buf())) == packet
+
+
+def test_ping_packet_round_trip():
+    packet = PingPacket(id=UUID.random(), timestamp=1_700_000_000_000)
+
+    assert PingPacket.from_buf(Buffer(packet.to_buf())) == packet
+
+
+def test_packets_are_slotted():
+    packet = GroupSoundPacket(sender=SENDER, data=DATA, sequence=1)
+
+    assert not hasattr(packet, "__dict__")